@@ -0,0 +1,190 @@
+"""
+Local store of flow step assets (VIDEO thumbnails, the only step images
+analysis sends to the model).
+
+Assets are fetched once into the response cache's BlobStore and indexed by
+(assetId, URL), so every later run, and every flow that shares an asset,
+reads them from disk. Analysis then sends the model a ``blob:`` reference,
+which is expanded to an inline data URL when the request is sent, instead
+of asking the API to fetch the URL again.
+
+The reference, not the URL, is part of the VIDEO request's cache key. A
+thumbnail whose download fails falls back to its URL, so the step gets a
+different cache key (and a fresh API call) than on runs where the prefetch
+succeeded; a flaky asset host can therefore turn cache hits into misses.
+"""
+
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from blob_store import BlobStore, parse_blob_ref
+from flow_model import Flow
+from downloader import DEFAULT_DOWNLOAD_WORKERS, Downloader, get_downloader
+from structured_logging import get_logger, log_event
+
+_log = get_logger("assets")
+
+
+def step_assets(flow_data: Flow) -> List[Tuple[str, str]]:
+    """
+    List the remote assets a flow's analysis sends to the model.
+
+    IMAGE steps are described from their click and page context, so their
+    screenshots are not fetched.
+
+    Args:
+        flow_data: Flow whose steps to fetch
+
+    Returns:
+        Unique (asset_id, url) pairs of VIDEO thumbnails, in step order
+    """
+    assets = []
+    seen = set()
+    for step in flow_data.steps:
+        if step.type != 'VIDEO':
+            continue
+        url = step.thumbnail_url
+        if not url or (step.asset_id, url) in seen:
+            continue
+        seen.add((step.asset_id, url))
+        assets.append((step.asset_id or '', url))
+    return assets
+
+
+def _media_type(url: str) -> str:
+    """Guess an asset's MIME type from its URL path (images default to PNG)."""
+    media_type, _ = mimetypes.guess_type(urlparse(url).path)
+    return media_type or "image/png"
+
+
+class AssetStore:
+    """
+    Index of (assetId, URL) to blob references, backed by a BlobStore.
+
+    Index entries live in ``<root>/<first two hex chars>/<key>.json`` and
+    are written atomically, so concurrent batch workers can share a store.
+    """
+
+    def __init__(self, root: Path, blobs: BlobStore, downloader: Optional[Downloader] = None):
+        """
+        Initialize the asset store.
+
+        Args:
+            root: Directory holding the index (created if missing)
+            blobs: Blob store receiving the asset contents (typically the
+                response cache's, so references can be expanded on send)
+            downloader: Downloader to fetch with (default: the shared one)
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.blobs = blobs
+        self.downloader = downloader or get_downloader()
+
+    def _index_path(self, asset_id: str, url: str) -> Path:
+        """Get the index file path for an asset."""
+        key = hashlib.sha256(f"{asset_id}\n{url}".encode('utf-8')).hexdigest()
+        return self.root / key[:2] / f"{key}.json"
+
+    def lookup(self, asset_id: str, url: str) -> Optional[str]:
+        """
+        Get the blob reference of a stored asset.
+
+        Args:
+            asset_id: Step assetId ('' if the step has none)
+            url: Asset URL
+
+        Returns:
+            Blob reference, or None if the asset has not been fetched (or its
+            blob has since been cleared)
+        """
+        try:
+            with open(self._index_path(asset_id, url), 'r', encoding='utf-8') as f:
+                ref = json.load(f)['ref']
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return None
+        parsed = parse_blob_ref(ref)
+        return ref if parsed and self.blobs.contains(parsed[1]) else None
+
+    def fetch(self, asset_id: str, url: str) -> str:
+        """
+        Return a stored asset's blob reference, downloading it if needed.
+
+        Args:
+            asset_id: Step assetId ('' if the step has none)
+            url: Asset URL
+
+        Returns:
+            Blob reference
+
+        Raises:
+            DownloadError: If the asset is not stored and cannot be downloaded
+        """
+        ref = self.lookup(asset_id, url)
+        if ref is not None:
+            return ref
+
+        fd, download_path = tempfile.mkstemp(dir=self.root, prefix='.download-')
+        os.close(fd)
+        try:
+            self.downloader.download(url, download_path)
+            ref = self.blobs.put_file(download_path, _media_type(url))
+        finally:
+            os.unlink(download_path)
+
+        index_path = self._index_path(asset_id, url)
+        index_path.parent.mkdir(exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=index_path.parent, prefix='.tmp-')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'asset_id': asset_id, 'url': url, 'ref': ref}, f)
+        os.replace(tmp_path, index_path)
+        return ref
+
+    def prefetch(self, flow_data: Flow, max_workers: int = DEFAULT_DOWNLOAD_WORKERS) -> Dict[str, str]:
+        """
+        Make every step asset of a flow available locally, in parallel.
+
+        Assets that cannot be downloaded are reported and left out, so
+        analysis falls back to their URLs.
+
+        Args:
+            flow_data: Flow whose steps to fetch
+            max_workers: Concurrent downloads
+
+        Returns:
+            Mapping of asset URL to blob reference
+        """
+        assets = step_assets(flow_data)
+        refs = {}
+        missing = []
+        for asset_id, url in assets:
+            ref = self.lookup(asset_id, url)
+            if ref is None:
+                missing.append((asset_id, url))
+            else:
+                refs[url] = ref
+
+        def fetch(asset):
+            try:
+                return asset[1], self.fetch(*asset)
+            except Exception as e:
+                log_event(_log, logging.WARNING, "prefetch_failed", url=asset[1], error=e)
+                return asset[1], None
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+                for url, ref in executor.map(fetch, missing):
+                    if ref is not None:
+                        refs[url] = ref
+
+        log_event(_log, logging.INFO, "assets_prefetched", stored=len(assets) - len(missing),
+                  fetched=sum(1 for _, url in missing if url in refs),
+                  unavailable=sum(1 for _, url in missing if url not in refs))
+        return refs
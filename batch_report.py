@@ -0,0 +1,454 @@
+"""
+Batch mode: analyze many Arcade flows and write one report directory per flow.
+
+Flows are split into chunks and spread over a process pool; inside each
+worker the chunk's flows run concurrently on one event loop with an
+AsyncOpenAI client. All workers share the response cache (with cross-process
+request coalescing), so a flow analyzed before is served from disk. Each
+worker's RateLimiter paces API calls to 1/N of the per-model rpm/tpm budget
+(N workers), so the batch as a whole stays within the account's limits.
+
+Usage:
+    python batch_report.py flows/ --output-dir reports/ --workers 8
+    python batch_report.py manifest.jsonl --output-dir reports/
+"""
+
+import os
+import re
+import json
+import math
+import time
+import argparse
+import asyncio
+import shutil
+import logging
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import tracing
+from structured_logging import add_logging_arguments, get_logger, log_event, logging_configured, logging_options
+from utils import OpenAICache
+from checkpoints import CheckpointStore
+from asset_store import AssetStore
+from rate_limit import RateLimiter
+from enhanced_video_analysis import DEFAULT_VIDEO_WORKERS
+from flow_model import Flow
+from usage_tracking import UsageTracker, percentile
+from generate_report import create_client, load_flow, print_usage, run_flow_async
+
+_log = get_logger("batch")
+
+# Flows analyzed concurrently on each worker's event loop
+DEFAULT_FLOWS_PER_WORKER = 4
+
+# Limiter, client, cache and event loop of this worker process (see _init_worker)
+_worker = None
+
+
+def _flow_dir_name(flow_id):
+    """Make a flow id safe to use as a directory name."""
+    return re.sub(r'[^\w.-]', '_', str(flow_id))
+
+
+def load_jobs(source, output_root="reports"):
+    """
+    Build the list of flows to process.
+
+    Args:
+        source: A directory of flow ``*.json`` files, or a JSONL manifest.
+            Manifest lines are either ``{"flow_path": ..., "flow_id": ...,
+            "output_dir": ...}`` (only flow_path required; relative paths are
+            resolved against the manifest's directory) or a whole flow object
+            with ``steps`` inline.
+        output_root: Directory under which each flow gets ``<flow_id>/``
+
+    Returns:
+        List of job dicts with flow_id, output_dir and either flow_path or
+        flow_data
+
+    Raises:
+        ValueError: If two flows map to the same flow id
+    """
+    source = Path(source)
+    jobs = []
+
+    if source.is_dir():
+        for flow_path in sorted(source.glob('*.json')):
+            jobs.append({'flow_id': flow_path.stem, 'flow_path': str(flow_path)})
+    else:
+        with open(source, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if 'steps' in entry:
+                    flow_id = entry.get('id') or f"flow-{line_number}"
+                    jobs.append({'flow_id': flow_id, 'flow_data': entry})
+                    continue
+                flow_path = source.parent / entry['flow_path']
+                job = {'flow_id': entry.get('flow_id', flow_path.stem), 'flow_path': str(flow_path)}
+                if entry.get('output_dir'):
+                    job['output_dir'] = entry['output_dir']
+                jobs.append(job)
+
+    seen = set()
+    for job in jobs:
+        if job['flow_id'] in seen:
+            raise ValueError(f"Duplicate flow id in batch: {job['flow_id']}")
+        seen.add(job['flow_id'])
+        job.setdefault('output_dir', str(Path(output_root) / _flow_dir_name(job['flow_id'])))
+
+    return jobs
+
+
+def _init_worker(options):
+    """
+    Build the state shared by every chunk a process runs.
+
+    Runs once per worker process (as the pool's initializer), so the rate
+    limiter's buckets and learned concurrency, the client's connections and
+    the cache's eviction index and usage totals carry over from chunk to
+    chunk. Chunks run on the worker's one event loop, which the async
+    client and limiter are bound to.
+
+    Args:
+        options: Batch options from run_batch
+    """
+    global _worker
+    # Each worker paces its share of the budget so together they stay within it
+    limiter = RateLimiter(share=1 / options['workers']) if options['rate_limit'] else None
+    cache = OpenAICache(
+        cache_dir=options['cache_dir'],
+        backend=options['cache_backend'],
+        compression=options['cache_compression'],
+        process_lock=True
+    )
+    _worker = {
+        'loop': asyncio.new_event_loop(),
+        'client': create_client(limiter, use_async=True, base_url=options['base_url']),
+        'cache': cache,
+        'checkpoints': (CheckpointStore(Path(options['cache_dir']) / "checkpoints")
+                        if options['checkpoints'] else None),
+        'assets': (AssetStore(Path(options['cache_dir']) / "assets", cache.blobs)
+                   if options['prefetch_assets'] else None),
+    }
+
+
+def _close_worker():
+    """Discard the state built by _init_worker in this process."""
+    global _worker
+    if _worker is not None:
+        loop = _worker['loop']
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.run_until_complete(loop.shutdown_default_executor())
+        loop.close()
+        _worker = None
+
+
+async def _run_jobs_async(jobs, options):
+    """Run a chunk of flows concurrently on the worker's event loop."""
+    client, cache = _worker['client'], _worker['cache']
+    checkpoints, assets = _worker['checkpoints'], _worker['assets']
+    semaphore = asyncio.Semaphore(options['flows_per_worker'])
+
+    async def run(job):
+        async with semaphore:
+            start = time.perf_counter()
+            result = {'flow_id': job['flow_id'], 'output_dir': job['output_dir'], 'pid': os.getpid()}
+            with tracing.span(job['flow_id'], "flow") as span:
+                try:
+                    if 'flow_data' in job:
+                        flow_data = Flow.from_dict(job['flow_data'])
+                    else:
+                        flow_data = load_flow(job['flow_path'])
+                    report_filename, _, best_image = await run_flow_async(
+                        client, cache, flow_data,
+                        output_dir=job['output_dir'],
+                        max_concurrency=options['max_concurrency'],
+                        checkpoints=checkpoints,
+                        assets=assets
+                    )
+                    result.update(status='ok', report=report_filename, best_image=best_image['path'])
+                except Exception as e:
+                    log_event(_log, logging.ERROR, "flow_failed", flow_id=job['flow_id'], error=e)
+                    result.update(status='error', error=f"{type(e).__name__}: {e}")
+                span.set(status=result['status'])
+            result['seconds'] = round(time.perf_counter() - start, 3)
+            return result
+
+    return await asyncio.gather(*(run(job) for job in jobs))
+
+
+def process_chunk(jobs, options):
+    """
+    Process a chunk of flows in the current process.
+
+    Pipeline output and log events are appended to a per-process log file
+    under the batch output directory so workers do not interleave on stdout.
+    When tracing, the chunk's spans are saved to a part file that run_batch
+    merges.
+
+    Args:
+        jobs: Job dicts from load_jobs
+        options: Batch options from run_batch
+
+    Returns:
+        Tuple of (one result dict per job, in job order; the chunk's
+        UsageTracker.state() for run_batch to merge)
+    """
+    log_dir = Path(options['output_root']) / "logs"
+    log_dir.mkdir(parents=True, exist_ok=True)
+    trace_path = None
+    if options['trace_id'] is not None:
+        trace_path = str(_trace_parts_dir(options) / f"worker-{os.getpid()}-{time.time_ns()}.json")
+    with open(log_dir / f"worker-{os.getpid()}.log", 'a', encoding='utf-8') as log:
+        with contextlib.redirect_stdout(log), logging_configured(stream=log, **options['logging']), \
+                tracing.recording(trace_path, options['trace_format'], f"worker {os.getpid()}", options['trace_id']):
+            if _worker is None:
+                _init_worker(options)
+            # Account each chunk separately so run_batch can add them up
+            usage = _worker['cache'].usage = UsageTracker()
+            results = _worker['loop'].run_until_complete(_run_jobs_async(jobs, options))
+            return results, usage.state()
+
+
+def _trace_parts_dir(options):
+    """Directory receiving the per-chunk trace files of one batch run."""
+    return Path(options['output_root']) / "traces" / options['trace_id']
+
+
+def summarize(results, wall_seconds):
+    """
+    Compute throughput and latency figures for a batch.
+
+    Args:
+        results: Per-flow result dicts
+        wall_seconds: Elapsed time of the whole batch
+
+    Returns:
+        Dict with flow counts, flows/min and p50/p95/max seconds per flow
+    """
+    durations = [r['seconds'] for r in results if r['status'] == 'ok']
+    succeeded = len(durations)
+    return {
+        'flows': len(results),
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'wall_seconds': round(wall_seconds, 3),
+        'flows_per_minute': round(succeeded / wall_seconds * 60, 2) if wall_seconds > 0 else None,
+        'p50_seconds': percentile(durations, 50),
+        'p95_seconds': percentile(durations, 95),
+        'max_seconds': max(durations) if durations else None
+    }
+
+
+def print_batch_summary(summary, summary_path):
+    """Print the batch throughput and API usage summary."""
+    print("\n=== Batch Summary ===")
+    print(f"Flows: {summary['flows']} ({summary['succeeded']} succeeded, {summary['failed']} failed)")
+    print(f"Wall time: {summary['wall_seconds']}s")
+    print(f"Throughput: {summary['flows_per_minute']} flows/min")
+    if summary['succeeded']:
+        print(f"Per flow: p50 {summary['p50_seconds']:.2f}s, p95 {summary['p95_seconds']:.2f}s, "
+              f"max {summary['max_seconds']:.2f}s")
+    if 'usage' in summary:
+        print_usage(summary['usage'])
+    print(f"✓ Summary saved to {summary_path}")
+
+
+def run_batch(
+    source,
+    output_root="reports",
+    workers=None,
+    flows_per_worker=DEFAULT_FLOWS_PER_WORKER,
+    chunk_size=None,
+    cache_dir=".cache",
+    cache_backend="file",
+    cache_compression=None,
+    rate_limit=True,
+    max_concurrency=DEFAULT_VIDEO_WORKERS,
+    use_checkpoints=True,
+    prefetch_assets=True,
+    base_url=None,
+    trace_path=None,
+    trace_format="chrome",
+    log_options=None
+):
+    """
+    Process every flow in source and write a batch summary.
+
+    Args:
+        source: Directory of flow JSON files or JSONL manifest
+        output_root: Directory receiving one sub-directory per flow, the
+            worker logs and batch_summary.json
+        workers: Worker processes (default: CPU count; 1 runs in-process)
+        flows_per_worker: Flows analyzed concurrently inside each worker
+        chunk_size: Flows handed to a worker at a time (default: spread the
+            batch over about four chunks per worker)
+        cache_dir: Response cache directory shared by all workers
+        cache_backend: OpenAICache storage engine ("file" or "sqlite")
+        cache_compression: Optional entry compression ("zlib" or "zstd")
+        rate_limit: Pace API calls with a RateLimiter in each worker, each
+            allowed an equal share of the per-model rpm/tpm budget
+        max_concurrency: VIDEO-step requests in flight per flow
+        use_checkpoints: Restore stages unchanged since a flow's last run
+        prefetch_assets: Fetch VIDEO thumbnails into a local store shared by
+            all workers and send them from disk
+        base_url: Optional API base URL (e.g. a fake_openai_server)
+        trace_path: Optional file receiving the stage, request and download
+            spans of every worker, merged into one trace
+        trace_format: Trace file format (see tracing.TRACE_FORMATS)
+        log_options: configure_logging arguments for the workers' log files
+            (level, sample_rate, summary_interval, json_lines)
+
+    Returns:
+        Summary dict (see summarize), with the usage of every worker's API
+        requests under "usage" (see UsageTracker.stats)
+    """
+    jobs = load_jobs(source, output_root)
+    workers = max(1, workers or os.cpu_count() or 1)
+    if chunk_size is None:
+        chunk_size = max(1, math.ceil(len(jobs) / (workers * 4)))
+    chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+    workers = min(workers, max(1, len(chunks)))
+
+    options = {
+        'output_root': str(output_root),
+        'flows_per_worker': flows_per_worker,
+        'cache_dir': cache_dir,
+        'cache_backend': cache_backend,
+        'cache_compression': cache_compression,
+        'rate_limit': rate_limit,
+        'workers': workers,
+        'max_concurrency': max_concurrency,
+        'checkpoints': use_checkpoints,
+        'prefetch_assets': prefetch_assets,
+        'base_url': base_url,
+        'trace_id': tracing.new_trace_id() if trace_path else None,
+        'trace_format': trace_format,
+        'logging': dict(log_options or {})
+    }
+
+    print(f"Processing {len(jobs)} flows in {len(chunks)} chunks on {workers} worker(s)...")
+    start = time.perf_counter()
+    results = []
+    usage = UsageTracker()
+
+    def add(chunk_results, chunk_usage):
+        results.extend(chunk_results)
+        usage.merge(chunk_usage)
+        print(f"  {len(results)}/{len(jobs)} flows done")
+
+    if workers == 1:
+        _init_worker(options)
+        try:
+            for chunk in chunks:
+                add(*process_chunk(chunk, options))
+        finally:
+            _close_worker()
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(options,)) as executor:
+            futures = [executor.submit(process_chunk, chunk, options) for chunk in chunks]
+            for future in as_completed(futures):
+                add(*future.result())
+
+    summary = summarize(results, time.perf_counter() - start)
+    summary['usage'] = usage.stats()
+
+    # Keep per-flow results in input order
+    order = {job['flow_id']: i for i, job in enumerate(jobs)}
+    results.sort(key=lambda r: order[r['flow_id']])
+
+    Path(output_root).mkdir(parents=True, exist_ok=True)
+    summary_path = Path(output_root) / "batch_summary.json"
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump({'summary': summary, 'flows': results}, f, indent=2)
+
+    print_batch_summary(summary, summary_path)
+
+    if trace_path:
+        parts_dir = _trace_parts_dir(options)
+        merged = tracing.merge_trace_files(sorted(parts_dir.glob("*.json")), trace_path)
+        shutil.rmtree(parts_dir, ignore_errors=True)
+        with contextlib.suppress(OSError):
+            parts_dir.parent.rmdir()
+        print(f"✓ Trace of {merged} chunk(s) saved to {trace_path}")
+    return summary
+
+
+def parse_args(argv=None):
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Analyze many Arcade flows and generate one report per flow.")
+    parser.add_argument("source", help="directory of flow JSON files, or a JSONL manifest")
+    parser.add_argument("--output-dir", default="reports", help="root directory for per-flow outputs")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument(
+        "--flows-per-worker", type=int, default=DEFAULT_FLOWS_PER_WORKER,
+        help="flows analyzed concurrently inside each worker"
+    )
+    parser.add_argument("--chunk-size", type=int, default=None, help="flows handed to a worker at a time")
+    parser.add_argument(
+        "--max-concurrency", type=int, default=DEFAULT_VIDEO_WORKERS,
+        help="maximum number of VIDEO-step requests in flight per flow"
+    )
+    parser.add_argument(
+        "--cache-backend", choices=["file", "sqlite"], default="file",
+        help="storage engine for the response cache"
+    )
+    parser.add_argument(
+        "--cache-compression", choices=["zlib", "zstd"], default=None,
+        help="compress new cache entries (existing entries stay readable)"
+    )
+    parser.add_argument(
+        "--no-rate-limit", dest="rate_limit", action="store_false",
+        help="send API calls without client-side rate limiting (by default each worker "
+             "paces API calls to an equal share of the per-model rpm/tpm limits)"
+    )
+    parser.add_argument(
+        "--no-checkpoints", dest="use_checkpoints", action="store_false",
+        help="rerun every stage instead of restoring unchanged ones"
+    )
+    parser.add_argument(
+        "--no-prefetch", dest="prefetch_assets", action="store_false",
+        help="send VIDEO thumbnails to the model by URL instead of from the local asset store "
+             "(a failed prefetch also falls back to the URL, which changes the request's cache key)"
+    )
+    parser.add_argument("--cache-dir", default=".cache", help="response cache directory shared by all workers")
+    parser.add_argument(
+        "--base-url", default=None,
+        help="OpenAI API base URL, e.g. a local fake_openai_server for load testing"
+    )
+    parser.add_argument(
+        "--trace", dest="trace_path", default=None,
+        help="record every worker's stage, request and download spans to this JSON file"
+    )
+    parser.add_argument(
+        "--trace-format", choices=tracing.TRACE_FORMATS, default="chrome",
+        help="trace file format: Chrome/Perfetto trace events or OpenTelemetry OTLP/JSON"
+    )
+    add_logging_arguments(parser)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    with logging_configured(**logging_options(args)):
+        run_batch(
+            args.source,
+            output_root=args.output_dir,
+            workers=args.workers,
+            flows_per_worker=args.flows_per_worker,
+            chunk_size=args.chunk_size,
+            cache_dir=args.cache_dir,
+            cache_backend=args.cache_backend,
+            cache_compression=args.cache_compression,
+            rate_limit=args.rate_limit,
+            max_concurrency=args.max_concurrency,
+            use_checkpoints=args.use_checkpoints,
+            prefetch_assets=args.prefetch_assets,
+            base_url=args.base_url,
+            trace_path=args.trace_path,
+            trace_format=args.trace_format,
+            log_options=logging_options(args)
+        )
@@ -0,0 +1,5 @@
+"""
+Performance benchmarks for arcade-ai-interview.
+
+Each module can be run directly, e.g. ``python -m benchmarks.cache_key_hashing``.
+"""
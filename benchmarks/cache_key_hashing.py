@@ -0,0 +1,103 @@
+"""
+Benchmark cache-key hashing on large vision payloads.
+
+Compares the previous scheme (a full ``json.dumps(sort_keys=True)`` string
+hashed separately by get, get_or_compute and set) with the current one (a
+single streamed canonical_json_sha256 per request), reporting time and peak
+memory for each.
+
+Usage:
+    python -m benchmarks.cache_key_hashing [--image-mb 1.5] [--images 3] [--repeat 5]
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import time
+import tracemalloc
+
+from utils import canonical_json_sha256
+
+# Hash computations per cache miss before keys were reused: get,
+# get_or_compute and set each hashed the params
+LEGACY_HASHES_PER_MISS = 3
+
+
+def build_vision_request(image_mb, images):
+    """Build chat params shaped like the image-selection request."""
+    content = [{"type": "text", "text": "Evaluate these social media images."}]
+    for n in range(images):
+        image_b64 = base64.b64encode(os.urandom(int(image_mb * 1024 * 1024))).decode('ascii')
+        content.append({"type": "image_url", "image_url": {"url": f"data:image/png;base64,{image_b64}", "detail": "low"}})
+        content.append({"type": "text", "text": f"Image {n + 1}"})
+    return {
+        "request_type": "chat",
+        "model": "gpt-4o",
+        "messages": [{"role": "user", "content": content}],
+        "temperature": 0.3,
+        "max_tokens": 1000
+    }
+
+
+def legacy_key(request_params):
+    """Cache key as previously computed: materialize, encode, hash."""
+    return hashlib.sha256(json.dumps(request_params, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def legacy_miss(request_params):
+    """Hashing work for one cache miss under the previous scheme."""
+    for _ in range(LEGACY_HASHES_PER_MISS):
+        key = legacy_key(request_params)
+    return key
+
+
+def streamed_miss(request_params):
+    """Hashing work for one cache miss now: one streamed hash."""
+    return canonical_json_sha256(request_params)
+
+
+def measure(func, request_params, repeat):
+    """Return (best seconds, peak traced bytes) for func(request_params)."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(request_params)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(request_params)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(timings), peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark cache-key hashing on vision payloads.")
+    parser.add_argument("--image-mb", type=float, default=1.5, help="raw size of each image in MB")
+    parser.add_argument("--images", type=int, default=3, help="images per request")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per variant (best is reported)")
+    args = parser.parse_args(argv)
+
+    request_params = build_vision_request(args.image_mb, args.images)
+    assert legacy_key(request_params) == canonical_json_sha256(request_params)
+
+    payload_mb = len(json.dumps(request_params)) / (1024 * 1024)
+    print(f"Vision request: {args.images} images, {payload_mb:.1f} MB of JSON")
+
+    results = {
+        "legacy (dumps x3)": measure(legacy_miss, request_params, args.repeat),
+        "streamed (x1)": measure(streamed_miss, request_params, args.repeat),
+    }
+    for name, (seconds, peak) in results.items():
+        print(f"  {name:<18} {seconds * 1000:8.1f} ms   peak {peak / (1024 * 1024):6.1f} MB")
+
+    legacy_seconds, legacy_peak = results["legacy (dumps x3)"]
+    seconds, peak = results["streamed (x1)"]
+    print(f"Speedup: {legacy_seconds / seconds:.1f}x, peak memory: {legacy_peak / max(peak, 1):.1f}x lower")
+    return results
+
+
+if __name__ == "__main__":
+    main()
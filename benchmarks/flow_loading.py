@@ -0,0 +1,89 @@
+"""
+Benchmark loading a large flow.json.
+
+Builds a long recording by repeating the bundled flow's steps and captured
+events, then compares json.load followed by Flow.from_dict (the previous
+behaviour) with the streaming read_flow. For each it reports the load time
+and the peak memory allocated while loading (tracemalloc), plus how far into
+the file the streaming reader is when it yields the first step.
+
+Usage:
+    python -m benchmarks.flow_loading [--repeat-steps 500] [--flow flow.json]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from flow_model import Flow
+from flow_stream import iter_flow, read_flow
+
+
+def make_large_flow(flow_path, copies, out_path):
+    """Write a flow whose steps and events are the bundled ones repeated copies times."""
+    with open(flow_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    data['steps'] = data['steps'] * copies
+    data['capturedEvents'] = data['capturedEvents'] * copies
+    with open(out_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+
+def load_with_json(path):
+    """Previous behaviour: materialize the document, then build the model."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return Flow.from_dict(json.load(f))
+
+
+def measure(load, path):
+    """Return (seconds, peak bytes allocated) for one load."""
+    start = time.perf_counter()
+    load(path)
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    load(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def first_step_offset(path):
+    """Characters read from the file when the first step is yielded."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for key, _ in iter_flow(f):
+            if key == 'steps':
+                return f.tell()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark loading a large flow.json.")
+    parser.add_argument("--flow", default="flow.json", help="flow to repeat")
+    parser.add_argument("--repeat-steps", type=int, default=500, help="copies of the steps and events")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "large_flow.json")
+        make_large_flow(args.flow, args.repeat_steps, path)
+        size = os.path.getsize(path)
+        flow = read_flow(path)
+        print(f"{size / 1e6:.1f} MB, {len(flow.steps)} steps, {len(flow.events)} events")
+
+        results = {
+            "json.load": measure(load_with_json, path),
+            "streaming": measure(read_flow, path),
+        }
+        for name, (seconds, peak) in results.items():
+            print(f"  {name:<10} {seconds * 1000:8.1f} ms   peak {peak / 1e6:8.1f} MB")
+        print(f"  first step yielded after reading {first_step_offset(path) / 1e6:.2f} MB")
+
+    (json_seconds, json_peak), (stream_seconds, stream_peak) = results["json.load"], results["streaming"]
+    print(f"Peak memory {json_peak / stream_peak:.1f}x lower, load time {stream_seconds / json_seconds:.2f}x")
+    return results
+
+
+if __name__ == "__main__":
+    main()
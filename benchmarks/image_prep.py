@@ -0,0 +1,96 @@
+"""
+Benchmark preparing generated images for the VLM selection request.
+
+Compares storing and inlining the full DALL-E PNGs (the previous behaviour)
+with shrinking them to the detail level's resolution first. For each it
+reports the time to store the images and encode the request body (data URLs
+plus the JSON the SDK sends), the request size, the estimated upload time at
+a given uplink speed, and the bytes added to the blob store.
+
+Usage:
+    python -m benchmarks.image_prep [--detail low] [--format JPEG] [--uplink-mbps 50] [images ...]
+"""
+
+import argparse
+import glob
+import json
+import tempfile
+import time
+
+from blob_store import BlobStore
+from image_prep import Image, prepare_image_file
+
+
+def full_png_refs(blobs, paths, detail, image_format):
+    """Previous behaviour: store each PNG as-is."""
+    return [blobs.put_file(path, "image/png") for path in paths]
+
+
+def prepared_refs(blobs, paths, detail, image_format):
+    """Current behaviour: shrink and re-encode, then store."""
+    return [blobs.put(*prepare_image_file(path, detail, image_format=image_format)) for path in paths]
+
+
+def encode_request(blobs, refs, detail):
+    """Encode the selection request body the way it is sent."""
+    content = [{"type": "image_url", "image_url": {"url": blobs.data_url(ref), "detail": detail}} for ref in refs]
+    return json.dumps({"model": "gpt-4o", "messages": [{"role": "user", "content": content}]}).encode('utf-8')
+
+
+def measure(build_refs, paths, detail, image_format, repeat):
+    """Return (best store seconds, best encode seconds, request bytes, stored bytes) for one variant."""
+    store_timings = []
+    encode_timings = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as blob_dir:
+            blobs = BlobStore(blob_dir)
+            start = time.perf_counter()
+            refs = build_refs(blobs, paths, detail, image_format)
+            stored_at = time.perf_counter()
+            body = encode_request(blobs, refs, detail)
+            store_timings.append(stored_at - start)
+            encode_timings.append(time.perf_counter() - stored_at)
+            stored = blobs.stats()['blob_size_bytes']
+    return min(store_timings), min(encode_timings), len(body), stored
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark VLM selection image preparation.")
+    parser.add_argument("images", nargs="*", help="PNG files (default: social_media_image_[0-9].png)")
+    parser.add_argument("--detail", default="low", choices=["low", "high"], help="request detail level")
+    parser.add_argument("--format", dest="image_format", default="JPEG", choices=["JPEG", "WEBP"],
+                        help="re-encoding format")
+    parser.add_argument("--uplink-mbps", type=float, default=50, help="uplink speed for the upload estimate")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per variant (best is reported)")
+    args = parser.parse_args(argv)
+
+    if Image is None:
+        parser.error("Pillow is not installed (pip install pillow)")
+    paths = args.images or sorted(glob.glob("social_media_image_[0-9].png"))
+    if not paths:
+        parser.error("no images given and no social_media_image_N.png found")
+
+    print(f"{len(paths)} images, detail={args.detail}, format={args.image_format}")
+    results = {
+        "full PNG": measure(full_png_refs, paths, args.detail, args.image_format, args.repeat),
+        "prepared": measure(prepared_refs, paths, args.detail, args.image_format, args.repeat),
+    }
+    bytes_per_second = args.uplink_mbps * 1e6 / 8
+    totals = {}
+    for name, (store_seconds, encode_seconds, payload, stored) in results.items():
+        upload_seconds = payload / bytes_per_second
+        totals[name] = store_seconds + encode_seconds + upload_seconds
+        print(f"  {name:<9} store {store_seconds * 1000:7.1f} ms   encode {encode_seconds * 1000:7.1f} ms   "
+              f"request {payload / 1024:8.1f} KB   upload {upload_seconds * 1000:7.1f} ms   "
+              f"stored {stored / 1024:8.1f} KB")
+
+    _, full_encode, full_payload, full_stored = results["full PNG"]
+    _, encode, payload, stored = results["prepared"]
+    print(f"Request {full_payload / payload:.1f}x smaller, encode {full_encode / encode:.1f}x faster, "
+          f"stored {full_stored / stored:.1f}x smaller; "
+          f"end to end at {args.uplink_mbps:g} Mbit/s: {totals['full PNG'] / totals['prepared']:.1f}x faster")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark extracting JSON from long or adversarial model output.
+
+Compares the previous fallback (a greedy ``\\{.*\\}`` DOTALL regex whose
+matches were tried longest first with json.loads) with the current scan of
+candidate object starts using JSONDecoder.raw_decode. Inputs double in size
+so the growth of each is visible: linear inputs take about twice as long
+per step, quadratic ones four times. Each result also shows whether the
+answer object was found ("ok") or an error raised ("--").
+
+Usage:
+    python -m benchmarks.json_extraction [--kb 16] [--steps 3] [--repeat 3]
+"""
+
+import argparse
+import json
+import re
+import time
+
+from utils import extract_json_from_response
+
+ANSWER = json.dumps({"selected_image": 2, "reasoning": "Clear and on-brand.",
+                     "scores": {f"image_{i}": {"overall": 8} for i in (1, 2, 3)}})
+
+
+def legacy_extract_json(content):
+    """Previous implementation, kept for comparison."""
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        pass
+    for match in re.findall(r'```(?:json)?\s*\n(.*?)\n```', content, re.DOTALL):
+        try:
+            return json.loads(match.strip())
+        except json.JSONDecodeError:
+            continue
+    for match in sorted(re.findall(r'\{.*\}', content, re.DOTALL), key=len, reverse=True):
+        try:
+            return json.loads(match)
+        except json.JSONDecodeError:
+            continue
+    raise json.JSONDecodeError("Could not extract valid JSON from response.", content, 0)
+
+
+def repeat_to(unit, size):
+    """Repeat unit to about size characters."""
+    return unit * max(1, size // len(unit))
+
+
+# name -> builder of an input of about `size` characters
+INPUTS = {
+    "chatty answer": lambda size: repeat_to('Sure, here is my take on {the image} and "why":\n', size) + ANSWER,
+    "inline examples": lambda size: repeat_to('For example {"a": 1} or ', size) + ANSWER,
+    "unclosed braces": lambda size: repeat_to('{', size),
+    "unclosed objects": lambda size: repeat_to('{"a": [', size),
+    "truncated object": lambda size: ANSWER[:-1] + repeat_to(', "k": 1', size),
+}
+
+
+def time_call(extract, content, repeat):
+    """Return (best seconds over repeat calls, whether ANSWER was extracted)."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            found = extract(content) == json.loads(ANSWER)
+        except (json.JSONDecodeError, RecursionError):
+            found = False
+        timings.append(time.perf_counter() - start)
+    return min(timings), found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark JSON extraction from model output.")
+    parser.add_argument("--kb", type=int, default=16, help="smallest input size in KB")
+    parser.add_argument("--steps", type=int, default=3, help="number of size doublings")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per input (best is reported)")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, build in INPUTS.items():
+        print(name)
+        for step in range(args.steps):
+            size = args.kb * 1024 * 2 ** step
+            content = build(size)
+            legacy, legacy_found = time_call(legacy_extract_json, content, args.repeat)
+            current, current_found = time_call(extract_json_from_response, content, args.repeat)
+            results[(name, size)] = (legacy, current)
+            print(f"  {size // 1024:6d} KB   previous {legacy * 1000:9.2f} ms {'ok' if legacy_found else '--'}   "
+                  f"current {current * 1000:8.2f} ms {'ok' if current_found else '--'}   {legacy / current:7.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    main()
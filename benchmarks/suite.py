@@ -0,0 +1,352 @@
+"""
+Benchmark suite for the cache and pipeline hot paths, with a stored baseline.
+
+Covers cache-key generation, OpenAICache get/set for text (JSON) and image
+(pickled) entries at several cache sizes, get_stats, JSON extraction from
+model output, and whole report runs against the offline fake OpenAI server
+with a cold and a warm cache.
+
+Each case is timed over several rounds, each running it enough times to
+take at least --min-time seconds; the best per-call time is reported. The
+results are compared with the baseline file and any case slower than the
+baseline by more than --threshold (a fraction) is flagged as a regression,
+making the exit status non-zero. Baselines are only meaningful on the
+machine that recorded them; a warning is printed when the platform differs.
+
+Usage:
+    python -m benchmarks.suite                          # run and compare with the baseline
+    python -m benchmarks.suite --save                   # record a new baseline
+    python -m benchmarks.suite --sizes 1000,10000,100000 --backend sqlite
+    python -m benchmarks.suite -k cache_get -k extract_json
+"""
+
+import argparse
+import asyncio
+import base64
+import contextlib
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from openai import AsyncOpenAI
+
+from benchmarks.json_extraction import INPUTS
+from fake_openai_server import FakeOpenAIServer
+from flow_stream import read_flow
+from generate_report import run_flow_async
+from utils import OpenAICache, _build_cache_params, extract_json_from_response
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+FLOW_PATH = ROOT / "flow.json"
+DEFAULT_SIZES = (1000, 10000)
+
+# Cases registered with @benchmark: name -> factory(options) returning the
+# callable to time; factories keep their files in options.scratch
+BENCHMARKS = {}
+
+
+def benchmark(name, registry=BENCHMARKS):
+    """Register a benchmark case factory under name."""
+    def register(factory):
+        registry[name] = factory
+        return factory
+    return register
+
+
+def text_request(n):
+    """Chat params shaped like a step-analysis request."""
+    return {
+        "model": "gpt-4o",
+        "messages": [
+            {"role": "system", "content": "You are an expert at analyzing user interactions with web applications."},
+            {"role": "user", "content": f"Describe step {n}: the user clicks 'Add to cart' on the product page."},
+        ],
+        "temperature": 0.3,
+        "max_tokens": 500,
+    }
+
+
+def text_response(n):
+    """A chat completion dict of typical size."""
+    return {
+        "id": f"chatcmpl-{n}",
+        "object": "chat.completion",
+        "model": "gpt-4o",
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": "The user adds the scooter to the cart. " * 10}}],
+        "usage": {"prompt_tokens": 60, "completion_tokens": 90, "total_tokens": 150},
+    }
+
+
+def image_request(n):
+    """Image-generation params."""
+    return {"model": "dall-e-3", "prompt": f"Social media image {n}", "size": "1024x1024", "quality": "standard", "n": 1}
+
+
+def image_response(n):
+    """An images.generate response dict, stored pickled."""
+    return {"created": n, "data": [{"url": f"http://127.0.0.1/images/{n}.png", "revised_prompt": f"Image {n}"}]}
+
+
+def vision_request(image_kb, images=3):
+    """Chat params with inline images, shaped like the image-selection request."""
+    image_b64 = base64.b64encode(os.urandom(image_kb * 1024)).decode('ascii')
+    content = [{"type": "text", "text": "Evaluate these social media images."}]
+    for n in range(images):
+        content.append({"type": "image_url", "image_url": {"url": f"data:image/png;base64,{n}{image_b64}"}})
+    return {"model": "gpt-4o", "messages": [{"role": "user", "content": content}], "max_tokens": 1000}
+
+
+# request type -> (cache type, params builder, response builder)
+ENTRY_KINDS = {
+    "text": ("text", text_request, text_response),
+    "pickle": ("images", image_request, image_response),
+}
+
+
+def open_cache(options, name):
+    """A fresh OpenAICache in the scratch directory, with the in-memory tier disabled."""
+    return OpenAICache(cache_dir=str(Path(options.scratch) / name), backend=options.backend, memory_max_entries=0)
+
+
+def filled_cache(options, kind, size):
+    """An OpenAICache holding size entries of kind, and their request params."""
+    cache_type, build_request, build_response = ENTRY_KINDS[kind]
+    cache = open_cache(options, f"{kind}-{size}")
+    requests = [build_request(n) for n in range(size)]
+    for n, params in enumerate(requests):
+        cache.set(params, build_response(n), cache_type)
+    return cache, requests
+
+
+def cycle(items):
+    """Return a function yielding items round-robin, one per call."""
+    state = {'index': -1}
+
+    def next_item():
+        state['index'] = (state['index'] + 1) % len(items)
+        return items[state['index']]
+    return next_item
+
+
+@benchmark("cache_key/text")
+def bench_cache_key_text(options):
+    cache = open_cache(options, "keys")
+    params = text_request(0)
+    return lambda: cache._generate_cache_key(_build_cache_params(cache, "chat", params))
+
+
+@benchmark("cache_key/vision")
+def bench_cache_key_vision(options):
+    cache = open_cache(options, "keys")
+    params = vision_request(image_kb=256)
+    return lambda: cache._generate_cache_key(_build_cache_params(cache, "chat", params))
+
+
+def sized_benchmarks(sizes):
+    """Return the cases that depend on the cache size, for each of sizes."""
+    cases = {}
+    for size in sizes:
+        for kind in ENTRY_KINDS:
+            add_get_set(cases, kind, size)
+
+        @benchmark(f"get_stats/{size}", cases)
+        def bench_get_stats(options, size=size):
+            cache, _ = filled_cache(options, "text", size)
+            return cache.get_stats
+    return cases
+
+
+def add_get_set(cases, kind, size):
+    """Add cache_get and cache_set cases for one entry kind and size."""
+    cache_type, build_request, build_response = ENTRY_KINDS[kind]
+
+    @benchmark(f"cache_get/{kind}/{size}", cases)
+    def bench_get(options):
+        cache, requests = filled_cache(options, kind, size)
+        # Spread lookups over the whole cache rather than one hot entry
+        next_request = cycle(requests[::max(1, size // 1000)])
+        return lambda: cache.get(next_request(), cache_type)
+
+    @benchmark(f"cache_set/{kind}/{size}", cases)
+    def bench_set(options):
+        cache, _ = filled_cache(options, kind, size)
+        counter = iter(range(size, sys.maxsize))
+
+        def set_new():
+            n = next(counter)
+            cache.set(build_request(n), build_response(n), cache_type)
+        return set_new
+
+
+for _name, _build in INPUTS.items():
+    @benchmark(f"extract_json/{_name.replace(' ', '_')}")
+    def bench_extract_json(options, build=_build):
+        content = build(16 * 1024)
+
+        def extract():
+            try:
+                extract_json_from_response(content)
+            except json.JSONDecodeError:
+                pass
+        return extract
+
+
+def pipeline_runner(options, flow):
+    """Return a function running the whole report for flow with a given cache."""
+    output_dir = Path(options.scratch) / "report"
+    output_dir.mkdir(exist_ok=True)
+
+    async def run(cache):
+        client = AsyncOpenAI(api_key="test", base_url=options.server.base_url, max_retries=0)
+        async with client:
+            await run_flow_async(client, cache, flow, output_dir=str(output_dir))
+    return lambda cache: asyncio.run(run(cache))
+
+
+@benchmark("pipeline/cold")
+def bench_pipeline_cold(options):
+    flow = read_flow(str(FLOW_PATH))
+    run = pipeline_runner(options, flow)
+    counter = iter(range(sys.maxsize))
+    return lambda: run(OpenAICache(cache_dir=str(Path(options.scratch) / f"cold-{next(counter)}"),
+                                   backend=options.backend))
+
+
+@benchmark("pipeline/warm")
+def bench_pipeline_warm(options):
+    flow = read_flow(str(FLOW_PATH))
+    run = pipeline_runner(options, flow)
+    cache = OpenAICache(cache_dir=str(Path(options.scratch) / "warm"), backend=options.backend)
+    run(cache)
+    return lambda: run(cache)
+
+
+def time_case(call, min_time, rounds):
+    """Return (best, median) seconds per call over rounds of at least min_time each."""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            call()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+
+    timings = [elapsed / loops]
+    for _ in range(rounds - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            call()
+        timings.append((time.perf_counter() - start) / loops)
+    timings.sort()
+    return timings[0], timings[len(timings) // 2]
+
+
+def machine():
+    """Describe the machine results were recorded on."""
+    return {'platform': platform.platform(), 'machine': platform.machine(),
+            'python': platform.python_version(), 'cpus': os.cpu_count()}
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare results with a baseline.
+
+    Args:
+        results: Mapping of case name to {'best': seconds, ...}
+        baseline: Mapping of case name to {'best': seconds, ...}
+        threshold: Allowed slowdown as a fraction (0.3 allows 30% slower)
+
+    Returns:
+        Dictionary of case name to (ratio to baseline, status), where status
+        is "regression", "faster", "ok" or "new" (no baseline entry)
+    """
+    comparison = {}
+    for name, result in results.items():
+        if name not in baseline:
+            comparison[name] = (None, "new")
+            continue
+        ratio = result['best'] / baseline[name]['best']
+        if ratio > 1 + threshold:
+            status = "regression"
+        elif ratio < 1 / (1 + threshold):
+            status = "faster"
+        else:
+            status = "ok"
+        comparison[name] = (ratio, status)
+    return comparison
+
+
+def format_seconds(seconds):
+    """Format a duration with a readable unit."""
+    if seconds >= 1:
+        return f"{seconds:8.3f} s "
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:8.3f} ms"
+    return f"{seconds * 1e6:8.2f} us"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the cache and pipeline hot paths against a baseline.")
+    parser.add_argument("-k", dest="patterns", action="append",
+                        help="only run cases whose name contains this (repeatable)")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated cache sizes (add 100000 for the large run)")
+    parser.add_argument("--backend", choices=["file", "sqlite"], default="file", help="cache storage backend")
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum seconds per timing round")
+    parser.add_argument("--rounds", type=int, default=5, help="timing rounds per case (best is compared)")
+    parser.add_argument("--threshold", type=float, default=0.3,
+                        help="slowdown over the baseline flagged as a regression (fraction)")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH), help="baseline JSON file")
+    parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    cases = {**BENCHMARKS, **sized_benchmarks(int(size) for size in args.sizes.split(","))}
+    names = [name for name in cases if not args.patterns or any(p in name for p in args.patterns)]
+
+    baseline_path = Path(args.baseline)
+    baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+    if baseline and baseline.get('machine') != machine():
+        print(f"Warning: baseline was recorded on {baseline.get('machine')}; timings may not be comparable")
+
+    results = {}
+    with FakeOpenAIServer(seed=0) as args.server:
+        for name in names:
+            args.scratch = tempfile.mkdtemp(prefix="bench-")
+            try:
+                # The cache reports every lookup on stdout; keep it out of the timings
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                    best, median = time_case(cases[name](args), args.min_time, args.rounds)
+            finally:
+                shutil.rmtree(args.scratch, ignore_errors=True)
+            results[name] = {'best': best, 'median': median}
+            print(f"{name:40s} {format_seconds(best)}  (median {format_seconds(median).strip()})")
+
+    if args.save:
+        # Keep entries for cases that were not run this time
+        stored = {**baseline.get('results', {}), **results}
+        baseline_path.write_text(json.dumps({'machine': machine(), 'results': stored}, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline saved to {baseline_path}")
+        return 0
+
+    comparison = compare(results, baseline.get('results', {}), args.threshold)
+    print()
+    for name, (ratio, status) in comparison.items():
+        print(f"{name:40s} {'' if ratio is None else f'{ratio:6.2f}x'}  {status}")
+    regressions = [name for name, (_, status) in comparison.items() if status == "regression"]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
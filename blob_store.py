@@ -0,0 +1,243 @@
+"""
+Content-addressed storage for binary payloads referenced by API requests.
+
+Large inputs such as images are stored once under their SHA-256 digest and
+referred to in request params by a short ``blob:`` reference, e.g.
+``blob:image/png;sha256,<hex>``. References are hashed into cache keys in
+place of the payload and expanded to ``data:`` URLs only when the request is
+actually sent.
+"""
+
+import base64
+import hashlib
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+# blob:<media type>;sha256,<hex digest> (mirrors data:<media type>;base64,<data>)
+BLOB_REF_PATTERN = re.compile(r'^blob:([\w.+-]+/[\w.+-]+);sha256,([0-9a-f]{64})$')
+DATA_URL_PATTERN = re.compile(r'^data:([\w.+-]+/[\w.+-]+);base64,')
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def parse_blob_ref(value: Any) -> Optional[Tuple[str, str]]:
+    """
+    Split a blob reference into its media type and digest.
+
+    Args:
+        value: Any value from request params
+
+    Returns:
+        (media_type, digest) if value is a blob reference, otherwise None
+    """
+    if not isinstance(value, str) or not value.startswith('blob:'):
+        return None
+    match = BLOB_REF_PATTERN.match(value)
+    return (match.group(1), match.group(2)) if match else None
+
+
+class BlobStore:
+    """
+    Deduplicating on-disk store of payloads addressed by their SHA-256 digest.
+
+    Blobs live in ``<root>/<first two hex chars>/<digest>``. Writes go through
+    a temporary file and an atomic rename, and a blob that already exists is
+    never rewritten, so concurrent writers of the same content are safe.
+    Storing a blob again refreshes its modification time instead, which
+    prune() uses as the blob's last use.
+    """
+
+    def __init__(self, root: Path):
+        """
+        Initialize the blob store.
+
+        Args:
+            root: Directory holding the blobs (created if missing)
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path(self, digest: str) -> Path:
+        """Get the file path for a digest."""
+        return self.root / digest[:2] / digest
+
+    def contains(self, digest: str) -> bool:
+        """Check whether a blob is stored."""
+        return self.path(digest).exists()
+
+    def _touch(self, digest: str) -> bool:
+        """Mark a stored blob as used now, returning False if it is missing."""
+        try:
+            os.utime(self.path(digest))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _store(self, digest: str, data: bytes) -> None:
+        """Write a blob atomically unless it is already present."""
+        if self._touch(digest):
+            return
+        path = self.path(digest)
+        path.parent.mkdir(exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def put(self, data: bytes, media_type: str = "image/png") -> str:
+        """
+        Store a payload and return its blob reference.
+
+        Args:
+            data: Raw payload bytes
+            media_type: MIME type used when the reference is expanded
+
+        Returns:
+            Blob reference string
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        self._store(digest, data)
+        return f"blob:{media_type};sha256,{digest}"
+
+    def put_file(self, file_path: str, media_type: str = "image/png") -> str:
+        """
+        Store the contents of a file and return its blob reference.
+
+        The file is hashed in chunks, and copied only if its content is not
+        already in the store.
+
+        Args:
+            file_path: Path of the file to store
+            media_type: MIME type used when the reference is expanded
+
+        Returns:
+            Blob reference string
+        """
+        hasher = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+                hasher.update(chunk)
+        digest = hasher.hexdigest()
+
+        if not self._touch(digest):
+            with open(file_path, 'rb') as f:
+                self._store(digest, f.read())
+        return f"blob:{media_type};sha256,{digest}"
+
+    def get(self, ref: str) -> bytes:
+        """
+        Read the payload behind a blob reference.
+
+        Args:
+            ref: Blob reference string
+
+        Returns:
+            Raw payload bytes
+
+        Raises:
+            ValueError: If ref is not a blob reference
+            FileNotFoundError: If the blob is not in the store
+        """
+        parsed = parse_blob_ref(ref)
+        if parsed is None:
+            raise ValueError(f"Not a blob reference: {ref[:80]}")
+        with open(self.path(parsed[1]), 'rb') as f:
+            return f.read()
+
+    def data_url(self, ref: str) -> str:
+        """Expand a blob reference into a base64 data URL."""
+        media_type = parse_blob_ref(ref)[0]
+        return f"data:{media_type};base64,{base64.b64encode(self.get(ref)).decode('ascii')}"
+
+    def externalize(self, value: Any) -> Any:
+        """
+        Replace base64 data URLs in a request structure with blob references.
+
+        Lets callers that still inline images share cache keys with callers
+        that pass blob references directly.
+
+        Args:
+            value: Request params (dicts, lists and scalars)
+
+        Returns:
+            A copy of value with data URLs stored and replaced; unchanged
+            sub-structures are returned as-is
+        """
+        if isinstance(value, str):
+            match = DATA_URL_PATTERN.match(value) if value.startswith('data:') else None
+            if match is None:
+                return value
+            return self.put(base64.b64decode(value[match.end():]), match.group(1))
+        if isinstance(value, dict):
+            return {k: self.externalize(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self.externalize(v) for v in value]
+        return value
+
+    def expand(self, value: Any) -> Any:
+        """
+        Replace blob references in a request structure with data URLs.
+
+        Args:
+            value: Request params (dicts, lists and scalars)
+
+        Returns:
+            A copy of value ready to send to the API
+        """
+        if isinstance(value, str):
+            return self.data_url(value) if parse_blob_ref(value) else value
+        if isinstance(value, dict):
+            return {k: self.expand(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self.expand(v) for v in value]
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        """Count stored blobs and their total size."""
+        blob_files = [p for p in self.root.glob('*/*') if not p.name.startswith('.tmp-')]
+        return {
+            'blob_count': len(blob_files),
+            'blob_size_bytes': sum(p.stat().st_size for p in blob_files)
+        }
+
+    def prune(self, older_than: float) -> int:
+        """
+        Delete blobs not stored or re-stored in the last older_than seconds.
+
+        Blobs are not tied to cache entries, so OpenAICache's max_bytes does
+        not bound them; prune them periodically instead. A blob is stored
+        again every time a request is built from it, so pick an age well
+        beyond a run's duration.
+
+        Args:
+            older_than: Age in seconds of the blobs to delete
+
+        Returns:
+            Number of blobs removed
+        """
+        cutoff = time.time() - older_than
+        deleted = 0
+        for blob_file in self.root.glob('*/*'):
+            try:
+                if blob_file.stat().st_mtime < cutoff:
+                    blob_file.unlink()
+                    deleted += 1
+            except FileNotFoundError:
+                pass
+        return deleted
+
+    def clear(self) -> int:
+        """Delete every blob, returning the number removed."""
+        deleted = 0
+        for blob_file in self.root.glob('*/*'):
+            blob_file.unlink()
+            deleted += 1
+        return deleted
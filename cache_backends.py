@@ -0,0 +1,574 @@
+"""
+Storage engines for OpenAICache.
+
+A backend stores opaque serialized entries addressed by (cache_type, cache_key);
+OpenAICache handles key generation, serialization and request coalescing.
+"""
+
+import heapq
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Seconds between FileBackend index rescans when processes share a directory
+SHARED_RESCAN_INTERVAL = 10.0
+
+
+class CacheBackend:
+    """
+    Interface for OpenAICache storage engines.
+
+    Entries are bytes addressed by a cache type ("text" or "images") and a
+    cache key. Implementations must be safe to use from multiple threads.
+    """
+
+    def read(self, cache_type: str, cache_key: str) -> Optional[bytes]:
+        """Return the stored entry, or None if it does not exist."""
+        raise NotImplementedError
+
+    def write(self, cache_type: str, cache_key: str, data: bytes) -> None:
+        """Store an entry, replacing any existing one atomically."""
+        raise NotImplementedError
+
+    def contains(self, cache_type: str, cache_key: str) -> bool:
+        """Check whether an entry exists."""
+        raise NotImplementedError
+
+    def delete(self, cache_type: str, cache_key: str) -> bool:
+        """Delete an entry, returning True if one was removed."""
+        raise NotImplementedError
+
+    def clear(self, cache_type: Optional[str] = None) -> int:
+        """Delete all entries of a type (or all types), returning the count."""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get entry counts and sizes.
+
+        Returns:
+            Dictionary with text_cache_count, image_cache_count and
+            total_size_bytes
+        """
+        raise NotImplementedError
+
+    def total_bytes(self) -> int:
+        """Get the total size of all entries without scanning them."""
+        raise NotImplementedError
+
+    def record_access(self, accesses: Dict[Tuple[str, str], int], timestamp: float) -> None:
+        """
+        Record cache hits for eviction bookkeeping.
+
+        Args:
+            accesses: Hit counts keyed by (cache_type, cache_key)
+            timestamp: Time of the most recent access (epoch seconds)
+        """
+        raise NotImplementedError
+
+    def eviction_candidates(self, policy: str, limit: int) -> List[Tuple[str, str, int]]:
+        """
+        Get the entries to evict first under a policy.
+
+        Args:
+            policy: "lru" (least recently accessed first) or "lfu" (fewest
+                hits first, ties broken by least recent access)
+            limit: Maximum number of entries to return
+
+        Returns:
+            List of (cache_type, cache_key, size) in eviction order
+        """
+        raise NotImplementedError
+
+    def expired_entries(self, created_before: float, limit: int) -> List[Tuple[str, str]]:
+        """
+        Get entries written before a point in time, oldest first.
+
+        Args:
+            created_before: Cutoff time (epoch seconds)
+            limit: Maximum number of entries to return
+
+        Returns:
+            List of (cache_type, cache_key)
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release any resources held by the backend."""
+
+
+class FileBackend(CacheBackend):
+    """
+    One file per entry: .cache/text/<key>.json and .cache/images/<key>.pkl.
+
+    Stats and clear scan the directories, so cost grows with entry count.
+    Eviction metadata (size, write time, last access, hits) is kept in an
+    index built from one directory scan on first use and updated in place
+    afterwards; it reflects this process's accesses and writes only. When
+    several processes write the same directory, rescan_interval makes the
+    index pick up their entries (and forget the ones they evicted), so
+    max_bytes bounds the shared directory rather than each process's view.
+    """
+
+    def __init__(self, cache_dir: Path, rescan_interval: Optional[float] = None):
+        """
+        Initialize the file backend.
+
+        Args:
+            cache_dir: Root cache directory
+            rescan_interval: Seconds after which the eviction index is
+                rebuilt from the directories on next use (None = scan once)
+        """
+        self.text_cache_dir = Path(cache_dir) / "text"
+        self.image_cache_dir = Path(cache_dir) / "images"
+
+        self.text_cache_dir.mkdir(exist_ok=True)
+        self.image_cache_dir.mkdir(exist_ok=True)
+
+        # (cache_type, cache_key) -> [size, created_at, last_access, hits]
+        self._index: Optional[Dict[Tuple[str, str], List[float]]] = None
+        self._index_bytes = 0
+        self._index_lock = threading.Lock()
+        self.rescan_interval = rescan_interval
+        self._scanned_at = 0.0
+
+    def _load_index(self) -> Dict[Tuple[str, str], List[float]]:
+        """Build the metadata index from a directory scan (caller holds the lock)."""
+        stale = (self.rescan_interval is not None
+                 and time.monotonic() - self._scanned_at >= self.rescan_interval)
+        if self._index is None or stale:
+            previous = self._index or {}
+            index = {}
+            for cache_type, directory, pattern in (
+                ("text", self.text_cache_dir, "*.json"),
+                ("images", self.image_cache_dir, "*.pkl")
+            ):
+                for cache_file in directory.glob(pattern):
+                    try:
+                        st = cache_file.stat()
+                    except FileNotFoundError:
+                        continue
+                    key = (cache_type, cache_file.stem)
+                    meta = previous.get(key)
+                    # Keep this process's access history for entries it already knew
+                    if meta is None or meta[0] != st.st_size:
+                        meta = [st.st_size, st.st_mtime, st.st_mtime, 0]
+                    index[key] = meta
+            self._index = index
+            self._scanned_at = time.monotonic()
+            self._index_bytes = sum(meta[0] for meta in index.values())
+        return self._index
+
+    def _index_remove(self, cache_type: str, cache_key: str) -> None:
+        """Forget an entry in the index, if it has been built."""
+        with self._index_lock:
+            if self._index is not None:
+                meta = self._index.pop((cache_type, cache_key), None)
+                if meta is not None:
+                    self._index_bytes -= meta[0]
+
+    def path(self, cache_type: str, cache_key: str) -> Path:
+        """Get the file path for an entry."""
+        if cache_type == "text":
+            return self.text_cache_dir / f"{cache_key}.json"
+        else:
+            return self.image_cache_dir / f"{cache_key}.pkl"
+
+    def read(self, cache_type: str, cache_key: str) -> Optional[bytes]:
+        try:
+            return self.path(cache_type, cache_key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def write(self, cache_type: str, cache_key: str, data: bytes) -> None:
+        path = self.path(cache_type, cache_key)
+        # Write to a temp file and rename so concurrent readers (other
+        # threads or processes) never see a partially written entry
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        with self._index_lock:
+            if self._index is not None:
+                now = time.time()
+                previous = self._index.get((cache_type, cache_key))
+                if previous is not None:
+                    self._index_bytes -= previous[0]
+                self._index[(cache_type, cache_key)] = [len(data), now, now, 0]
+                self._index_bytes += len(data)
+
+    def contains(self, cache_type: str, cache_key: str) -> bool:
+        return self.path(cache_type, cache_key).exists()
+
+    def delete(self, cache_type: str, cache_key: str) -> bool:
+        self._index_remove(cache_type, cache_key)
+        try:
+            self.path(cache_type, cache_key).unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+    def clear(self, cache_type: Optional[str] = None) -> int:
+        deleted_count = 0
+
+        if cache_type in (None, "text"):
+            for cache_file in self.text_cache_dir.glob("*.json"):
+                cache_file.unlink()
+                deleted_count += 1
+
+        if cache_type in (None, "images"):
+            for cache_file in self.image_cache_dir.glob("*.pkl"):
+                cache_file.unlink()
+                deleted_count += 1
+
+        with self._index_lock:
+            if cache_type is None:
+                self._index = None
+            elif self._index is not None:
+                for key in [k for k in self._index if k[0] == cache_type]:
+                    self._index_bytes -= self._index.pop(key)[0]
+
+        return deleted_count
+
+    def stats(self) -> Dict[str, int]:
+        text_files = list(self.text_cache_dir.glob("*.json"))
+        image_files = list(self.image_cache_dir.glob("*.pkl"))
+
+        return {
+            'text_cache_count': len(text_files),
+            'image_cache_count': len(image_files),
+            'total_size_bytes': sum(f.stat().st_size for f in text_files + image_files)
+        }
+
+    def total_bytes(self) -> int:
+        with self._index_lock:
+            self._load_index()
+            return self._index_bytes
+
+    def record_access(self, accesses: Dict[Tuple[str, str], int], timestamp: float) -> None:
+        with self._index_lock:
+            index = self._load_index()
+            for key, hits in accesses.items():
+                meta = index.get(key)
+                if meta is not None:
+                    meta[2] = max(meta[2], timestamp)
+                    meta[3] += hits
+
+    def eviction_candidates(self, policy: str, limit: int) -> List[Tuple[str, str, int]]:
+        if policy == "lfu":
+            sort_key = lambda item: (item[1][3], item[1][2])
+        else:
+            sort_key = lambda item: item[1][2]
+        with self._index_lock:
+            items = heapq.nsmallest(limit, self._load_index().items(), key=sort_key)
+        return [(cache_type, cache_key, int(meta[0])) for (cache_type, cache_key), meta in items]
+
+    def expired_entries(self, created_before: float, limit: int) -> List[Tuple[str, str]]:
+        with self._index_lock:
+            items = heapq.nsmallest(
+                limit,
+                (item for item in self._load_index().items() if item[1][1] < created_before),
+                key=lambda item: item[1][1]
+            )
+        return [key for key, _ in items]
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    All entries in a single SQLite database running in WAL mode.
+
+    Entries are indexed by (cache_type, cache_key). Per-type entry counts and
+    byte totals are maintained by triggers, so stats() reads two rows instead
+    of scanning. WAL lets readers proceed while a writer commits, and the
+    busy timeout serializes writers from other threads and processes.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS entries (
+            cache_type TEXT NOT NULL,
+            cache_key TEXT NOT NULL,
+            data BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL DEFAULT 0,
+            hits INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (cache_type, cache_key)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS counters (
+            cache_type TEXT PRIMARY KEY,
+            entry_count INTEGER NOT NULL DEFAULT 0,
+            total_bytes INTEGER NOT NULL DEFAULT 0
+        );
+
+        CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+            INSERT OR IGNORE INTO counters (cache_type) VALUES (NEW.cache_type);
+            UPDATE counters
+               SET entry_count = entry_count + 1, total_bytes = total_bytes + NEW.size
+             WHERE cache_type = NEW.cache_type;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries BEGIN
+            UPDATE counters
+               SET total_bytes = total_bytes - OLD.size + NEW.size
+             WHERE cache_type = NEW.cache_type;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+            UPDATE counters
+               SET entry_count = entry_count - 1, total_bytes = total_bytes - OLD.size
+             WHERE cache_type = OLD.cache_type;
+        END;
+    """
+
+    INDEXES = """
+        CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access);
+        CREATE INDEX IF NOT EXISTS entries_lfu ON entries (hits, last_access);
+        CREATE INDEX IF NOT EXISTS entries_age ON entries (created_at);
+    """
+
+    def __init__(self, db_path: Path, timeout: float = 30.0):
+        """
+        Initialize the SQLite backend, creating the database if needed.
+
+        Args:
+            db_path: Path to the database file
+            timeout: Seconds to wait for a lock held by another writer
+        """
+        self.db_path = Path(db_path)
+        self.timeout = timeout
+        self._local = threading.local()
+
+        conn = self._connection()
+        conn.executescript(self.SCHEMA)
+
+        # Databases created before eviction support lack the access columns
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(entries)")}
+        if "last_access" not in columns:
+            conn.execute("ALTER TABLE entries ADD COLUMN last_access REAL NOT NULL DEFAULT 0")
+            conn.execute("UPDATE entries SET last_access = created_at")
+        if "hits" not in columns:
+            conn.execute("ALTER TABLE entries ADD COLUMN hits INTEGER NOT NULL DEFAULT 0")
+        conn.executescript(self.INDEXES)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get this thread's connection, opening one if needed."""
+        conn = getattr(self._local, 'conn', None)
+        # A connection inherited across fork() must not be reused
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def read(self, cache_type: str, cache_key: str) -> Optional[bytes]:
+        row = self._connection().execute(
+            "SELECT data FROM entries WHERE cache_type = ? AND cache_key = ?",
+            (cache_type, cache_key)
+        ).fetchone()
+        return row[0] if row else None
+
+    def write(self, cache_type: str, cache_key: str, data: bytes) -> None:
+        now = time.time()
+        self._connection().execute(
+            """
+            INSERT INTO entries (cache_type, cache_key, data, size, created_at, last_access)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (cache_type, cache_key) DO UPDATE
+               SET data = excluded.data, size = excluded.size, created_at = excluded.created_at,
+                   last_access = excluded.last_access, hits = 0
+            """,
+            (cache_type, cache_key, data, len(data), now, now)
+        )
+
+    def contains(self, cache_type: str, cache_key: str) -> bool:
+        row = self._connection().execute(
+            "SELECT 1 FROM entries WHERE cache_type = ? AND cache_key = ?",
+            (cache_type, cache_key)
+        ).fetchone()
+        return row is not None
+
+    def delete(self, cache_type: str, cache_key: str) -> bool:
+        cursor = self._connection().execute(
+            "DELETE FROM entries WHERE cache_type = ? AND cache_key = ?",
+            (cache_type, cache_key)
+        )
+        return cursor.rowcount > 0
+
+    def clear(self, cache_type: Optional[str] = None) -> int:
+        conn = self._connection()
+        if cache_type is None:
+            cursor = conn.execute("DELETE FROM entries")
+        else:
+            cursor = conn.execute("DELETE FROM entries WHERE cache_type = ?", (cache_type,))
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        counters = {
+            cache_type: (entry_count, total_bytes)
+            for cache_type, entry_count, total_bytes in self._connection().execute(
+                "SELECT cache_type, entry_count, total_bytes FROM counters"
+            )
+        }
+
+        return {
+            'text_cache_count': counters.get("text", (0, 0))[0],
+            'image_cache_count': counters.get("images", (0, 0))[0],
+            'total_size_bytes': sum(total_bytes for _, total_bytes in counters.values())
+        }
+
+    def total_bytes(self) -> int:
+        row = self._connection().execute("SELECT COALESCE(SUM(total_bytes), 0) FROM counters").fetchone()
+        return row[0]
+
+    def record_access(self, accesses: Dict[Tuple[str, str], int], timestamp: float) -> None:
+        conn = self._connection()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(
+                """
+                UPDATE entries SET hits = hits + ?, last_access = MAX(last_access, ?)
+                 WHERE cache_type = ? AND cache_key = ?
+                """,
+                [(hits, timestamp, cache_type, cache_key) for (cache_type, cache_key), hits in accesses.items()]
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def eviction_candidates(self, policy: str, limit: int) -> List[Tuple[str, str, int]]:
+        order = "hits, last_access" if policy == "lfu" else "last_access"
+        return self._connection().execute(
+            f"SELECT cache_type, cache_key, size FROM entries ORDER BY {order} LIMIT ?",
+            (limit,)
+        ).fetchall()
+
+    def expired_entries(self, created_before: float, limit: int) -> List[Tuple[str, str]]:
+        return self._connection().execute(
+            "SELECT cache_type, cache_key FROM entries WHERE created_at < ? ORDER BY created_at LIMIT ?",
+            (created_before, limit)
+        ).fetchall()
+
+    def close(self) -> None:
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class MemoryTier:
+    """
+    Bounded in-process LRU of decoded responses, placed in front of a backend.
+
+    Bounded both by entry count and by the serialized size of the entries it
+    holds; the least recently used entries are evicted first. Responses are
+    shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024):
+        """
+        Initialize the memory tier.
+
+        Args:
+            max_entries: Maximum number of entries held (0 disables the tier)
+            max_bytes: Maximum total serialized size of entries held
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # (cache_type, cache_key) -> (response, size, expires_at)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Any, int, Optional[float]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.promotions = 0
+        self.evictions = 0
+
+    def get(self, cache_type: str, cache_key: str) -> Optional[Any]:
+        """Return a held response and mark it most recently used, or None."""
+        with self._lock:
+            entry = self._entries.get((cache_type, cache_key))
+            if entry is not None and entry[2] is not None and entry[2] <= time.time():
+                del self._entries[(cache_type, cache_key)]
+                self._bytes -= entry[1]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((cache_type, cache_key))
+            self.hits += 1
+            return entry[0]
+
+    def put(self, cache_type: str, cache_key: str, response: Any, size: int,
+            promoted: bool = False, expires_at: Optional[float] = None) -> None:
+        """
+        Hold a response, evicting least recently used entries to fit it.
+
+        Args:
+            cache_type: Type of cache ("text" or "images")
+            cache_key: The cache key (hash)
+            response: Decoded response to hold
+            size: Serialized size of the entry in bytes
+            promoted: True when the entry was just read from the backend
+            expires_at: Time (epoch seconds) after which the entry is dropped
+        """
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop((cache_type, cache_key), None)
+            if previous is not None:
+                self._bytes -= previous[1]
+
+            while self._entries and (
+                len(self._entries) >= self.max_entries or self._bytes + size > self.max_bytes
+            ):
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+            self._entries[(cache_type, cache_key)] = (response, size, expires_at)
+            self._bytes += size
+            if promoted:
+                self.promotions += 1
+
+    def discard(self, cache_type: str, cache_key: str) -> None:
+        """Drop an entry if held."""
+        with self._lock:
+            entry = self._entries.pop((cache_type, cache_key), None)
+            if entry is not None:
+                self._bytes -= entry[1]
+
+    def clear(self, cache_type: Optional[str] = None) -> None:
+        """Drop all entries of a type, or all entries."""
+        with self._lock:
+            if cache_type is None:
+                self._entries.clear()
+                self._bytes = 0
+                return
+            for key in [k for k in self._entries if k[0] == cache_type]:
+                self._bytes -= self._entries.pop(key)[1]
+
+    def stats(self) -> Dict[str, int]:
+        """Get occupancy and hit/promotion/eviction counters."""
+        with self._lock:
+            return {
+                'memory_entries': len(self._entries),
+                'memory_bytes': self._bytes,
+                'memory_hits': self.hits,
+                'memory_misses': self.misses,
+                'memory_promotions': self.promotions,
+                'memory_evictions': self.evictions
+            }
@@ -0,0 +1,110 @@
+"""
+On-disk checkpoints of pipeline stage results.
+
+Each checkpoint is addressed by a namespace (typically one flow), a stage
+name and the stage's input fingerprint. Only the most recent fingerprint of
+each stage is kept per namespace.
+"""
+
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+from structured_logging import get_logger, log_event
+
+_log = get_logger("checkpoints")
+
+# Matches exactly one SHA-256 hex digest, so stage "a" never matches "a-b-..."
+_HEX_DIGEST_GLOB = "[0-9a-f]" * 64
+
+
+class CheckpointStore:
+    """
+    Pickled stage results under ``<root>/<namespace>/<stage>-<fingerprint>.pkl``.
+
+    Writes are atomic (temporary file plus rename), so a crash mid-write
+    never leaves a truncated checkpoint behind.
+    """
+
+    def __init__(self, root: str = ".cache/checkpoints"):
+        """
+        Initialize the store.
+
+        Args:
+            root: Directory holding one sub-directory per namespace
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path(self, namespace: str, stage: str, fingerprint: str) -> Path:
+        """Get the file path of a checkpoint."""
+        return self.root / namespace / f"{stage}-{fingerprint}.pkl"
+
+    def load(self, namespace: str, stage: str, fingerprint: str) -> Tuple[bool, Any]:
+        """
+        Read a checkpoint.
+
+        Args:
+            namespace: Checkpoint group (e.g. flow fingerprint)
+            stage: Stage name
+            fingerprint: Fingerprint of the stage's inputs
+
+        Returns:
+            (True, result) if a readable checkpoint exists, else (False, None)
+        """
+        try:
+            with open(self.path(namespace, stage, fingerprint), 'rb') as f:
+                return True, pickle.load(f)
+        except FileNotFoundError:
+            return False, None
+        except (pickle.PickleError, EOFError, AttributeError, ImportError) as e:
+            log_event(_log, logging.WARNING, "checkpoint_unreadable", stage=stage, error=e)
+            return False, None
+
+    def save(self, namespace: str, stage: str, fingerprint: str, result: Any) -> None:
+        """
+        Write a checkpoint, replacing older fingerprints of the same stage.
+
+        Args:
+            namespace: Checkpoint group (e.g. flow fingerprint)
+            stage: Stage name
+            fingerprint: Fingerprint of the stage's inputs
+            result: Picklable stage result
+        """
+        path = self.path(namespace, stage, fingerprint)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        for stale in path.parent.glob(f"{stage}-{_HEX_DIGEST_GLOB}.pkl"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+
+    def clear(self, namespace: Optional[str] = None) -> int:
+        """
+        Delete checkpoints.
+
+        Args:
+            namespace: Namespace to clear (None for all)
+
+        Returns:
+            Number of checkpoints deleted
+        """
+        directories = [self.root / namespace] if namespace else [p for p in self.root.iterdir() if p.is_dir()]
+        deleted = 0
+        for directory in directories:
+            if directory.exists():
+                deleted += len(list(directory.glob("*.pkl")))
+                shutil.rmtree(directory)
+        return deleted
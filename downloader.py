@@ -0,0 +1,221 @@
+"""
+Pooled, streaming HTTP downloads.
+
+A Downloader keeps one requests.Session whose connection pool is sized for
+the number of concurrent downloads, so repeated fetches from the same host
+(DALL-E results, step screenshots) reuse keep-alive connections. Bodies are
+streamed to a temporary file next to the destination and renamed into place
+only once the byte count matches Content-Length, so a reader never sees a
+partial file. Transient failures are retried with exponential backoff.
+
+    downloader = get_downloader()
+    downloader.download(url, "image.png")
+    downloader.download_many([(url1, "a.png"), (url2, "b.png")])
+"""
+
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import tracing
+
+# Concurrent downloads (and pooled connections per host)
+DEFAULT_DOWNLOAD_WORKERS = 8
+
+# Attempts after the first one for transient failures
+DEFAULT_DOWNLOAD_RETRIES = 3
+
+# Bytes read from the socket per write
+_CHUNK_SIZE = 64 * 1024
+
+# Longest Retry-After (seconds) honoured before a retry
+DEFAULT_MAX_RETRY_AFTER = 60.0
+
+# Statuses worth retrying; anything else 4xx fails immediately
+_RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+# Process umask, read once (os.umask can only be read by setting it), so
+# downloads get the permissions open() would have given them rather than
+# mkstemp's owner-only 0600
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+_default_downloader = None
+_default_lock = threading.Lock()
+
+
+class DownloadError(Exception):
+    """A download failed after all retries (or with a non-retryable status)."""
+
+
+class IncompleteDownload(DownloadError):
+    """The connection closed before Content-Length bytes arrived."""
+
+
+class Downloader:
+    """
+    Thread-safe downloader sharing one pooled keep-alive session.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_DOWNLOAD_WORKERS,
+        max_retries: int = DEFAULT_DOWNLOAD_RETRIES,
+        backoff: float = 0.5,
+        timeout: float = 30,
+        max_retry_after: float = DEFAULT_MAX_RETRY_AFTER
+    ):
+        """
+        Initialize the downloader.
+
+        Args:
+            max_workers: Downloads run concurrently by download_many; also
+                the number of pooled connections kept per host
+            max_retries: Retries after the first attempt for connection
+                errors, timeouts, truncated bodies and 408/429/5xx responses
+            backoff: Delay before the first retry, doubled on each retry
+            timeout: Connect/read timeout in seconds
+            max_retry_after: Cap on a server's Retry-After delay, so a
+                server cannot stall a download thread indefinitely
+        """
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.max_retry_after = max_retry_after
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _retry_delay(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        """Delay before the given retry, honouring a Retry-After header."""
+        if response is not None:
+            try:
+                return min(self.max_retry_after, max(0.0, float(response.headers.get('Retry-After'))))
+            except (TypeError, ValueError):
+                pass
+        # Jitter spreads out retries of downloads that failed together
+        return self.backoff * (2 ** attempt) * random.uniform(0.5, 1.0)
+
+    def _fetch(self, url: str, output_path: str) -> int:
+        """Stream one response body to output_path; raises on any failure."""
+        directory = os.path.dirname(os.path.abspath(output_path))
+        with self.session.get(url, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+
+            # With a Content-Encoding, Content-Length counts the encoded bytes
+            expected = response.headers.get('Content-Length')
+            if response.headers.get('Content-Encoding') not in (None, 'identity'):
+                expected = None
+
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.download-')
+            try:
+                written = 0
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=_CHUNK_SIZE):
+                        f.write(chunk)
+                        written += len(chunk)
+
+                if expected is not None and written != int(expected):
+                    raise IncompleteDownload(f"Got {written} of {expected} bytes from {url}")
+                os.chmod(tmp_path, 0o666 & ~_UMASK)
+                os.replace(tmp_path, output_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        return written
+
+    def download(self, url: str, output_path: str) -> int:
+        """
+        Download url to output_path atomically.
+
+        Args:
+            url: HTTP(S) URL
+            output_path: Destination file (its directory must exist)
+
+        Returns:
+            Number of bytes written
+
+        Raises:
+            DownloadError: If the download failed after all retries
+        """
+        with tracing.span("download", "download", url=url) as span:
+            return self._download(url, output_path, span)
+
+    def _download(self, url: str, output_path: str, span: Any) -> int:
+        """Download with retries, recording attempts and bytes on span."""
+        for attempt in range(self.max_retries + 1):
+            response = None
+            span.set(attempts=attempt + 1)
+            try:
+                written = self._fetch(url, output_path)
+                span.set(bytes=written)
+                return written
+            except requests.HTTPError as e:
+                response = e.response
+                error = e
+                if response is None or response.status_code not in _RETRY_STATUSES:
+                    raise DownloadError(f"Failed to download {url}: {e}") from e
+            except (requests.ConnectionError, requests.Timeout,
+                    requests.exceptions.ChunkedEncodingError, IncompleteDownload) as e:
+                error = e
+
+            if attempt < self.max_retries:
+                time.sleep(self._retry_delay(attempt, response))
+
+        raise DownloadError(f"Failed to download {url} after {self.max_retries + 1} attempts: {error}") from error
+
+    def download_many(
+        self,
+        items: Iterable[Tuple[str, str]],
+        max_workers: Optional[int] = None
+    ) -> Dict[str, Optional[DownloadError]]:
+        """
+        Download several files concurrently.
+
+        A failed download does not stop the others.
+
+        Args:
+            items: (url, output_path) pairs
+            max_workers: Concurrent downloads (default: the pool size)
+
+        Returns:
+            Mapping of output_path to None on success or the DownloadError
+        """
+        items = list(items)
+        results: Dict[str, Optional[DownloadError]] = {}
+
+        def run(item):
+            url, output_path = item
+            try:
+                self.download(url, output_path)
+                return output_path, None
+            except DownloadError as e:
+                return output_path, e
+
+        with ThreadPoolExecutor(max_workers=max_workers or self.max_workers) as executor:
+            for output_path, error in executor.map(run, items):
+                results[output_path] = error
+        return results
+
+    def close(self) -> None:
+        """Close the pooled connections."""
+        self.session.close()
+
+
+def get_downloader() -> Downloader:
+    """Get the process-wide Downloader, creating it on first use."""
+    global _default_downloader
+    with _default_lock:
+        if _default_downloader is None:
+            _default_downloader = Downloader()
+        return _default_downloader
@@ -2,11 +2,35 @@
 Enhanced video analysis functions for combining context from surrounding steps.
 """
 
+import asyncio
+import dataclasses
 import json
-from typing import List, Dict, Any
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Awaitable, Callable, Mapping, Optional, Sequence, Tuple
 
+from event_timeline import FlowTimeline
+from flow_model import Event, Flow, ImageStep, Step, VideoStep
+from structured_logging import get_logger, log_event
 
-def get_surrounding_context(steps: List[Dict], video_index: int) -> Dict[str, Any]:
+_log = get_logger("pipeline")
+
+# Default number of VIDEO steps analyzed concurrently
+DEFAULT_VIDEO_WORKERS = 4
+
+
+def _click_action(step: ImageStep) -> Dict[str, str]:
+    """Describe the click that led to an IMAGE step."""
+    click = step.click
+    return {
+        'type': 'click',
+        'element': click.text if click and click.text is not None else 'unknown',
+        'element_type': click.element_type if click and click.element_type is not None else 'unknown',
+        'page_url': step.page_url
+    }
+
+
+def get_surrounding_context(steps: Sequence[Step], video_index: int) -> Dict[str, Any]:
     """
     Get context from steps surrounding a VIDEO step.
 
@@ -29,60 +53,37 @@ def get_surrounding_context(steps: List[Dict], video_index: int) -> Dict[str, An
         prev_step = steps[video_index - 1]
         context['previous_step'] = prev_step
 
-        if prev_step.get('type') == 'IMAGE':
-            click_ctx = prev_step.get('clickContext', {})
-            context['previous_action'] = {
-                'type': 'click',
-                'element': click_ctx.get('text', 'unknown'),
-                'element_type': click_ctx.get('elementType', 'unknown'),
-                'page_url': prev_step.get('pageContext', {}).get('url', '')
-            }
+        if prev_step.type == 'IMAGE':
+            context['previous_action'] = _click_action(prev_step)
 
     # Get next step
     if video_index < len(steps) - 1:
         next_step = steps[video_index + 1]
         context['next_step'] = next_step
 
-        if next_step.get('type') == 'IMAGE':
-            click_ctx = next_step.get('clickContext', {})
-            context['next_action'] = {
-                'type': 'click',
-                'element': click_ctx.get('text', 'unknown'),
-                'element_type': click_ctx.get('elementType', 'unknown'),
-                'page_url': next_step.get('pageContext', {}).get('url', '')
-            }
+        if next_step.type == 'IMAGE':
+            context['next_action'] = _click_action(next_step)
 
     return context
 
 
-def analyze_video_with_context(client, cache, step: Dict, context: Dict, captured_events: List[Dict]) -> str:
+def build_video_request(step: VideoStep, context: Dict, timeline: FlowTimeline) -> Dict[str, Any]:
     """
-    Analyze a VIDEO step with surrounding context.
+    Build the vision request used to describe a VIDEO step.
 
     Args:
-        client: OpenAI client
-        cache: Cache instance
         step: The VIDEO step
         context: Surrounding context from get_surrounding_context()
-        captured_events: All captured events
+        timeline: The flow's captured events (see FlowTimeline)
 
     Returns:
-        Human-readable description of what happened in the video
+        Keyword arguments for cached_openai_request (without client/cache)
     """
-    from utils import cached_openai_request
-
     # Get thumbnail
-    thumbnail_url = step.get('videoThumbnailUrl')
+    thumbnail_url = step.thumbnail_url
 
-    # Get time range
-    start_time = step['startTimeFrac'] * step['duration']
-    end_time = step['endTimeFrac'] * step['duration']
-
-    # Find events in this time range
-    events_in_video = [
-        e for e in captured_events
-        if start_time <= e.get('timeMs', 0)/1000 <= end_time
-    ]
+    # Find events overlapping this segment of the recording
+    events_in_video = timeline.events_for(step)
 
     # Build context description
     context_text = "Context:\n"
@@ -100,7 +101,7 @@ def analyze_video_with_context(client, cache, step: Dict, context: Dict, capture
     # Format events
     events_text = "Events during this video:\n"
     for event in events_in_video:
-        event_type = event.get('type', 'unknown')
+        event_type = event.type
         if event_type == 'typing':
             events_text += f"- User typed text\n"
         elif event_type == 'scrolling':
@@ -113,9 +114,7 @@ def analyze_video_with_context(client, cache, step: Dict, context: Dict, capture
             events_text += f"- {event_type}\n"
 
     # Use vision model with context
-    description_response = cached_openai_request(
-        client=client,
-        cache=cache,
+    return dict(
         request_type="chat",
         model="gpt-4o",  # Use vision-capable model
         messages=[
@@ -152,94 +151,229 @@ Respond with just the action description, no preamble."""
         max_tokens=100
     )
 
-    return description_response['choices'][0]['message']['content'].strip()
-
 
-def create_enriched_flow_description(client, cache, steps: List[Dict], captured_events: List[Dict]) -> str:
+def analyze_video_with_context(client, cache, step: VideoStep, context: Dict, timeline: FlowTimeline) -> str:
     """
-    Create a comprehensive flow description by analyzing all steps including videos.
+    Analyze a VIDEO step with surrounding context.
 
     Args:
         client: OpenAI client
         cache: Cache instance
-        steps: All flow steps
-        captured_events: All captured events
+        step: The VIDEO step
+        context: Surrounding context from get_surrounding_context()
+        timeline: The flow's captured events (see FlowTimeline)
 
     Returns:
-        Enriched description with all steps described
+        Human-readable description of what happened in the video
     """
     from utils import cached_openai_request
 
-    print("\n→ Analyzing flow steps with video context...")
+    description_response = cached_openai_request(
+        client=client,
+        cache=cache,
+        **build_video_request(step, context, timeline)
+    )
+
+    return description_response['choices'][0]['message']['content'].strip()
+
 
+def describe_static_steps(steps: Sequence[Step]) -> Tuple[List[Dict], List[Tuple[int, int]]]:
+    """
+    Describe CHAPTER and IMAGE steps and reserve slots for VIDEO steps.
+
+    Args:
+        steps: All flow steps
+
+    Returns:
+        Tuple of (enriched steps with VIDEO placeholders, list of
+        (position in enriched steps, step index) for each VIDEO step)
+    """
     enriched_steps = []
+    video_jobs = []
 
     for i, step in enumerate(steps):
-        step_type = step.get('type')
-
-        if step_type == 'CHAPTER':
+        if step.type == 'CHAPTER':
             # Chapter steps are intro/outro
             enriched_steps.append({
                 'type': 'chapter',
-                'title': step.get('title', ''),
-                'subtitle': step.get('subtitle', '')
+                'title': step.title,
+                'subtitle': step.subtitle
             })
 
-        elif step_type == 'IMAGE':
+        elif step.type == 'IMAGE':
             # Image steps have click context
-            click_ctx = step.get('clickContext', {})
-            page_ctx = step.get('pageContext', {})
-
             action_desc = None
-            if click_ctx:
-                element = click_ctx.get('text', 'element')
-                element_type = click_ctx.get('elementType', 'unknown')
+            if step.click:
+                element = step.click.text if step.click.text is not None else 'element'
+                element_type = step.click.element_type if step.click.element_type is not None else 'unknown'
                 action_desc = f"Clicked on '{element}' ({element_type})"
 
             enriched_steps.append({
                 'type': 'image',
                 'action': action_desc,
-                'page_url': page_ctx.get('url', ''),
-                'page_title': page_ctx.get('title', ''),
-                'hotspot_label': step.get('hotspots', [{}])[0].get('label', '') if step.get('hotspots') else ''
+                'page_url': step.page_url,
+                'page_title': step.page_title,
+                'hotspot_label': step.hotspot_label
             })
 
-        elif step_type == 'VIDEO':
-            # Analyze video with surrounding context
-            context = get_surrounding_context(steps, i)
-            video_description = analyze_video_with_context(client, cache, step, context, captured_events)
-
-            print(f"  Video {len([s for s in enriched_steps if s['type'] == 'video']) + 1}: {video_description}")
-
+        elif step.type == 'VIDEO':
+            # Placeholder; filled in once the video analysis completes
+            video_jobs.append((len(enriched_steps), i))
             enriched_steps.append({
                 'type': 'video',
-                'action': video_description,
-                'duration': (step['endTimeFrac'] - step['startTimeFrac']) * step['duration']
+                'action': None,
+                'duration': (step.end_time_frac - step.start_time_frac) * step.duration
             })
 
-    return enriched_steps
+    return enriched_steps, video_jobs
+
+
+def fill_video_descriptions(
+    enriched_steps: List[Dict],
+    video_jobs: List[Tuple[int, int]],
+    descriptions: List[str]
+) -> None:
+    """Write VIDEO descriptions into their placeholder slots, in step order."""
+    for video_number, ((position, _), video_description) in enumerate(zip(video_jobs, descriptions), 1):
+        log_event(_log, logging.DEBUG, "video_described", video=video_number, description=video_description)
+        enriched_steps[position]['action'] = video_description
 
 
-def create_user_interactions_with_videos(client, cache, flow_data: Dict) -> str:
+async def describe_video_steps(
+    request: Callable[..., Awaitable[Dict[str, Any]]],
+    steps: Sequence[Step],
+    captured_events: Sequence[Event],
+    max_concurrency: int = DEFAULT_VIDEO_WORKERS,
+    thumbnails: Optional[Mapping[str, str]] = None
+) -> List[str]:
     """
-    Create user interactions list with VIDEO descriptions interwoven.
+    Describe every VIDEO step on the running event loop.
+
+    Args:
+        request: Coroutine function performing a cached API request from
+            build_video_request's keyword arguments
+        steps: All flow steps
+        captured_events: All captured events
+        max_concurrency: Maximum number of VIDEO steps analyzed at once
+        thumbnails: Optional mapping of thumbnail URL to the reference sent
+            in its place (e.g. blob references from an AssetStore)
+
+    Returns:
+        Descriptions of the VIDEO steps, in step order
+    """
+    timeline = FlowTimeline(steps, captured_events)
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def analyze(step_index: int) -> str:
+        step = steps[step_index]
+        if thumbnails and step.thumbnail_url in thumbnails:
+            step = dataclasses.replace(step, thumbnail_url=thumbnails[step.thumbnail_url])
+        context = get_surrounding_context(steps, step_index)
+        async with semaphore:
+            response = await request(**build_video_request(step, context, timeline))
+        return response['choices'][0]['message']['content'].strip()
+
+    # gather returns results in argument order
+    return await asyncio.gather(*(
+        analyze(step_index) for step_index, step in enumerate(steps) if step.type == 'VIDEO'
+    ))
+
+
+def create_enriched_flow_description(
+    client,
+    cache,
+    steps: Sequence[Step],
+    captured_events: Sequence[Event],
+    max_workers: int = DEFAULT_VIDEO_WORKERS
+) -> str:
+    """
+    Create a comprehensive flow description by analyzing all steps including videos.
+
+    VIDEO steps are analyzed concurrently on a bounded thread pool; results
+    are written back into their original positions so the output is the same
+    regardless of completion order.
 
     Args:
         client: OpenAI client
         cache: Cache instance
-        flow_data: Complete flow data
+        steps: All flow steps
+        captured_events: All captured events
+        max_workers: Maximum number of VIDEO steps analyzed at once (1 = sequential)
 
     Returns:
-        Markdown bulleted list of user interactions
+        Enriched description with all steps described
     """
-    from utils import cached_openai_request
+    print("\n→ Analyzing flow steps with video context...")
 
-    steps = flow_data.get('steps', [])
-    captured_events = flow_data.get('capturedEvents', [])
+    enriched_steps, video_jobs = describe_static_steps(steps)
+    timeline = FlowTimeline(steps, captured_events)
 
-    # Get enriched step descriptions
-    enriched_steps = create_enriched_flow_description(client, cache, steps, captured_events)
+    def analyze(step_index: int) -> str:
+        # Analyze video with surrounding context
+        context = get_surrounding_context(steps, step_index)
+        return analyze_video_with_context(client, cache, steps[step_index], context, timeline)
+
+    step_indices = [step_index for _, step_index in video_jobs]
+    if max_workers > 1 and len(video_jobs) > 1:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(video_jobs))) as executor:
+            # executor.map yields results in submission order
+            descriptions = list(executor.map(analyze, step_indices))
+    else:
+        descriptions = [analyze(step_index) for step_index in step_indices]
 
+    fill_video_descriptions(enriched_steps, video_jobs, descriptions)
+
+    return enriched_steps
+
+
+async def create_enriched_flow_description_async(
+    client,
+    cache,
+    steps: Sequence[Step],
+    captured_events: Sequence[Event],
+    max_concurrency: int = DEFAULT_VIDEO_WORKERS
+) -> str:
+    """
+    Async variant of create_enriched_flow_description.
+
+    All VIDEO steps are fanned out on the running event loop, with at most
+    max_concurrency requests in flight.
+
+    Args:
+        client: AsyncOpenAI client
+        cache: Cache instance
+        steps: All flow steps
+        captured_events: All captured events
+        max_concurrency: Maximum number of VIDEO steps analyzed at once
+
+    Returns:
+        Enriched description with all steps described
+    """
+    from utils import async_cached_openai_request
+
+    print("\n→ Analyzing flow steps with video context...")
+
+    async def request(**request_kwargs):
+        return await async_cached_openai_request(client=client, cache=cache, **request_kwargs)
+
+    enriched_steps, video_jobs = describe_static_steps(steps)
+    descriptions = await describe_video_steps(request, steps, captured_events, max_concurrency)
+
+    fill_video_descriptions(enriched_steps, video_jobs, descriptions)
+
+    return enriched_steps
+
+
+def build_interactions_request(enriched_steps: List[Dict]) -> Dict[str, Any]:
+    """
+    Build the request that turns enriched steps into a bulleted list.
+
+    Args:
+        enriched_steps: Output of create_enriched_flow_description()
+
+    Returns:
+        Keyword arguments for cached_openai_request (without client/cache)
+    """
     # Build a narrative from enriched steps
     narrative_parts = []
     for step in enriched_steps:
@@ -252,9 +386,7 @@ def create_user_interactions_with_videos(client, cache, flow_data: Dict) -> str:
             narrative_parts.append(step['action'])
 
     # Use LLM to organize into clean bulleted list
-    interactions_response = cached_openai_request(
-        client=client,
-        cache=cache,
+    return dict(
         request_type="chat",
         model="gpt-4o",
         messages=[
@@ -281,4 +413,69 @@ Format as markdown with proper bullets."""
         max_tokens=1000
     )
 
+
+def create_user_interactions_with_videos(
+    client,
+    cache,
+    flow_data: Flow,
+    max_workers: int = DEFAULT_VIDEO_WORKERS
+) -> str:
+    """
+    Create user interactions list with VIDEO descriptions interwoven.
+
+    Args:
+        client: OpenAI client
+        cache: Cache instance
+        flow_data: Complete flow data
+        max_workers: Maximum number of VIDEO steps analyzed at once
+
+    Returns:
+        Markdown bulleted list of user interactions
+    """
+    from utils import cached_openai_request
+
+    # Get enriched step descriptions
+    enriched_steps = create_enriched_flow_description(
+        client, cache, flow_data.steps, flow_data.events, max_workers=max_workers
+    )
+
+    interactions_response = cached_openai_request(
+        client=client,
+        cache=cache,
+        **build_interactions_request(enriched_steps)
+    )
+
+    return interactions_response['choices'][0]['message']['content']
+
+
+async def create_user_interactions_with_videos_async(
+    client,
+    cache,
+    flow_data: Flow,
+    max_concurrency: int = DEFAULT_VIDEO_WORKERS
+) -> str:
+    """
+    Async variant of create_user_interactions_with_videos.
+
+    Args:
+        client: AsyncOpenAI client
+        cache: Cache instance
+        flow_data: Complete flow data
+        max_concurrency: Maximum number of VIDEO steps analyzed at once
+
+    Returns:
+        Markdown bulleted list of user interactions
+    """
+    from utils import async_cached_openai_request
+
+    enriched_steps = await create_enriched_flow_description_async(
+        client, cache, flow_data.steps, flow_data.events, max_concurrency=max_concurrency
+    )
+
+    interactions_response = await async_cached_openai_request(
+        client=client,
+        cache=cache,
+        **build_interactions_request(enriched_steps)
+    )
+
     return interactions_response['choices'][0]['message']['content']
@@ -0,0 +1,172 @@
+"""
+Normalized timeline of a flow's captured events.
+
+Captured events carry wall-clock epoch milliseconds: a single time for
+clicks, a start and end for typing, scrolling and dragging (see
+flow_model.Event). VIDEO steps describe their segment as fractions of the
+recording's duration. To compare the two, each recording's epoch origin is
+recovered from the clicks that bracket its segments: a VIDEO step starts
+where the click of the IMAGE step before it happened and ends at the click
+of the IMAGE step after it.
+
+An EventTimeline converts every event once to a (start, end) interval in
+seconds from that origin, sorts the intervals by start and indexes their
+ends in a max-tree, so the events overlapping any segment are found in
+O((k + 1) log n) instead of a scan over all n events.
+"""
+
+import statistics
+from bisect import bisect_right
+from typing import Dict, List, Sequence
+
+from flow_model import Event, Step, VideoStep
+
+# Event times above this are epoch milliseconds (2001-09-09 onwards)
+_EPOCH_MS_THRESHOLD = 1_000_000_000_000
+
+
+def _video_key(step: VideoStep) -> str:
+    """Identify the recording a VIDEO step is a segment of."""
+    return step.asset_id or step.url or ''
+
+
+def video_origins_ms(steps: Sequence[Step], events: Sequence[Event]) -> Dict[str, float]:
+    """
+    Estimate the epoch time at which each recording started.
+
+    Every VIDEO step next to an IMAGE step whose click was captured gives
+    one estimate: the click time minus the segment's start (for the step
+    before) or end (for the step after). The median of a recording's
+    estimates is used; recordings without any fall back to the median over
+    all recordings, then to the first event.
+
+    Args:
+        steps: All flow steps
+        events: All captured events
+
+    Returns:
+        Mapping of recording key (assetId, else URL) to origin in epoch ms;
+        empty if event times are already relative
+    """
+    starts = [event.start_ms for event in events if event.start_ms is not None]
+    if not starts or max(starts) < _EPOCH_MS_THRESHOLD:
+        return {}
+
+    click_times = {event.click_id: event.start_ms for event in events
+                   if event.click_id and event.start_ms is not None}
+
+    anchors: Dict[str, List[float]] = {}
+    for index, step in enumerate(steps):
+        if step.type != 'VIDEO':
+            continue
+        estimates = anchors.setdefault(_video_key(step), [])
+        if index > 0 and steps[index - 1].id in click_times:
+            estimates.append(click_times[steps[index - 1].id] - step.start_seconds * 1000)
+        if index + 1 < len(steps) and steps[index + 1].id in click_times:
+            estimates.append(click_times[steps[index + 1].id] - step.end_seconds * 1000)
+
+    all_estimates = [estimate for estimates in anchors.values() for estimate in estimates]
+    fallback = statistics.median(all_estimates) if all_estimates else min(starts)
+    return {key: statistics.median(estimates) if estimates else fallback for key, estimates in anchors.items()}
+
+
+class EventTimeline:
+    """
+    Captured events of one recording as intervals in seconds, indexed for
+    overlap queries.
+    """
+
+    def __init__(self, events: Sequence[Event], origin_ms: float = 0):
+        """
+        Build the timeline.
+
+        Args:
+            events: Captured events (events without a time are dropped)
+            origin_ms: Event time that corresponds to second 0
+        """
+        spans = []
+        for position, event in enumerate(events):
+            if event.start_ms is not None:
+                start = (event.start_ms - origin_ms) / 1000
+                end = (event.end_ms - origin_ms) / 1000
+                spans.append((start, end, position, event))
+        spans.sort(key=lambda span: (span[0], span[2]))
+
+        self._starts = [span[0] for span in spans]
+        self._events = [span[3] for span in spans]
+
+        # Max-tree over the ends: node i covers its leaves, leaf size + j is span j
+        self._size = 1
+        while self._size < len(spans):
+            self._size *= 2
+        self._max_end = [float('-inf')] * (2 * self._size)
+        for j, span in enumerate(spans):
+            self._max_end[self._size + j] = span[1]
+        for node in range(self._size - 1, 0, -1):
+            self._max_end[node] = max(self._max_end[2 * node], self._max_end[2 * node + 1])
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def overlapping(self, start: float, end: float) -> List[Event]:
+        """
+        Get the events overlapping [start, end] (inclusive), by start time.
+
+        Args:
+            start: Segment start in seconds
+            end: Segment end in seconds
+
+        Returns:
+            Events whose interval intersects the segment
+        """
+        # Only events starting by `end` can overlap; of those, keep the ones
+        # ending at or after `start`, descending only into subtrees that have one
+        limit = bisect_right(self._starts, end)
+        found = []
+        stack = [(1, 0, self._size)]
+        while stack:
+            node, lo, hi = stack.pop()
+            if lo >= limit or self._max_end[node] < start:
+                continue
+            if node >= self._size:
+                found.append(self._events[lo])
+                continue
+            mid = (lo + hi) // 2
+            # Right child first so the left one is popped (and emitted) first
+            stack.append((2 * node + 1, mid, hi))
+            stack.append((2 * node, lo, mid))
+        return found
+
+
+class FlowTimeline:
+    """
+    Event timelines for every recording in a flow, built once per flow.
+    """
+
+    def __init__(self, steps: Sequence[Step], events: Sequence[Event]):
+        """
+        Build the timelines.
+
+        Args:
+            steps: All flow steps
+            events: All captured events
+        """
+        origins = video_origins_ms(steps, events)
+        self._timelines = {key: EventTimeline(events, origin) for key, origin in origins.items()}
+        # Relative event times (or no VIDEO steps): one shared timeline from 0
+        self._default = EventTimeline(events) if not origins else None
+
+    def events_for(self, step: VideoStep) -> List[Event]:
+        """
+        Get the captured events that overlap a VIDEO step's segment.
+
+        Args:
+            step: A VIDEO step
+
+        Returns:
+            Overlapping events in time order
+        """
+        timeline = self._timelines.get(_video_key(step), self._default)
+        if timeline is None:
+            return []
+        return timeline.overlapping(step.start_seconds, step.end_seconds)
@@ -0,0 +1,405 @@
+"""
+Local stand-in for the OpenAI chat-completions and image-generation API.
+
+Point a client at FakeOpenAIServer.base_url (or run this module and pass
+--base-url to generate_report or batch_report) to measure throughput and
+tail latency without network access or spend. Every response is delayed by
+a draw from a configurable latency distribution and a configurable fraction
+fail with 500s. Request and token budgets per minute are enforced with 429s
+and reported in the x-ratelimit-* headers the real API sends, so
+RateLimiter and the SDK's retry handling see what they would in production.
+
+Chat requests get filler text, except the report pipeline's two JSON
+requests (prompt variations and image selection), which get well-formed
+answers so a whole report can be generated against the server. Generated
+image URLs point back at the server, which serves a small PNG for each.
+
+Usage:
+    python fake_openai_server.py [--port 8089] [--latency lognormal:800,0.5] [--error-rate 0.02]
+                                 [--rpm 500] [--tpm 30000] [--seed 0]
+"""
+
+import argparse
+import json
+import math
+import random
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from rate_limit import TokenBucket, estimate_tokens
+
+DEFAULT_PORT = 8089
+DEFAULT_COMPLETION_WORDS = 60
+IMAGE_SIZE = 64
+
+_FILLER_WORDS = ("the user opens the page selects an option and confirms the change before moving on to "
+                 "the next step of the flow").split()
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    Build a latency sampler from a spec in milliseconds.
+
+    Supported specs are "fixed:MS", "uniform:LOW,HIGH", "exponential:MEAN"
+    and "lognormal:MEDIAN,SIGMA" (SIGMA is the log-space standard deviation;
+    0.5 puts p99 at about 3.2x the median).
+
+    Args:
+        spec: Distribution name and parameters
+
+    Returns:
+        Function drawing a delay in seconds from a random.Random
+
+    Raises:
+        ValueError: If the spec is malformed
+    """
+    name, _, params = spec.partition(':')
+    try:
+        values = [float(value) for value in params.split(',')] if params else []
+    except ValueError:
+        raise ValueError(f"Invalid latency parameters: {spec!r}") from None
+
+    if name == 'fixed' and len(values) == 1:
+        return lambda rng: values[0] / 1000
+    if name == 'uniform' and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1]) / 1000
+    if name == 'exponential' and len(values) == 1:
+        return lambda rng: rng.expovariate(1000 / values[0]) if values[0] > 0 else 0.0
+    if name == 'lognormal' and len(values) == 2:
+        return lambda rng: values[0] / 1000 * math.exp(rng.gauss(0, values[1]))
+    raise ValueError(f"Unknown latency spec: {spec!r} (use fixed:MS, uniform:LOW,HIGH, "
+                     f"exponential:MEAN or lognormal:MEDIAN,SIGMA)")
+
+
+def _format_duration(seconds: float) -> str:
+    """Format a delay the way x-ratelimit-reset-* headers do ("20ms", "1.5s")."""
+    if seconds < 1:
+        return f"{max(0, math.ceil(seconds * 1000))}ms"
+    return f"{seconds:.3f}".rstrip('0').rstrip('.') + "s"
+
+
+def solid_png(width: int, height: int, rgb: Tuple[int, int, int]) -> bytes:
+    """Encode a single-colour RGB image as PNG."""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    rows = b''.join(b'\x00' + bytes(rgb) * width for _ in range(height))
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(rows)) + chunk(b'IEND', b'')
+
+
+def _message_text(body: Dict[str, Any]) -> str:
+    """Concatenate the text parts of a chat request's messages."""
+    parts = []
+    for message in body.get('messages', []):
+        content = message.get('content')
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.extend(part.get('text', '') for part in content or [] if part.get('type') == 'text')
+    return '\n'.join(parts)
+
+
+def report_responder(body: Dict[str, Any], rng: random.Random, words: int) -> str:
+    """
+    Answer a chat request like the report pipeline expects.
+
+    Args:
+        body: Chat-completions request body
+        rng: Random source (for scores and filler)
+        words: Filler length for free-text answers
+
+    Returns:
+        Assistant message content
+    """
+    text = _message_text(body)
+    if '"prompts"' in text:
+        return json.dumps({"prompts": [
+            {"variation": variation, "prompt": f"A {variation.lower()} illustration of the flow"}
+            for variation in ("Minimal & Modern", "Bold & Dynamic", "Elegant & Editorial")
+        ]})
+    if '"selected_image"' in text:
+        criteria = ("visual_appeal", "professionalism", "relevance", "engagement", "overall")
+        return json.dumps({
+            "selected_image": rng.randint(1, 3),
+            "reasoning": "Simulated selection.",
+            "scores": {f"image_{n}": {name: rng.randint(5, 10) for name in criteria} for n in (1, 2, 3)}
+        })
+    return ' '.join(rng.choice(_FILLER_WORDS) for _ in range(words)).capitalize() + '.'
+
+
+class FakeOpenAIServer:
+    """
+    Threaded HTTP server imitating the OpenAI API for load tests.
+
+    Use as a context manager (the server runs on a background thread) or
+    call serve_forever() to run it in the foreground.
+    """
+
+    def __init__(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        latency: str = 'fixed:0',
+        error_rate: float = 0.0,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        completion_words: int = DEFAULT_COMPLETION_WORDS,
+        seed: Optional[int] = None
+    ):
+        """
+        Create the server (bound, but not yet serving).
+
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 picks a free one)
+            latency: Latency spec (see parse_latency)
+            error_rate: Fraction of admitted requests answered with a 500
+            requests_per_minute: Request budget (None for unlimited)
+            tokens_per_minute: Chat token budget, charged like the API
+                charges it: prompt tokens plus max_tokens (None for unlimited)
+            completion_words: Length of free-text chat answers
+            seed: Seed for latencies, errors and answers
+        """
+        self.sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.completion_words = completion_words
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._images: Dict[str, bytes] = {}
+        self._counts: Dict[str, int] = {}
+        self._in_flight = 0
+        self._max_in_flight = 0
+        self._served = 0
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b'{}')
+                except json.JSONDecodeError:
+                    fake._send_error(self, 400, "invalid_request_error", "Request body is not valid JSON")
+                    return
+                if self.path.rstrip('/') in ('/v1/chat/completions', '/v1/images/generations'):
+                    fake._handle_api(self, body)
+                else:
+                    fake._send_error(self, 404, "invalid_request_error", f"Unknown path {self.path}")
+
+            def do_GET(self):
+                image = fake._images.get(self.path)
+                if image is None:
+                    fake._send_error(self, 404, "invalid_request_error", f"Unknown path {self.path}")
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/png')
+                self.send_header('Content-Length', str(len(image)))
+                self.end_headers()
+                self.wfile.write(image)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def base_url(self) -> str:
+        """Value for the OpenAI client's base_url."""
+        return self.url + "/v1"
+
+    def _rate_limit_headers(self) -> Dict[str, str]:
+        """x-ratelimit-* headers for the current budgets (lock held)."""
+        headers = {}
+        for kind, bucket in (('requests', self.requests), ('tokens', self.tokens)):
+            if bucket is None:
+                continue
+            bucket.refund(0)  # brings the level up to date
+            remaining = max(0, int(bucket.tokens))
+            headers[f'x-ratelimit-limit-{kind}'] = str(int(bucket.capacity))
+            headers[f'x-ratelimit-remaining-{kind}'] = str(remaining)
+            headers[f'x-ratelimit-reset-{kind}'] = _format_duration((bucket.capacity - bucket.tokens) / bucket.rate)
+        return headers
+
+    def _admit(self, token_cost: int) -> Tuple[float, Dict[str, str]]:
+        """
+        Charge a request against the budgets (lock held).
+
+        Returns:
+            (seconds until it would fit, 0 if admitted; rate-limit headers)
+        """
+        charges = [(bucket, amount) for bucket, amount in ((self.requests, 1), (self.tokens, token_cost))
+                   if bucket is not None and amount]
+        waits = [bucket.reserve(amount) for bucket, amount in charges]
+        wait = max(waits, default=0.0)
+        if wait > 0:
+            for bucket, amount in charges:
+                bucket.refund(amount)
+        return wait, self._rate_limit_headers()
+
+    def _handle_api(self, handler: BaseHTTPRequestHandler, body: Dict[str, Any]):
+        is_chat = handler.path.rstrip('/').endswith('/chat/completions')
+        token_cost = estimate_tokens('chat' if is_chat else 'image', body)
+
+        with self._lock:
+            wait, headers = self._admit(token_cost)
+            if wait > 0:
+                self._counts['429'] = self._counts.get('429', 0) + 1
+            else:
+                self._in_flight += 1
+                self._max_in_flight = max(self._max_in_flight, self._in_flight)
+                self._served += 1
+                serial = self._served
+                delay = max(0.0, self.sample_latency(self._rng))
+                fail = self._rng.random() < self.error_rate
+                rng = random.Random(self._rng.random())
+
+        if wait > 0:
+            headers['retry-after-ms'] = str(math.ceil(wait * 1000))
+            headers['retry-after'] = str(math.ceil(wait))
+            self._send_error(handler, 429, "requests", "Rate limit reached (simulated)",
+                             code="rate_limit_exceeded", headers=headers)
+            return
+
+        try:
+            time.sleep(delay)
+            headers['openai-processing-ms'] = str(int(delay * 1000))
+            if fail:
+                self._send_error(handler, 500, "server_error", "The server had an error (simulated)",
+                                 headers=headers)
+                with self._lock:
+                    self._counts['500'] = self._counts.get('500', 0) + 1
+                return
+            if is_chat:
+                payload = self._chat_response(body, serial, rng, token_cost)
+            else:
+                payload = self._image_response(body, serial, rng)
+            self._send_json(handler, 200, payload, headers)
+            with self._lock:
+                self._counts['200'] = self._counts.get('200', 0) + 1
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _chat_response(self, body: Dict[str, Any], serial: int, rng: random.Random, token_cost: int) -> Dict:
+        content = report_responder(body, rng, self.completion_words)
+        prompt_tokens = token_cost - int(body.get('max_tokens') or 0)
+        completion_tokens = max(1, len(content) // 4)
+        return {
+            "id": f"chatcmpl-fake-{serial}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get('model', 'gpt-4o'),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content, "refusal": None},
+                "logprobs": None,
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+    def _image_response(self, body: Dict[str, Any], serial: int, rng: random.Random) -> Dict:
+        data = []
+        for index in range(int(body.get('n') or 1)):
+            path = f"/images/{serial}-{index}.png"
+            color = tuple(rng.randrange(256) for _ in range(3))
+            with self._lock:
+                self._images[path] = solid_png(IMAGE_SIZE, IMAGE_SIZE, color)
+            data.append({"url": self.url + path, "revised_prompt": body.get('prompt', '')})
+        return {"created": int(time.time()), "data": data}
+
+    def _send_json(self, handler: BaseHTTPRequestHandler, status: int, payload: Dict,
+                   headers: Optional[Dict[str, str]] = None):
+        encoded = json.dumps(payload).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(encoded)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(encoded)
+
+    def _send_error(self, handler: BaseHTTPRequestHandler, status: int, error_type: str, message: str,
+                    code: Optional[str] = None, headers: Optional[Dict[str, str]] = None):
+        error = {"message": message, "type": error_type, "param": None, "code": code}
+        self._send_json(handler, status, {"error": error}, headers)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get request counters.
+
+        Returns:
+            Dict with responses per status code, peak concurrent requests
+            and images served
+        """
+        with self._lock:
+            return {
+                'responses': dict(self._counts),
+                'max_in_flight': self._max_in_flight,
+                'images': len(self._images)
+            }
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a fake OpenAI API for offline load testing.")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to bind")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port to bind")
+    parser.add_argument("--latency", default="lognormal:800,0.5",
+                        help="latency distribution in ms: fixed:MS, uniform:LOW,HIGH, exponential:MEAN "
+                             "or lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 500")
+    parser.add_argument("--rpm", type=int, default=None, help="requests per minute before 429s")
+    parser.add_argument("--tpm", type=int, default=None, help="chat tokens per minute before 429s")
+    parser.add_argument("--completion-words", type=int, default=DEFAULT_COMPLETION_WORDS,
+                        help="length of free-text chat answers")
+    parser.add_argument("--seed", type=int, default=None, help="seed for latencies, errors and answers")
+    args = parser.parse_args(argv)
+
+    try:
+        fake = FakeOpenAIServer(args.host, args.port, args.latency, args.error_rate, args.rpm, args.tpm,
+                                args.completion_words, args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Fake OpenAI API at {fake.base_url} (Ctrl-C to stop)")
+    try:
+        fake.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake.server.server_close()
+        print(f"\n{json.dumps(fake.stats())}")
+
+
+if __name__ == "__main__":
+    main()
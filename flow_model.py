@@ -0,0 +1,203 @@
+"""
+Compact typed representation of an Arcade flow.
+
+flow.json carries far more than the pipeline reads (blurhashes, theme and
+player settings, hotspot geometry, editor metadata). Flow.from_dict keeps
+only the fields analysis and reporting use, in slotted dataclasses, so a
+batch worker holding many flows pays for a few attributes per step instead
+of a tree of dicts, and code reads ``step.click.text`` instead of chained
+``.get()`` calls with defaults.
+"""
+
+import dataclasses
+from dataclasses import dataclass
+from typing import Any, ClassVar, Dict, Iterable, Optional, Tuple, Union
+
+from utils import canonical_json_sha256
+
+
+@dataclass(slots=True)
+class Click:
+    """What the user clicked on an IMAGE step (clickContext)."""
+    text: Optional[str] = None
+    element_type: Optional[str] = None
+
+
+@dataclass(slots=True)
+class ChapterStep:
+    """Intro/outro card."""
+    type: ClassVar[str] = 'CHAPTER'
+    id: Optional[str] = None
+    title: str = ''
+    subtitle: str = ''
+
+
+@dataclass(slots=True)
+class ImageStep:
+    """Screenshot step, usually the result of a click."""
+    type: ClassVar[str] = 'IMAGE'
+    id: Optional[str] = None
+    asset_id: Optional[str] = None
+    url: Optional[str] = None
+    click: Optional[Click] = None
+    page_url: str = ''
+    page_title: str = ''
+    hotspot_label: str = ''
+
+
+@dataclass(slots=True)
+class VideoStep:
+    """Segment of a screen recording between two clicks."""
+    type: ClassVar[str] = 'VIDEO'
+    id: Optional[str] = None
+    asset_id: Optional[str] = None
+    url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    start_time_frac: float = 0.0
+    end_time_frac: float = 0.0
+    duration: float = 0.0
+
+    @property
+    def start_seconds(self) -> float:
+        """Segment start, in seconds into the recording."""
+        return self.start_time_frac * self.duration
+
+    @property
+    def end_seconds(self) -> float:
+        """Segment end, in seconds into the recording."""
+        return self.end_time_frac * self.duration
+
+
+@dataclass(slots=True)
+class OtherStep:
+    """Step of a type the pipeline does not analyze."""
+    type: str = ''
+    id: Optional[str] = None
+
+
+Step = Union[ChapterStep, ImageStep, VideoStep, OtherStep]
+
+
+@dataclass(slots=True)
+class Event:
+    """
+    A captured interaction: clicks have a single time, typing, scrolling
+    and dragging a start and end (epoch milliseconds).
+    """
+    type: str = 'unknown'
+    start_ms: Optional[float] = None
+    end_ms: Optional[float] = None
+    click_id: Optional[str] = None
+
+
+# Top-level flow.json keys Flow.from_dict reads besides steps and capturedEvents
+METADATA_KEYS = ('name', 'description', 'uploadId', 'createdWith', 'useCase')
+
+
+@dataclass(slots=True)
+class Flow:
+    """The parts of a flow.json that analysis and reporting use."""
+    name: Optional[str] = None
+    description: str = ''
+    upload_id: str = 'N/A'
+    created_with: str = 'N/A'
+    use_case: str = 'N/A'
+    steps: Tuple[Step, ...] = ()
+    events: Tuple[Event, ...] = ()
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Flow':
+        """
+        Build a Flow from parsed flow.json contents.
+
+        Args:
+            data: flow.json as loaded by json.load
+
+        Returns:
+            Flow holding only the fields the pipeline uses
+        """
+        return cls(
+            name=data.get('name'),
+            description=data.get('description', ''),
+            upload_id=data.get('uploadId', 'N/A'),
+            created_with=data.get('createdWith', 'N/A'),
+            use_case=data.get('useCase', 'N/A'),
+            steps=tuple(parse_step(step) for step in data.get('steps', [])),
+            events=tuple(parse_event(event) for event in data.get('capturedEvents', []))
+        )
+
+    def fingerprint(self) -> str:
+        """SHA-256 of the flow's contents, for checkpointing."""
+        return canonical_json_sha256({
+            **{field.name: getattr(self, field.name) for field in dataclasses.fields(self)
+               if field.name not in ('steps', 'events')},
+            'steps': [{'type': step.type, **dataclasses.asdict(step)} for step in self.steps],
+            'events': [dataclasses.asdict(event) for event in self.events]
+        })
+
+
+def parse_step(step: Dict[str, Any]) -> Step:
+    """
+    Build a typed step from a flow.json step.
+
+    Args:
+        step: One entry of flow.json ``steps``
+
+    Returns:
+        ChapterStep, ImageStep, VideoStep or OtherStep
+    """
+    step_type = step.get('type')
+
+    if step_type == 'CHAPTER':
+        return ChapterStep(id=step.get('id'), title=step.get('title', ''), subtitle=step.get('subtitle', ''))
+
+    if step_type == 'IMAGE':
+        click_ctx = step.get('clickContext')
+        page_ctx = step.get('pageContext', {})
+        hotspots = step.get('hotspots')
+        return ImageStep(
+            id=step.get('id'),
+            asset_id=step.get('assetId'),
+            url=step.get('url'),
+            click=Click(click_ctx.get('text'), click_ctx.get('elementType')) if click_ctx else None,
+            page_url=page_ctx.get('url', ''),
+            page_title=page_ctx.get('title', ''),
+            hotspot_label=hotspots[0].get('label', '') if hotspots else ''
+        )
+
+    if step_type == 'VIDEO':
+        return VideoStep(
+            id=step.get('id'),
+            asset_id=step.get('assetId'),
+            url=step.get('url'),
+            thumbnail_url=step.get('videoThumbnailUrl'),
+            start_time_frac=step['startTimeFrac'],
+            end_time_frac=step['endTimeFrac'],
+            duration=step['duration']
+        )
+
+    return OtherStep(type=step_type or '', id=step.get('id'))
+
+
+def parse_event(event: Dict[str, Any]) -> Event:
+    """
+    Build a typed event from a flow.json captured event.
+
+    Args:
+        event: One entry of flow.json ``capturedEvents``
+
+    Returns:
+        Event; instantaneous events have equal start and end
+    """
+    if event.get('startTimeMs') is not None:
+        start = event['startTimeMs']
+        end = event.get('endTimeMs')
+        end = start if end is None else max(start, end)
+    else:
+        start = end = event.get('timeMs')
+    return Event(type=event.get('type', 'unknown'), start_ms=start, end_ms=end, click_id=event.get('clickId'))
+
+
+def parse_steps(steps: Iterable[Dict[str, Any]]) -> Tuple[Step, ...]:
+    """Build typed steps from flow.json step dicts."""
+    return tuple(parse_step(step) for step in steps)
@@ -0,0 +1,160 @@
+"""
+Incremental reader for flow.json.
+
+json.load materializes the whole document as nested dicts before anything
+can use it, and for long recordings with thousands of steps and events that
+tree is several times the size of the file. iter_flow reads the file in
+chunks and decodes one top-level value, or one element of ``steps`` or
+``capturedEvents``, at a time, turning elements into flow_model objects as
+they arrive. Only the current element and the objects built so far are held
+in memory.
+"""
+
+import dataclasses
+import json
+import re
+from typing import IO, Any, Iterator, Tuple
+
+from flow_model import METADATA_KEYS, Flow, parse_event, parse_step
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# Top-level arrays yielded element by element, and how each element is parsed
+STREAMED_ARRAYS = {'steps': parse_step, 'capturedEvents': parse_event}
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class _ChunkReader:
+    """Buffered text reader that decodes one JSON value at a time."""
+
+    def __init__(self, fp: IO[str], chunk_size: int):
+        self._fp = fp
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._offset = 0  # file offset of _buffer[0]
+        self._eof = False
+
+    def _fill(self, size: int = 0) -> bool:
+        """Read at least one chunk (and at least size characters); False at end of file."""
+        if self._pos > len(self._buffer) // 2:
+            # Drop the consumed prefix so the buffer only holds unread text
+            self._offset += self._pos
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        chunk = self._fp.read(max(size, self._chunk_size))
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer += chunk
+        return True
+
+    def error(self, message: str) -> ValueError:
+        return ValueError(f"Malformed flow JSON at offset {self._offset + self._pos}: {message}")
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character ('' at end of file)."""
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char: str):
+        """Consume char, the next non-whitespace character."""
+        if self.peek() != char:
+            raise self.error(f"expected {char!r}")
+        self._pos += 1
+
+    def value(self) -> Any:
+        """Decode the next JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as e:
+                if self._eof:
+                    raise self.error(e.msg) from None
+            else:
+                # A number ending at the buffer's end may continue in the next chunk
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            # Read as much again as is buffered, so a value spanning many
+            # chunks is re-decoded O(log n) times rather than once per chunk
+            self._fill(len(self._buffer) - self._pos)
+
+
+def iter_flow(fp: IO[str], chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[str, Any]]:
+    """
+    Read a flow.json document incrementally.
+
+    Args:
+        fp: Text file object positioned at the start of the document
+        chunk_size: Characters to read at a time
+
+    Yields:
+        (key, value) pairs in document order: one pair per element of
+        ``steps`` (a flow_model step) and ``capturedEvents`` (an Event), and
+        one per other top-level key with its decoded value
+
+    Raises:
+        ValueError: If the document is not a flow JSON object
+    """
+    reader = _ChunkReader(fp, chunk_size)
+    reader.expect('{')
+    if reader.peek() == '}':
+        reader.expect('}')
+    else:
+        while True:
+            key = reader.value()
+            if not isinstance(key, str):
+                raise reader.error("expected an object key")
+            reader.expect(':')
+
+            parse = STREAMED_ARRAYS.get(key)
+            if parse is None:
+                yield key, reader.value()
+            else:
+                reader.expect('[')
+                if reader.peek() != ']':
+                    while True:
+                        yield key, parse(reader.value())
+                        if reader.peek() != ',':
+                            break
+                        reader.expect(',')
+                reader.expect(']')
+
+            if reader.peek() != ',':
+                break
+            reader.expect(',')
+        reader.expect('}')
+
+    if reader.peek():
+        raise reader.error("unexpected data after the flow object")
+
+
+def read_flow(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Flow:
+    """
+    Load a flow.json file into a Flow without building its dict tree.
+
+    Args:
+        path: Path to the flow JSON file
+        chunk_size: Characters to read at a time
+
+    Returns:
+        Flow equal to Flow.from_dict(json.load(...)) on the same file
+    """
+    metadata = {}
+    items = {key: [] for key in STREAMED_ARRAYS}
+    with open(path, 'r', encoding='utf-8') as f:
+        for key, value in iter_flow(f, chunk_size):
+            if key in items:
+                items[key].append(value)
+            elif key in METADATA_KEYS:
+                metadata[key] = value
+    flow = Flow.from_dict(metadata)
+    return dataclasses.replace(flow, steps=tuple(items['steps']), events=tuple(items['capturedEvents']))
@@ -3,86 +3,132 @@ Script to analyze Arcade flow data and generate a comprehensive markdown report.
 """
 
 import os
-import json
 import re
+import hashlib
+import argparse
+import asyncio
+import logging
 import yaml
 import requests
 from datetime import datetime
-from openai import OpenAI
-from utils import OpenAICache, cached_openai_request, download_image, generate_markdown_report, extract_json_from_response
-from enhanced_video_analysis import create_user_interactions_with_videos
-from concurrent.futures import ThreadPoolExecutor, as_completed
-
-def generate_single_image(client, cache, index, prompt_info):
-        """Generate a single image and download it."""
-        i = index + 1  # 1-based index for display
-        variation = prompt_info['variation']
-        prompt = prompt_info['prompt']
-
-        print(f"\n  Image {i} ({variation}): Starting generation...")
-
-        image_response = cached_openai_request(
-            client=client,
-            cache=cache,
-            request_type="image",
-            model="dall-e-3",
-            prompt=prompt,
-            size="1024x1024",
-            quality="standard",
-            n=1
-        )
-
-        image_url = image_response['data'][0]['url']
-        image_filename = f"social_media_image_{i}.png"
-
-        # Download the image
-        if download_image(image_url, image_filename):
-            print(f"  ✓ Image {i} ({variation}): Downloaded {image_filename}")
-        else:
-            print(f"  ⚠ Image {i} ({variation}): Failed to download {image_filename}")
-
-        return {
-            'number': i,
-            'url': image_url,
-            'path': image_filename,
-            'prompt': prompt,
-            'prompt_variation': variation,
-            'selected': False,
-            'index': index  # For sorting
-        }
-
-def main():
-    # Initialize OpenAI client
-    secrets = yaml.safe_load(open("secrets.yaml"))
+from concurrent.futures import ThreadPoolExecutor
+from openai import OpenAI, AsyncOpenAI
+from utils import (
+    OpenAICache,
+    cached_openai_request,
+    async_cached_openai_request,
+    download_image,
+    generate_markdown_report,
+    extract_json_from_response,
+)
+from enhanced_video_analysis import (
+    DEFAULT_VIDEO_WORKERS,
+    build_interactions_request,
+    describe_static_steps,
+    describe_video_steps,
+    fill_video_descriptions,
+)
+import tracing
+from pipeline import Pipeline
+from structured_logging import add_logging_arguments, get_logger, log_event, logging_configured, logging_options
+from flow_stream import read_flow
+from checkpoints import CheckpointStore
+from asset_store import AssetStore
+from image_prep import prepare_image_file
+from rate_limit import RateLimiter, RateLimitedClient, AsyncRateLimitedClient
+
+_log = get_logger("pipeline")
+
+# Bump a stage's version when its prompt template or output format changes;
+# its checkpoint and those of every downstream stage are then recomputed
+STAGE_VERSIONS = {
+    'static_steps': 1,
+    'video_descriptions': 2,
+    'interactions': 1,
+    'summary': 1,
+    'image_prompts': 1,
+    'images': 1,
+    'selection': 1,
+    'report': 1,
+}
+
+
+def load_api_key(secrets_path="secrets.yaml"):
+    """Read the OpenAI API key from the secrets file."""
+    secrets = yaml.safe_load(open(secrets_path))
     api_key = secrets.get("openai-key")
     if not api_key:
         raise ValueError("openai-key not found in secrets.yaml")
+    return api_key
+
+
+def create_client(limiter=None, use_async=False, base_url=None):
+    """
+    Create an OpenAI (or AsyncOpenAI) client, gated by limiter when given.
+
+    base_url points the client at another API host, such as a
+    fake_openai_server instance (None uses OPENAI_BASE_URL or the default).
+    """
+    client_class = AsyncOpenAI if use_async else OpenAI
+    if limiter is None:
+        return client_class(api_key=load_api_key(), base_url=base_url)
+
+    # The limiter retries 429s itself, using the server's suggested delays
+    client = client_class(api_key=load_api_key(), base_url=base_url, max_retries=0)
+    wrapper_class = AsyncRateLimitedClient if use_async else RateLimitedClient
+    return wrapper_class(client, limiter)
+
+
+def build_image_request(prompt):
+    """Build the DALL-E request for a single social media image."""
+    return dict(
+        request_type="image",
+        model="dall-e-3",
+        prompt=prompt,
+        size="1024x1024",
+        quality="standard",
+        n=1
+    )
 
-    client = OpenAI(api_key=api_key)
 
-    # Initialize cache
-    cache = OpenAICache(cache_dir=".cache")
+def output_path(output_dir, filename):
+    """Path of an output file inside output_dir ("." keeps the bare filename)."""
+    return os.path.normpath(os.path.join(output_dir, filename))
+
+
+def _image_info(index, prompt_info, image_url, image_filename):
+    """Describe a generated image for the selection stage and the report."""
+    return {
+        'number': index + 1,
+        'url': image_url,
+        'path': image_filename,
+        'prompt': prompt_info['prompt'],
+        'prompt_variation': prompt_info['variation'],
+        'selected': False,
+        'index': index  # For sorting
+    }
 
-    # Load flow data
-    print("\n=== Loading Flow Data ===")
-    with open("flow.json", 'r', encoding='utf-8') as f:
-        flow_data = json.load(f)
 
-    print(f"Flow Name: {flow_data.get('name')}")
-    print(f"Total Steps: {len(flow_data.get('steps', []))}")
+def save_generated_image(index, prompt_info, image_response, output_dir="."):
+    """Download a generated image into output_dir and describe it."""
+    i = index + 1  # 1-based index for display
+    variation = prompt_info['variation']
 
-    # Step 1: Identify User Interactions (with enriched video analysis)
-    print("\n=== Step 1: Identifying User Interactions with Video Context ===")
+    image_url = image_response['data'][0]['url']
+    image_filename = output_path(output_dir, f"social_media_image_{i}.png")
 
-    user_actions = create_user_interactions_with_videos(client, cache, flow_data)
-    print(f"\n{user_actions[:300]}...")
+    # Download the image
+    if download_image(image_url, image_filename):
+        log_event(_log, logging.INFO, "image_saved", image=i, variation=variation, path=image_filename)
+    else:
+        log_event(_log, logging.WARNING, "image_download_failed", image=i, variation=variation, path=image_filename)
 
-    # Step 2: Generate Human-Friendly Summary
-    print("\n=== Step 2: Generating Summary ===")
+    return _image_info(index, prompt_info, image_url, image_filename)
 
-    summary_response = cached_openai_request(
-        client=client,
-        cache=cache,
+
+def build_summary_request(flow_data, user_actions):
+    """Build the request for the human-friendly flow summary."""
+    return dict(
         request_type="chat",
         model="gpt-4o",
         messages=[
@@ -92,9 +138,9 @@ def main():
             },
             {
                 "role": "user",
-                "content": f"""Based on this Arcade flow titled "{flow_data.get('name')}", create a clear, readable summary (2-3 paragraphs) of what the user was trying to accomplish.
+                "content": f"""Based on this Arcade flow titled "{flow_data.name}", create a clear, readable summary (2-3 paragraphs) of what the user was trying to accomplish.
 
-Flow name: {flow_data.get('name')}
+Flow name: {flow_data.name}
 User interactions: {user_actions}
 
 Write a friendly, informative summary that explains the user's goal and the steps they took."""
@@ -104,20 +150,10 @@ Write a friendly, informative summary that explains the user's goal and the step
         max_tokens=800
     )
 
-    summary = summary_response['choices'][0]['message']['content']
-    print(f"\n{summary[:300]}...")
-
-    # Step 3: Create Multiple Social Media Images
-    print("\n=== Step 3: Generating Multiple Social Media Images ===")
 
-    flow_name = flow_data.get('name', 'Arcade Flow')
-
-    # Generate 3 different prompt variations
-    print("\n→ Creating 3 different image prompt variations...")
-
-    prompt_variations_response = cached_openai_request(
-        client=client,
-        cache=cache,
+def build_prompt_variations_request(flow_name, summary):
+    """Build the request for three DALL-E prompt variations."""
+    return dict(
         request_type="chat",
         model="gpt-4o",
         messages=[
@@ -157,56 +193,43 @@ Respond in JSON format:
         max_tokens=2000
     )
 
+
+def parse_prompt_variations(prompt_variations_response):
+    """Extract the list of prompt variations from the model response."""
     # Extract JSON from response (handles markdown code blocks)
     response_content = prompt_variations_response['choices'][0]['message']['content']
-    print(f"Debug - Raw response preview: {response_content[:200]}...")
+    log_event(_log, logging.DEBUG, "response_preview", stage="image_prompts", content=response_content[:200])
 
     prompts_data = extract_json_from_response(response_content)
-    image_prompts = prompts_data['prompts']
-
-    # Generate 3 images in parallel
-    print(f"\n→ Generating 3 images in parallel with different styles...")
-
-    # Execute image generation in parallel
-    all_images = []
-    with ThreadPoolExecutor(max_workers=3) as executor:
-        # Submit all image generation tasks
-        future_to_index = {
-            executor.submit(generate_single_image, client, cache, i, prompt_info): i
-            for i, prompt_info in enumerate(image_prompts)
-        }
+    return prompts_data['prompts']
 
-        # Collect results as they complete
-        for future in as_completed(future_to_index):
-            try:
-                image_info = future.result()
-                all_images.append(image_info)
-            except Exception as e:
-                index = future_to_index[future]
-                print(f"  ✗ Image {index + 1} generation failed: {e}")
 
-    # Sort by original index to maintain order
-    all_images.sort(key=lambda x: x['index'])
+def load_image_refs(cache, all_images, detail="low"):
+    """
+    Store local images in the cache's blob store and return their blob references.
 
-    print(f"\n✓ All {len(all_images)} images generated successfully!")
+    Images are first shrunk to the resolution the selection request's detail
+    level uses (see image_prep.prepare_image).
+    """
+    def load(img_info):
+        try:
+            return cache.blobs.put(*prepare_image_file(img_info['path'], detail))
+        except Exception as e:
+            log_event(_log, logging.WARNING, "image_read_failed", path=img_info['path'], error=e)
+            return img_info['url']  # Fallback to URL
 
-    # Step 4: Use VLM to select the best image
-    print("\n=== Step 4: Using Vision Model to Select Best Image ===")
+    # Pillow releases the GIL while decoding and resizing
+    with ThreadPoolExecutor(max_workers=max(1, len(all_images))) as executor:
+        return list(executor.map(load, all_images))
 
-    # Convert local images to base64 for vision API
-    import base64
 
-    image_data_urls = []
-    for img_info in all_images:
-        try:
-            with open(img_info['path'], 'rb') as f:
-                image_bytes = f.read()
-                image_b64 = base64.b64encode(image_bytes).decode('utf-8')
-                image_data_urls.append(f"data:image/png;base64,{image_b64}")
-        except Exception as e:
-            print(f"  Warning: Failed to read {img_info['path']}: {e}")
-            image_data_urls.append(img_info['url'])  # Fallback to URL
+def build_selection_request(flow_name, summary, all_images, image_refs):
+    """
+    Build the vision request that picks the best generated image.
 
+    Images are passed as blob references (or URLs), which cached_openai_request
+    expands to data URLs only when the request is sent.
+    """
     # Prepare messages with all three images
     vlm_messages = [
         {
@@ -246,7 +269,7 @@ Rate each criterion from 1-10."""
                 },
                 {
                     "type": "image_url",
-                    "image_url": {"url": image_data_urls[0], "detail": "low"}
+                    "image_url": {"url": image_refs[0], "detail": "low"}
                 },
                 {
                     "type": "text",
@@ -254,7 +277,7 @@ Rate each criterion from 1-10."""
                 },
                 {
                     "type": "image_url",
-                    "image_url": {"url": image_data_urls[1], "detail": "low"}
+                    "image_url": {"url": image_refs[1], "detail": "low"}
                 },
                 {
                     "type": "text",
@@ -262,7 +285,7 @@ Rate each criterion from 1-10."""
                 },
                 {
                     "type": "image_url",
-                    "image_url": {"url": image_data_urls[2], "detail": "low"}
+                    "image_url": {"url": image_refs[2], "detail": "low"}
                 },
                 {
                     "type": "text",
@@ -272,9 +295,7 @@ Rate each criterion from 1-10."""
         }
     ]
 
-    vlm_response = cached_openai_request(
-        client=client,
-        cache=cache,
+    return dict(
         request_type="chat",
         model="gpt-4o",  # Use GPT-4o for vision capabilities
         messages=vlm_messages,
@@ -283,9 +304,17 @@ Rate each criterion from 1-10."""
         response_format={"type": "json_object"}
     )
 
+
+def apply_image_selection(vlm_response, all_images):
+    """
+    Mark the image chosen by the VLM as selected.
+
+    Returns:
+        Tuple of (best image info, markdown-formatted selection reasoning)
+    """
     # Extract JSON from VLM response
     vlm_content = vlm_response['choices'][0]['message']['content']
-    print(f"Debug - VLM response preview: {vlm_content[:200]}...")
+    log_event(_log, logging.DEBUG, "response_preview", stage="selection", content=vlm_content[:200])
 
     selection_data = extract_json_from_response(vlm_content)
     selected_index = selection_data['selected_image'] - 1  # Convert to 0-based index
@@ -296,11 +325,9 @@ Rate each criterion from 1-10."""
     all_images[selected_index]['selected'] = True
     best_image = all_images[selected_index]
 
-    print(f"\n✓ Selected Image {selected_index + 1} ({best_image['prompt_variation']})")
-    print(f"  Reasoning: {selection_reasoning[:200]}...")
-    print(f"\n  Scores:")
-    for img_key, img_scores in scores.items():
-        print(f"    {img_key}: Overall {img_scores['overall']}/10")
+    log_event(_log, logging.INFO, "image_selected", image=selected_index + 1,
+              variation=best_image['prompt_variation'], reasoning=selection_reasoning[:200],
+              **{f"{img_key}_overall": img_scores['overall'] for img_key, img_scores in scores.items()})
 
     # Format selection reasoning for markdown
     formatted_reasoning = f"""**Selected Image:** Image {selected_index + 1} ({best_image['prompt_variation']})
@@ -317,37 +344,457 @@ Rate each criterion from 1-10."""
 | Image 3 ({all_images[2]['prompt_variation']}) | {scores['image_3']['visual_appeal']}/10 | {scores['image_3']['professionalism']}/10 | {scores['image_3']['relevance']}/10 | {scores['image_3']['engagement']}/10 | **{scores['image_3']['overall']}/10** |
 """
 
-    # Generate markdown report
+    return best_image, formatted_reasoning
+
+
+def mark_selected(all_images, best_image):
+    """Copy image infos with only best_image marked as selected."""
+    return [{**img, 'selected': img['number'] == best_image['number']} for img in all_images]
+
+
+def load_flow(flow_path="flow.json"):
+    """Load flow data from disk into a Flow."""
+    print("\n=== Loading Flow Data ===")
+    with tracing.span("load_flow", "stage", path=str(flow_path)):
+        flow_data = read_flow(flow_path)
+
+    print(f"Flow Name: {flow_data.name}")
+    print(f"Total Steps: {len(flow_data.steps)}")
+    return flow_data
+
+
+def write_report(flow_data, user_actions, summary, all_images, best_image, formatted_reasoning, output_dir="."):
+    """Render the markdown report and save it to REPORT.md in output_dir."""
     print("\n=== Generating Markdown Report ===")
 
+    # Image links are relative to the report
+    report_images = [{**img, 'path': os.path.relpath(img['path'], output_dir)} for img in all_images]
+
     markdown_content = generate_markdown_report(
         flow_data=flow_data,
         user_actions=user_actions,
         summary=summary,
         best_image_url=best_image['url'],
-        best_image_path=best_image['path'],
-        all_images=all_images,
+        best_image_path=os.path.relpath(best_image['path'], output_dir),
+        all_images=report_images,
         selection_reasoning=formatted_reasoning
     )
 
     # Save to file
-    report_filename = "REPORT.md"
+    report_filename = output_path(output_dir, "REPORT.md")
     with open(report_filename, 'w', encoding='utf-8') as f:
         f.write(markdown_content)
 
     print(f"✓ Report saved to {report_filename}")
+    return report_filename
 
-    # Show cache statistics
+
+def print_usage(usage):
+    """Print hit ratios, spend, savings and latency (see UsageTracker.stats)."""
+    for request_type, counts in usage['requests'].items():
+        print(f"{request_type.capitalize()} requests: {counts['hits']} cached, {counts['misses']} fresh "
+              f"({counts['hit_ratio']:.0%} hit ratio)")
+    print(f"API spend: {usage['tokens_spent']['total']:,} tokens, {usage['images_spent']} images, "
+          f"${usage['spent_usd']:.4f}")
+    print(f"Saved by the cache: {usage['tokens_saved']['total']:,} tokens, {usage['images_saved']} images, "
+          f"${usage['saved_usd']:.4f}")
+    for model, latency in usage['latency_ms'].items():
+        print(f"Latency ({model}): p50 {latency['p50']:.0f} ms, p95 {latency['p95']:.0f} ms, "
+              f"max {latency['max']:.0f} ms over {latency['count']} requests")
+
+
+def print_run_summary(cache, report_filename, all_images, best_image, limiter=None):
+    """Print cache statistics and the files produced by a run."""
     print("\n=== Cache Statistics ===")
     stats = cache.get_stats()
     print(f"Text responses cached: {stats['text_cache_count']}")
     print(f"Image responses cached: {stats['image_cache_count']}")
     print(f"Total cache size: {stats['total_size_mb']} MB")
+    print(f"Memory tier: {stats['memory_hits']} hits, {stats['memory_promotions']} promotions, "
+          f"{stats['memory_evictions']} evictions")
+    print_usage(stats)
+    if limiter is not None:
+        for model, model_stats in limiter.stats().items():
+            print(f"Rate limiter ({model}): {model_stats['requests']} requests, "
+                  f"{model_stats['throttled']} throttled, {model_stats['wait_seconds']}s waited, "
+                  f"concurrency {model_stats['concurrency_limit']}")
 
     print(f"\n✓ All done! Check {report_filename} for the complete analysis.")
     print(f"✓ Generated images: {', '.join([img['path'] for img in all_images])}")
     print(f"✓ Selected best image: {best_image['path']}")
 
 
+def make_requester(client, cache, use_async=False):
+    """
+    Wrap a client and cache into one coroutine function for pipeline stages.
+
+    Args:
+        client: OpenAI or AsyncOpenAI client (optionally rate limited)
+        cache: OpenAICache instance
+        use_async: True for an AsyncOpenAI client; a sync client's calls run
+            in worker threads so stages can still overlap
+
+    Returns:
+        ``async request(**kwargs)`` taking cached_openai_request arguments
+        and returning the response dict
+    """
+    if use_async:
+        async def request(**request_kwargs):
+            return await async_cached_openai_request(client=client, cache=cache, **request_kwargs)
+    else:
+        async def request(**request_kwargs):
+            return await asyncio.to_thread(cached_openai_request, client=client, cache=cache, **request_kwargs)
+    return request
+
+
+def build_report_pipeline(request, cache, output_dir=".", max_concurrency=DEFAULT_VIDEO_WORKERS, assets=None):
+    """
+    Express report generation as a dependency graph of stages.
+
+    IMAGE/CHAPTER step descriptions and VIDEO analysis only need the flow, so
+    they run side by side; every later stage starts as soon as its inputs are
+    ready. The pipeline takes the parsed flow as its "flow" input.
+
+    Args:
+        request: Coroutine function performing cached API requests (see make_requester)
+        cache: OpenAICache instance (its blob store holds the generated images)
+        output_dir: Directory receiving REPORT.md and the generated images
+        max_concurrency: Maximum number of VIDEO-step requests in flight
+        assets: Optional AssetStore; VIDEO thumbnails are prefetched into
+            it and sent from disk (see asset_store for the cache-key caveat)
+
+    Returns:
+        Pipeline whose "report" stage yields the report filename
+    """
+    pipeline = Pipeline("report")
+
+    def static_steps(flow):
+        # Enriched CHAPTER/IMAGE steps plus placeholders for the VIDEO steps
+        return describe_static_steps(flow.steps)
+
+    def step_assets(flow):
+        if assets is None:
+            return {}
+        print("\n→ Prefetching video thumbnails...")
+        return assets.prefetch(flow)
+
+    async def video_descriptions(flow, step_assets):
+        print("\n=== Step 1: Identifying User Interactions with Video Context ===")
+        print("\n→ Analyzing flow steps with video context...")
+        # Descriptions come back in step order, matching the placeholders
+        return await describe_video_steps(request, flow.steps, flow.events, max_concurrency, thumbnails=step_assets)
+
+    async def interactions(static_steps, video_descriptions):
+        enriched_steps, video_jobs = static_steps
+        fill_video_descriptions(enriched_steps, video_jobs, video_descriptions)
+
+        interactions_response = await request(**build_interactions_request(enriched_steps))
+        user_actions = interactions_response['choices'][0]['message']['content']
+        print(f"\n{user_actions[:300]}...")
+        return user_actions
+
+    async def summary(flow, interactions):
+        print("\n=== Step 2: Generating Summary ===")
+        summary_response = await request(**build_summary_request(flow, interactions))
+        summary_text = summary_response['choices'][0]['message']['content']
+        print(f"\n{summary_text[:300]}...")
+        return summary_text
+
+    async def image_prompts(flow, summary):
+        print("\n=== Step 3: Generating Multiple Social Media Images ===")
+        print("\n→ Creating 3 different image prompt variations...")
+        flow_name = flow.name or 'Arcade Flow'
+        return parse_prompt_variations(await request(**build_prompt_variations_request(flow_name, summary)))
+
+    async def images(image_prompts):
+        print(f"\n→ Generating {len(image_prompts)} images concurrently with different styles...")
+        os.makedirs(output_dir, exist_ok=True)
+
+        async def generate(index, prompt_info):
+            log_event(_log, logging.DEBUG, "image_generation_started", image=index + 1,
+                      variation=prompt_info['variation'])
+            image_response = await request(**build_image_request(prompt_info['prompt']))
+            return await asyncio.to_thread(save_generated_image, index, prompt_info, image_response, output_dir)
+
+        # gather keeps results in prompt order
+        results = await asyncio.gather(
+            *(generate(i, prompt_info) for i, prompt_info in enumerate(image_prompts)),
+            return_exceptions=True
+        )
+
+        all_images, errors = [], []
+        for index, result in enumerate(results):
+            if isinstance(result, Exception):
+                log_event(_log, logging.WARNING, "image_generation_failed", image=index + 1, error=result)
+                errors.append(result)
+            else:
+                all_images.append(result)
+
+        # A partial result would be checkpointed and fail selection on every
+        # rerun, so fail the stage and let the next run retry it
+        if errors:
+            raise RuntimeError(
+                f"Only {len(all_images)} of {len(image_prompts)} images were generated"
+            ) from errors[0]
+
+        print(f"\n✓ All {len(all_images)} images generated successfully!")
+        return all_images
+
+    def image_refs(images):
+        return load_image_refs(cache, images)
+
+    async def selection(flow, summary, images, image_refs):
+        print("\n=== Step 4: Using Vision Model to Select Best Image ===")
+        flow_name = flow.name or 'Arcade Flow'
+        vlm_response = await request(**build_selection_request(flow_name, summary, images, image_refs))
+        # Stage results may be checkpointed, so mark a copy rather than the images result
+        return apply_image_selection(vlm_response, [dict(img) for img in images])
+
+    def report(flow, interactions, summary, images, selection):
+        best_image, formatted_reasoning = selection
+        return write_report(flow, interactions, summary, mark_selected(images, best_image),
+                            best_image, formatted_reasoning, output_dir)
+
+    def images_on_disk(all_images):
+        # The selection request compares exactly three images
+        return len(all_images) == 3 and all(os.path.exists(img['path']) for img in all_images)
+
+    # static_steps is cheap, and step_assets and image_refs hold blob
+    # references that are only valid while the blob store has them, so none
+    # of them is checkpointed
+    pipeline.add("static_steps", static_steps, deps=["flow"], version=STAGE_VERSIONS['static_steps'],
+                 checkpoint=False)
+    pipeline.add("step_assets", step_assets, deps=["flow"], checkpoint=False)
+    pipeline.add("video_descriptions", video_descriptions, deps=["flow", "step_assets"],
+                 version=STAGE_VERSIONS['video_descriptions'])
+    pipeline.add("interactions", interactions, deps=["static_steps", "video_descriptions"],
+                 version=STAGE_VERSIONS['interactions'])
+    pipeline.add("summary", summary, deps=["flow", "interactions"], version=STAGE_VERSIONS['summary'])
+    pipeline.add("image_prompts", image_prompts, deps=["flow", "summary"],
+                 version=STAGE_VERSIONS['image_prompts'])
+    pipeline.add("images", images, deps=["image_prompts"],
+                 version=STAGE_VERSIONS['images'], validate=images_on_disk)
+    pipeline.add("image_refs", image_refs, deps=["images"], checkpoint=False)
+    pipeline.add("selection", selection, deps=["flow", "summary", "images", "image_refs"],
+                 version=STAGE_VERSIONS['selection'])
+    pipeline.add("report", report, deps=["flow", "interactions", "summary", "images", "selection"],
+                 version=STAGE_VERSIONS['report'], validate=os.path.exists)
+    return pipeline
+
+
+def print_stage_timings(pipeline):
+    """Print how long each stage took; '*' marks the critical path."""
+    print("\n=== Stage Timings (* = critical path) ===")
+    print(pipeline.format_timings())
+
+
+def checkpoint_namespace(output_dir):
+    """Checkpoint group for the flow whose report goes to output_dir."""
+    return hashlib.sha256(os.path.abspath(output_dir).encode('utf-8')).hexdigest()[:16]
+
+
+async def run_report_pipeline(request, cache, flow_data, output_dir=".", max_concurrency=DEFAULT_VIDEO_WORKERS,
+                              checkpoints=None, assets=None):
+    """
+    Run the report stages for one flow and print their timings.
+
+    With a CheckpointStore, stages whose inputs (the flow contents, upstream
+    results and STAGE_VERSIONS) are unchanged since the last run for the
+    same output directory are restored instead of run.
+
+    Args:
+        request: Coroutine function performing cached API requests (see make_requester)
+        cache: OpenAICache instance
+        flow_data: Flow to analyze (see load_flow)
+        output_dir: Directory receiving REPORT.md and the generated images
+        max_concurrency: Maximum number of VIDEO-step requests in flight
+        checkpoints: Optional CheckpointStore for incremental re-runs
+        assets: Optional AssetStore for prefetching VIDEO thumbnails
+
+    Returns:
+        Tuple of (report filename, generated images, best image)
+    """
+    pipeline = build_report_pipeline(request, cache, output_dir=output_dir, max_concurrency=max_concurrency,
+                                     assets=assets)
+
+    with tracing.span("report_pipeline", "pipeline", flow=flow_data.name, output_dir=str(output_dir)):
+        results = await pipeline.run(
+            {"flow": flow_data},
+            outputs=["report", "images", "selection"],
+            checkpoints=checkpoints,
+            namespace=checkpoint_namespace(output_dir),
+            input_fingerprints={"flow": flow_data.fingerprint()} if checkpoints is not None else None
+        )
+
+    cached = [name for name, status in pipeline.status.items() if status == 'cached']
+    if cached:
+        print(f"\n✓ Restored from checkpoints: {', '.join(cached)}")
+
+    print_stage_timings(pipeline)
+    best_image = results["selection"][0]
+    return results["report"], mark_selected(results["images"], best_image), best_image
+
+
+def main(cache_backend="file", cache_compression=None, rate_limit=True, flow_path="flow.json", output_dir=".",
+         use_checkpoints=True, prefetch_assets=True, base_url=None):
+    # Initialize OpenAI client
+    limiter = RateLimiter() if rate_limit else None
+    client = create_client(limiter, base_url=base_url)
+
+    # Initialize cache
+    cache = OpenAICache(cache_dir=".cache", backend=cache_backend, compression=cache_compression)
+    checkpoints = CheckpointStore(".cache/checkpoints") if use_checkpoints else None
+    assets = AssetStore(".cache/assets", cache.blobs) if prefetch_assets else None
+
+    # Load flow data
+    flow_data = load_flow(flow_path)
+
+    # Run the stages, overlapping those whose inputs are ready
+    report_filename, all_images, best_image = asyncio.run(run_report_pipeline(
+        make_requester(client, cache), cache, flow_data, output_dir=output_dir, checkpoints=checkpoints,
+        assets=assets
+    ))
+
+    # Show cache statistics
+    print_run_summary(cache, report_filename, all_images, best_image, limiter)
+
+
+async def run_flow_async(client, cache, flow_data, output_dir=".", max_concurrency=DEFAULT_VIDEO_WORKERS,
+                         checkpoints=None, assets=None):
+    """
+    Analyze one flow with an AsyncOpenAI client and write its report.
+
+    Args:
+        client: AsyncOpenAI client (optionally rate limited)
+        cache: OpenAICache instance
+        flow_data: Flow to analyze (see load_flow)
+        output_dir: Directory receiving REPORT.md and the generated images
+        max_concurrency: Maximum number of VIDEO-step requests in flight
+        checkpoints: Optional CheckpointStore for incremental re-runs
+        assets: Optional AssetStore for prefetching VIDEO thumbnails
+
+    Returns:
+        Tuple of (report filename, generated images, best image)
+    """
+    return await run_report_pipeline(
+        make_requester(client, cache, use_async=True), cache, flow_data,
+        output_dir=output_dir, max_concurrency=max_concurrency, checkpoints=checkpoints, assets=assets
+    )
+
+
+async def main_async(max_concurrency=DEFAULT_VIDEO_WORKERS, cache_backend="file", cache_compression=None,
+                     rate_limit=True, flow_path="flow.json", output_dir=".", use_checkpoints=True,
+                     prefetch_assets=True, base_url=None):
+    """
+    Run the full pipeline on a single event loop with an AsyncOpenAI client.
+
+    Issues the same requests (and therefore hits the same cache entries) as
+    main(), but every API call is awaited instead of holding a thread.
+
+    Args:
+        max_concurrency: Maximum number of VIDEO-step requests in flight
+        cache_backend: OpenAICache storage engine ("file" or "sqlite")
+        cache_compression: Optional entry compression ("zlib" or "zstd")
+        rate_limit: Pace API calls with a per-model RateLimiter
+        flow_path: Flow JSON file to analyze
+        output_dir: Directory receiving REPORT.md and the generated images
+        use_checkpoints: Restore stages unchanged since the last run
+        prefetch_assets: Fetch VIDEO thumbnails into the local asset store
+            and send them from disk
+        base_url: Optional API base URL (e.g. a fake_openai_server)
+    """
+    limiter = RateLimiter() if rate_limit else None
+    client = create_client(limiter, use_async=True, base_url=base_url)
+    cache = OpenAICache(cache_dir=".cache", backend=cache_backend, compression=cache_compression)
+    checkpoints = CheckpointStore(".cache/checkpoints") if use_checkpoints else None
+    assets = AssetStore(".cache/assets", cache.blobs) if prefetch_assets else None
+
+    flow_data = load_flow(flow_path)
+
+    report_filename, all_images, best_image = await run_flow_async(
+        client, cache, flow_data, output_dir=output_dir, max_concurrency=max_concurrency,
+        checkpoints=checkpoints, assets=assets
+    )
+
+    print_run_summary(cache, report_filename, all_images, best_image, limiter)
+
+
+def parse_args(argv=None):
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Analyze an Arcade flow and generate a markdown report.")
+    parser.add_argument(
+        "--async", dest="use_async", action="store_true",
+        help="run the whole pipeline on one event loop with AsyncOpenAI"
+    )
+    parser.add_argument(
+        "--max-concurrency", type=int, default=DEFAULT_VIDEO_WORKERS,
+        help="maximum number of VIDEO-step requests in flight in async mode"
+    )
+    parser.add_argument(
+        "--cache-backend", choices=["file", "sqlite"], default="file",
+        help="storage engine for the response cache"
+    )
+    parser.add_argument(
+        "--cache-compression", choices=["zlib", "zstd"], default=None,
+        help="compress new cache entries (existing entries stay readable)"
+    )
+    parser.add_argument(
+        "--no-rate-limit", dest="rate_limit", action="store_false",
+        help="send API calls without client-side rate limiting"
+    )
+    parser.add_argument(
+        "--flow", dest="flow_path", default="flow.json",
+        help="flow JSON file to analyze"
+    )
+    parser.add_argument(
+        "--output-dir", default=".",
+        help="directory for REPORT.md and the generated images"
+    )
+    parser.add_argument(
+        "--no-checkpoints", dest="use_checkpoints", action="store_false",
+        help="rerun every stage instead of restoring unchanged ones"
+    )
+    parser.add_argument(
+        "--no-prefetch", dest="prefetch_assets", action="store_false",
+        help="send VIDEO thumbnails to the model by URL instead of from the local asset store "
+             "(a failed prefetch also falls back to the URL, which changes the request's cache key)"
+    )
+    parser.add_argument(
+        "--base-url", default=None,
+        help="OpenAI API base URL, e.g. a local fake_openai_server for load testing"
+    )
+    parser.add_argument(
+        "--trace", dest="trace_path", default=None,
+        help="record stage, request and download spans to this JSON file"
+    )
+    parser.add_argument(
+        "--trace-format", choices=tracing.TRACE_FORMATS, default="chrome",
+        help="trace file format: Chrome/Perfetto trace events or OpenTelemetry OTLP/JSON"
+    )
+    add_logging_arguments(parser)
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    with logging_configured(**logging_options(args)), tracing.recording(args.trace_path, args.trace_format):
+        if args.use_async:
+            asyncio.run(main_async(
+                max_concurrency=args.max_concurrency,
+                cache_backend=args.cache_backend,
+                cache_compression=args.cache_compression,
+                rate_limit=args.rate_limit,
+                flow_path=args.flow_path,
+                output_dir=args.output_dir,
+                use_checkpoints=args.use_checkpoints,
+                prefetch_assets=args.prefetch_assets,
+                base_url=args.base_url
+            ))
+        else:
+            main(cache_backend=args.cache_backend, cache_compression=args.cache_compression,
+                 rate_limit=args.rate_limit, flow_path=args.flow_path, output_dir=args.output_dir,
+                 use_checkpoints=args.use_checkpoints, prefetch_assets=args.prefetch_assets,
+                 base_url=args.base_url)
+
+    if args.trace_path:
+        print(f"✓ Trace saved to {args.trace_path}")
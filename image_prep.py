@@ -0,0 +1,113 @@
+"""
+Shrink images to the resolution a vision request actually uses.
+
+With ``detail: "low"`` the API looks at a 512px rendition of an image, and
+with ``"high"`` at one whose short side is at most 768px (after fitting in
+2048px), so uploading a full 1024px PNG mostly sends pixels that are thrown
+away. prepare_image resizes to that resolution and re-encodes as JPEG (or
+WebP), which is typically an order of magnitude smaller.
+
+Pillow is optional: without it images are passed through unchanged.
+"""
+
+import io
+import mimetypes
+from typing import Tuple
+
+try:
+    from PIL import Image
+except ImportError:  # optional: only needed to shrink images
+    Image = None
+
+# Longest side the API renders for detail="low"
+LOW_DETAIL_SIZE = 512
+
+# detail="high": fit within HIGH_DETAIL_MAX_SIZE, then shorten the short
+# side to HIGH_DETAIL_SHORT_SIDE
+HIGH_DETAIL_MAX_SIZE = 2048
+HIGH_DETAIL_SHORT_SIDE = 768
+
+DEFAULT_IMAGE_FORMAT = "JPEG"
+DEFAULT_IMAGE_QUALITY = 85
+
+_MEDIA_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+def target_size(width: int, height: int, detail: str = "low") -> Tuple[int, int]:
+    """
+    Get the size the API scales an image to for a detail level.
+
+    Images are never enlarged.
+
+    Args:
+        width: Original width in pixels
+        height: Original height in pixels
+        detail: "low", "high" or "auto" (treated as "high")
+
+    Returns:
+        (width, height) to resize to
+    """
+    if detail == "low":
+        scale = LOW_DETAIL_SIZE / max(width, height)
+    else:
+        scale = min(HIGH_DETAIL_MAX_SIZE / max(width, height), 1.0)
+        scale *= min(HIGH_DETAIL_SHORT_SIDE / (min(width, height) * scale), 1.0)
+    scale = min(scale, 1.0)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def prepare_image(
+    data: bytes,
+    media_type: str = "image/png",
+    detail: str = "low",
+    image_format: str = DEFAULT_IMAGE_FORMAT,
+    quality: int = DEFAULT_IMAGE_QUALITY
+) -> Tuple[bytes, str]:
+    """
+    Downscale and re-encode an image for a vision request.
+
+    Args:
+        data: Encoded image bytes
+        media_type: MIME type of data
+        detail: Detail level the request will use
+        image_format: Output format ("JPEG" or "WEBP")
+        quality: Encoder quality (1-100)
+
+    Returns:
+        (image bytes, MIME type); the original if Pillow is missing, cannot
+        decode it, or the re-encoded image would not be smaller
+    """
+    if Image is None:
+        return data, media_type
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except OSError:
+        return data, media_type
+
+    with image:
+        size = target_size(image.width, image.height, detail)
+        if size != image.size:
+            image = image.resize(size, Image.Resampling.LANCZOS)
+
+        if image_format == "JPEG" and image.mode != "RGB":
+            # JPEG has no alpha channel: flatten onto white
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", rgba.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.getchannel("A"))
+
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format, quality=quality)
+
+    prepared = buffer.getvalue()
+    if len(prepared) >= len(data):
+        return data, media_type
+    return prepared, _MEDIA_TYPES[image_format]
+
+
+def prepare_image_file(file_path: str, detail: str = "low", **options) -> Tuple[bytes, str]:
+    """Read an image file and prepare it with prepare_image (see its arguments)."""
+    media_type = mimetypes.guess_type(file_path)[0] or "image/png"
+    with open(file_path, 'rb') as f:
+        return prepare_image(f.read(), media_type, detail, **options)
@@ -0,0 +1,310 @@
+"""
+Dependency-graph scheduler for multi-stage pipelines.
+
+A Pipeline is a set of named stages, each declaring the stages whose results
+it consumes. Running it starts every stage as soon as all of its inputs are
+ready, so independent stages overlap, and records when each stage started
+and finished so the critical path can be reported.
+
+With a CheckpointStore, each stage's result is saved under a fingerprint of
+its inputs (the pipeline inputs' fingerprints, each upstream stage's
+fingerprint and the stage's own version). A rerun returns checkpointed
+stages without running them, and only starts upstream stages that a stage
+which must be recomputed actually needs.
+"""
+
+import asyncio
+import inspect
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import tracing
+from utils import canonical_json_sha256
+
+
+class Stage:
+    """A named unit of work and the names of the stages it depends on."""
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[..., Any],
+        deps: Iterable[str] = (),
+        version: Any = None,
+        checkpoint: bool = True,
+        validate: Optional[Callable[[Any], bool]] = None
+    ):
+        """
+        Initialize the stage.
+
+        Args:
+            name: Unique stage name; dependents receive its result under it
+            func: Called with one keyword argument per dependency. Coroutine
+                functions are awaited; plain functions run in a worker thread
+            deps: Names of stages (or pipeline inputs) this stage consumes
+            version: JSON-serializable value folded into the fingerprint;
+                change it (e.g. a prompt template version) to invalidate the
+                stage and everything downstream
+            checkpoint: Save and reuse this stage's result when checkpointing
+            validate: Optional check that a checkpointed result is still
+                usable (e.g. its output files exist)
+        """
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.version = version
+        self.checkpoint = checkpoint
+        self.validate = validate
+
+
+class Pipeline:
+    """
+    A DAG of stages run concurrently on the current event loop.
+
+    Example::
+
+        pipeline = Pipeline("report")
+        pipeline.add("summary", summarize, deps=["flow"])
+        pipeline.add("images", generate_images, deps=["summary"])
+        results = await pipeline.run({"flow": flow_data})
+    """
+
+    def __init__(self, name: str = "pipeline"):
+        self.name = name
+        self.stages: Dict[str, Stage] = {}
+        self.timings: Dict[str, Dict[str, float]] = {}
+        self.status: Dict[str, str] = {}
+
+    def add(self, name: str, func: Callable[..., Any], deps: Iterable[str] = (), **options) -> None:
+        """
+        Add a stage.
+
+        Args:
+            name: Unique stage name
+            func: Stage function (see Stage)
+            deps: Names of the stages or inputs it consumes
+            **options: version, checkpoint and validate (see Stage)
+
+        Raises:
+            ValueError: If a stage with this name already exists
+        """
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        self.stages[name] = Stage(name, func, deps, **options)
+
+    def _execution_order(self, inputs: Iterable[str]) -> List[str]:
+        """
+        Topologically sort the stages.
+
+        Raises:
+            ValueError: On an unknown dependency or a cycle
+        """
+        available = set(inputs)
+        for stage in self.stages.values():
+            for dep in stage.deps:
+                if dep not in self.stages and dep not in available:
+                    raise ValueError(f"Stage {stage.name} depends on unknown stage {dep}")
+
+        order = []
+        visiting = set()
+        done = set(available)
+
+        def visit(name: str) -> None:
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Pipeline has a cycle through stage {name}")
+            visiting.add(name)
+            for dep in self.stages[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def fingerprints(
+        self,
+        inputs: Dict[str, Any],
+        input_fingerprints: Optional[Dict[str, str]] = None
+    ) -> Dict[str, str]:
+        """
+        Fingerprint every input and stage.
+
+        A stage's fingerprint covers its name, version and the fingerprints
+        of its dependencies, so it changes exactly when something upstream
+        of it (or the stage itself) changes.
+
+        Args:
+            inputs: Pipeline inputs
+            input_fingerprints: Precomputed fingerprints for some inputs
+                (e.g. a file's content hash); others are hashed as JSON
+
+        Returns:
+            Mapping of input and stage name to hex fingerprint
+        """
+        fingerprints = dict(input_fingerprints or {})
+        for name, value in inputs.items():
+            if name not in fingerprints:
+                fingerprints[name] = canonical_json_sha256(value)
+
+        for name in self._execution_order(inputs):
+            stage = self.stages[name]
+            fingerprints[name] = canonical_json_sha256({
+                'stage': name,
+                'version': stage.version,
+                'inputs': {dep: fingerprints[dep] for dep in stage.deps}
+            })
+        return fingerprints
+
+    async def run(
+        self,
+        inputs: Optional[Dict[str, Any]] = None,
+        outputs: Optional[Iterable[str]] = None,
+        checkpoints: Any = None,
+        namespace: Optional[str] = None,
+        input_fingerprints: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Run the stages, each as soon as its dependencies have finished.
+
+        Stages are started on demand: the requested outputs first, then
+        whatever they need. If a stage raises, stages depending on it are
+        skipped, independent stages still run to completion, and the first
+        error is re-raised.
+
+        Args:
+            inputs: Values available to stages as if produced by stages of
+                the same names
+            outputs: Stages whose results are wanted (default: all)
+            checkpoints: Optional CheckpointStore for saving and reusing
+                stage results
+            namespace: Checkpoint group (default: derived from the input
+                fingerprints)
+            input_fingerprints: Precomputed fingerprints for some inputs
+
+        Returns:
+            Mapping of input and stage name to result, for every stage that
+            ran or was restored from a checkpoint
+        """
+        inputs = dict(inputs or {})
+        order = self._execution_order(inputs)
+        targets = list(order if outputs is None else outputs)
+        for name in targets:
+            if name not in self.stages:
+                raise ValueError(f"Unknown output stage: {name}")
+
+        fingerprints = {}
+        if checkpoints is not None:
+            fingerprints = self.fingerprints(inputs, input_fingerprints)
+            if namespace is None:
+                namespace = canonical_json_sha256({name: fingerprints[name] for name in inputs})[:16]
+
+        self.timings = {}
+        self.status = {name: 'pending' for name in order}
+        origin = time.perf_counter()
+        tasks: Dict[str, asyncio.Future] = {}
+
+        def start(name: str) -> asyncio.Future:
+            if name not in tasks:
+                tasks[name] = asyncio.ensure_future(run_stage(self.stages[name]))
+            return tasks[name]
+
+        def record(name: str, start_time: float, end_time: float) -> None:
+            self.timings[name] = {
+                'start': start_time - origin,
+                'end': end_time - origin,
+                'seconds': end_time - start_time
+            }
+
+        async def run_stage(stage: Stage) -> Any:
+            use_checkpoint = checkpoints is not None and stage.checkpoint
+            if use_checkpoint:
+                with tracing.span(stage.name, "checkpoint", pipeline=self.name) as span:
+                    found, result = checkpoints.load(namespace, stage.name, fingerprints[stage.name])
+                    found = found and (stage.validate is None or stage.validate(result))
+                    span.set(restored=found)
+                if found:
+                    now = time.perf_counter()
+                    record(stage.name, now, now)
+                    self.status[stage.name] = 'cached'
+                    return result
+
+            # Start every dependency before waiting on any, so they overlap
+            pending = {dep: start(dep) for dep in stage.deps if dep not in inputs}
+            try:
+                kwargs = {dep: inputs[dep] if dep in inputs else await pending[dep] for dep in stage.deps}
+            except BaseException:
+                self.status[stage.name] = 'skipped'
+                raise
+
+            start_time = time.perf_counter()
+            self.status[stage.name] = 'running'
+            with tracing.span(stage.name, "stage", pipeline=self.name):
+                try:
+                    if inspect.iscoroutinefunction(stage.func):
+                        result = await stage.func(**kwargs)
+                    else:
+                        result = await asyncio.to_thread(stage.func, **kwargs)
+                except BaseException:
+                    self.status[stage.name] = 'failed'
+                    raise
+                finally:
+                    record(stage.name, start_time, time.perf_counter())
+
+                if use_checkpoint:
+                    checkpoints.save(namespace, stage.name, fingerprints[stage.name], result)
+            self.status[stage.name] = 'ok'
+            return result
+
+        for name in targets:
+            start(name)
+
+        # Dependencies are started while targets run, so keep gathering
+        # until no new tasks appear
+        while True:
+            started = list(tasks.values())
+            await asyncio.gather(*started, return_exceptions=True)
+            if len(tasks) == len(started):
+                break
+
+        for name in order:
+            if self.status[name] == 'failed':
+                raise tasks[name].exception()
+
+        return {**inputs, **{name: task.result() for name, task in tasks.items()}}
+
+    def critical_path(self) -> List[str]:
+        """
+        Get the chain of stages that determined the total run time.
+
+        Starting from the stage that finished last, repeatedly step to the
+        dependency that finished last (the one the stage was waiting on).
+
+        Returns:
+            Stage names in execution order (empty before a run)
+        """
+        timed = self.timings
+        if not timed:
+            return []
+
+        path = []
+        current = max(timed, key=lambda name: timed[name]['end'])
+        while current is not None:
+            path.append(current)
+            deps = [dep for dep in self.stages[current].deps if dep in timed]
+            current = max(deps, key=lambda dep: timed[dep]['end']) if deps else None
+        return list(reversed(path))
+
+    def format_timings(self) -> str:
+        """Render per-stage start/duration, marking critical-path stages with '*'."""
+        critical = set(self.critical_path())
+        width = max((len(name) for name in self.timings), default=0)
+        lines = []
+        for name, timing in sorted(self.timings.items(), key=lambda item: item[1]['start']):
+            marker = '*' if name in critical else ' '
+            lines.append(f"{marker} {name:<{width}}  start {timing['start']:7.2f}s  "
+                         f"took {timing['seconds']:7.2f}s")
+        return "\n".join(lines)
@@ -0,0 +1,611 @@
+"""
+Client-side rate limiting for OpenAI API calls.
+
+A RateLimiter keeps, per model, a requests-per-minute and a tokens-per-minute
+token bucket plus an adaptive (AIMD) concurrency limit. Buckets are synced
+from the ``x-ratelimit-*`` response headers, concurrency grows while the
+server reports headroom and halves on every 429, and throttled calls are
+retried after the server's suggested delay.
+
+Wrap a client to apply it to every API call that reaches the network (cache
+hits never do)::
+
+    limiter = RateLimiter()
+    client = RateLimitedClient(OpenAI(api_key=..., max_retries=0), limiter)
+"""
+
+import asyncio
+import json
+import logging
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Mapping, Optional
+
+from structured_logging import get_logger, log_event
+
+_log = get_logger("rate_limit")
+
+# Conservative defaults (requests/min, tokens/min); replaced by the limits the
+# server reports in its headers after the first response
+DEFAULT_RATE_LIMITS: Dict[str, Dict[str, Optional[int]]] = {
+    "gpt-4o": {"rpm": 500, "tpm": 30000},
+    "gpt-4o-mini": {"rpm": 500, "tpm": 200000},
+    "dall-e-3": {"rpm": 5, "tpm": None},
+    "dall-e-2": {"rpm": 5, "tpm": None},
+}
+
+# Token cost the API charges for an image input at each detail level
+IMAGE_INPUT_TOKENS = {"low": 85, "high": 765, "auto": 765}
+
+# Fraction of a limit that must remain for concurrency to keep growing
+DEFAULT_HEADROOM = 0.1
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_DURATION_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """
+    Parse an ``x-ratelimit-reset-*`` header such as "1s", "6m0s" or "20ms".
+
+    Args:
+        value: Header value (or None)
+
+    Returns:
+        Seconds until the limit resets, or None if absent/unparseable
+    """
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_SECONDS[unit] for amount, unit in parts)
+
+
+def estimate_tokens(request_type: str, request_params: Dict[str, Any]) -> int:
+    """
+    Estimate the tokens a request counts against the tokens-per-minute limit.
+
+    The API reserves prompt tokens plus ``max_tokens`` up front. Text is
+    approximated at four characters per token and image inputs at their
+    fixed per-detail cost.
+
+    Args:
+        request_type: "chat" or "image"
+        request_params: Parameters passed to the API
+
+    Returns:
+        Estimated token count (0 for image generation, which is limited by
+        requests only)
+    """
+    if request_type != "chat":
+        return 0
+
+    text_chars = 0
+    image_tokens = 0
+    messages = request_params.get('messages', [])
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, str):
+            text_chars += len(content)
+            continue
+        for part in content or []:
+            if part.get('type') == 'image_url':
+                detail = part.get('image_url', {}).get('detail', 'auto')
+                image_tokens += IMAGE_INPUT_TOKENS.get(detail, IMAGE_INPUT_TOKENS['auto'])
+            else:
+                text_chars += len(json.dumps(part.get('text', part)))
+
+    # ~4 tokens of framing per message
+    prompt_tokens = text_chars // 4 + image_tokens + 4 * len(messages)
+    return prompt_tokens + int(request_params.get('max_tokens') or 0)
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Check whether an exception is an HTTP 429 from the API."""
+    return getattr(error, 'status_code', None) == 429
+
+
+def _lower_headers(headers: Optional[Mapping[str, str]]) -> Dict[str, str]:
+    """Copy headers into a plain dict with lower-cased names."""
+    return {str(k).lower(): v for k, v in (headers or {}).items()}
+
+
+def _int_header(headers: Dict[str, str], name: str) -> Optional[int]:
+    """Read an integer header, ignoring missing or malformed values."""
+    try:
+        return int(headers[name])
+    except (KeyError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at a per-minute rate.
+
+    Callers reserve capacity up front and sleep for the returned delay, so
+    waiters are served in reservation order and a request larger than the
+    bucket still gets through once enough capacity has accrued.
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        """
+        Initialize the bucket full.
+
+        Args:
+            per_minute: Refill rate
+            capacity: Maximum burst (defaults to one minute's worth)
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        """Add the tokens accrued since the last update (lock held)."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        Take amount from the bucket, going into debt if necessary.
+
+        Args:
+            amount: Tokens to consume
+
+        Returns:
+            Seconds the caller must wait before using the reservation
+        """
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate) if self.rate > 0 else 0.0
+
+    def refund(self, amount: float) -> None:
+        """Return unused tokens to the bucket."""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+    def sync(self, limit: Optional[float], remaining: Optional[int]) -> None:
+        """
+        Align the bucket with limits reported by the server.
+
+        Args:
+            limit: Per-minute limit from the headers
+            remaining: Capacity the server says is left in the current window
+        """
+        with self._lock:
+            self._refill()
+            if limit:
+                self.rate = limit / 60.0
+                self.capacity = limit
+            if remaining is not None:
+                self.tokens = min(self.tokens, remaining)
+
+    def drain(self, seconds: float) -> None:
+        """Empty the bucket so the next reservation waits at least seconds."""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+def _wake(future: asyncio.Future) -> None:
+    """Resolve a parked acquire_async future unless it was cancelled."""
+    if not future.done():
+        future.set_result(None)
+
+
+class AdaptiveConcurrency:
+    """
+    Concurrency limit adjusted by additive-increase/multiplicative-decrease.
+
+    Each success with headroom adds 1/limit (about +1 per limit's worth of
+    requests); each throttle halves the limit.
+
+    Slots are shared by threads and event loops alike: async waiters park
+    on a future that release() and on_success() resolve from any thread.
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 16):
+        """
+        Initialize the limit.
+
+        Args:
+            initial: Starting number of concurrent requests
+            minimum: Lower bound after decreases
+            maximum: Upper bound after increases
+        """
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self._condition = threading.Condition()
+        # (loop, future) of each parked acquire_async call
+        self._async_waiters = []
+
+    def try_acquire(self) -> bool:
+        """Take a slot if one is free."""
+        with self._condition:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self) -> None:
+        """Block until a slot is free, then take it."""
+        with self._condition:
+            self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def acquire_async(self) -> None:
+        """Wait for a slot without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                waiter = (loop, loop.create_future())
+                self._async_waiters.append(waiter)
+            try:
+                await waiter[1]
+            finally:
+                with self._condition:
+                    if waiter in self._async_waiters:
+                        self._async_waiters.remove(waiter)
+
+    def _notify(self) -> None:
+        """Wake every waiter to re-check for a free slot (lock held)."""
+        self._condition.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                pass  # The waiter's loop is closed
+
+    def release(self) -> None:
+        """Give back a slot."""
+        with self._condition:
+            self.in_flight -= 1
+            self._notify()
+
+    def on_success(self) -> None:
+        """Grow the limit additively."""
+        with self._condition:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._notify()
+
+    def on_throttle(self) -> None:
+        """Shrink the limit multiplicatively."""
+        with self._condition:
+            self.limit = max(self.minimum, self.limit / 2.0)
+
+
+class _ModelLimiter:
+    """Buckets, concurrency and counters for one model."""
+
+    def __init__(self, rpm: Optional[float], tpm: Optional[float], concurrency: AdaptiveConcurrency):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.concurrency = concurrency
+        # Guards the counters, which threads update concurrently
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.throttled = 0
+        self.wait_seconds = 0.0
+
+
+class RateLimiter:
+    """
+    Per-model request/token budgets and adaptive concurrency, shared by all
+    callers in the process.
+    """
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, Dict[str, Optional[int]]]] = None,
+        initial_concurrency: int = 4,
+        max_concurrency: int = 16,
+        max_retries: int = 5,
+        headroom: float = DEFAULT_HEADROOM,
+        share: float = 1.0
+    ):
+        """
+        Initialize the limiter.
+
+        Args:
+            limits: Mapping of model to {"rpm": ..., "tpm": ...}; models not
+                listed start unlimited until the server reports limits
+            initial_concurrency: Starting concurrent requests per model
+            max_concurrency: Upper bound on concurrent requests per model
+            max_retries: Retries of a request rejected with HTTP 429
+            headroom: Remaining fraction of a limit below which concurrency
+                stops growing
+            share: Fraction of every rpm/tpm budget (configured or reported
+                by the server) this limiter may use, e.g. 1/N for each of N
+                processes calling the API with the same key
+
+        Raises:
+            ValueError: If share is not in (0, 1]
+        """
+        if not 0.0 < share <= 1.0:
+            raise ValueError(f"Rate limit share must be in (0, 1]: {share}")
+        self.limits = dict(DEFAULT_RATE_LIMITS if limits is None else limits)
+        self.initial_concurrency = initial_concurrency
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.headroom = headroom
+        self.share = share
+        self._models: Dict[str, _ModelLimiter] = {}
+        self._lock = threading.Lock()
+
+    def _model(self, model: str) -> _ModelLimiter:
+        """Get (creating on first use) the state for a model."""
+        with self._lock:
+            state = self._models.get(model)
+            if state is None:
+                limits = self.limits.get(model, {})
+                state = _ModelLimiter(
+                    self._scaled(limits.get('rpm')), self._scaled(limits.get('tpm')),
+                    AdaptiveConcurrency(self.initial_concurrency, maximum=self.max_concurrency)
+                )
+                self._models[model] = state
+            return state
+
+    def _scaled(self, limit: Optional[float]) -> Optional[float]:
+        """This limiter's share of a per-minute limit."""
+        return limit * self.share if limit else limit
+
+    def _reserve(self, model: str, tokens: int) -> float:
+        """Reserve one request and tokens, returning the delay to wait."""
+        state = self._model(model)
+        delay = state.requests.reserve(1) if state.requests else 0.0
+        if state.tokens and tokens:
+            delay = max(delay, state.tokens.reserve(tokens))
+        with state.lock:
+            state.request_count += 1
+            state.wait_seconds += delay
+        return delay
+
+    def acquire(self, model: str, tokens: int = 0) -> None:
+        """
+        Block until a request for model may be sent.
+
+        The concurrency slot taken here is given back if the wait is
+        interrupted; otherwise the caller must release() it.
+
+        Args:
+            model: Model name
+            tokens: Estimated tokens for the request
+        """
+        concurrency = self._model(model).concurrency
+        concurrency.acquire()
+        try:
+            delay = self._reserve(model, tokens)
+            if delay > 0:
+                time.sleep(delay)
+        except BaseException:
+            concurrency.release()
+            raise
+
+    async def acquire_async(self, model: str, tokens: int = 0) -> None:
+        """Async variant of acquire (a cancelled wait gives back its slot)."""
+        concurrency = self._model(model).concurrency
+        await concurrency.acquire_async()
+        try:
+            delay = self._reserve(model, tokens)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        except BaseException:
+            concurrency.release()
+            raise
+
+    def release(self, model: str) -> None:
+        """Release the concurrency slot taken by acquire."""
+        self._model(model).concurrency.release()
+
+    def record_success(
+        self,
+        model: str,
+        headers: Optional[Mapping[str, str]] = None,
+        estimated_tokens: int = 0,
+        used_tokens: Optional[int] = None
+    ) -> None:
+        """
+        Update budgets from a successful response.
+
+        Args:
+            model: Model name
+            headers: Response headers (x-ratelimit-* are used if present)
+            estimated_tokens: Tokens reserved for the request
+            used_tokens: Tokens actually used, from the response's usage
+        """
+        state = self._model(model)
+        headers = _lower_headers(headers)
+
+        limit_requests = _int_header(headers, 'x-ratelimit-limit-requests')
+        remaining_requests = _int_header(headers, 'x-ratelimit-remaining-requests')
+        limit_tokens = _int_header(headers, 'x-ratelimit-limit-tokens')
+        remaining_tokens = _int_header(headers, 'x-ratelimit-remaining-tokens')
+
+        if limit_requests:
+            if state.requests is None:
+                state.requests = TokenBucket(self._scaled(limit_requests))
+            state.requests.sync(self._scaled(limit_requests), remaining_requests)
+        if limit_tokens:
+            if state.tokens is None:
+                state.tokens = TokenBucket(self._scaled(limit_tokens))
+            state.tokens.sync(self._scaled(limit_tokens), remaining_tokens)
+        elif state.tokens and used_tokens is not None and used_tokens < estimated_tokens:
+            # Without server figures, give back what the estimate over-reserved
+            state.tokens.refund(estimated_tokens - used_tokens)
+
+        low = any(
+            limit and remaining is not None and remaining < limit * self.headroom
+            for limit, remaining in ((limit_requests, remaining_requests), (limit_tokens, remaining_tokens))
+        )
+        if not low:
+            state.concurrency.on_success()
+
+    def record_throttle(
+        self,
+        model: str,
+        headers: Optional[Mapping[str, str]] = None,
+        attempt: int = 0
+    ) -> float:
+        """
+        Back off after an HTTP 429.
+
+        Args:
+            model: Model name
+            headers: Headers of the 429 response
+            attempt: Zero-based retry attempt, for exponential backoff when
+                the server gives no delay
+
+        Returns:
+            Seconds to wait before retrying
+        """
+        state = self._model(model)
+        with state.lock:
+            state.throttled += 1
+        state.concurrency.on_throttle()
+        headers = _lower_headers(headers)
+
+        delay = None
+        if 'retry-after-ms' in headers:
+            delay = parse_reset_duration(headers['retry-after-ms'] + 'ms')
+        elif 'retry-after' in headers:
+            delay = parse_reset_duration(headers['retry-after'])
+        if delay is None:
+            resets = [parse_reset_duration(headers.get(name))
+                      for name in ('x-ratelimit-reset-requests', 'x-ratelimit-reset-tokens')]
+            resets = [r for r in resets if r is not None]
+            delay = max(resets) if resets else min(60.0, 2 ** attempt) * (0.5 + random.random() / 2)
+
+        # Hold back every caller for this model, not just the one retrying
+        for bucket in (state.requests, state.tokens):
+            if bucket is not None:
+                bucket.drain(delay)
+        return delay
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-model request counts, throttles, waits and current concurrency."""
+        with self._lock:
+            models = dict(self._models)
+        return {
+            model: {
+                'requests': state.request_count,
+                'throttled': state.throttled,
+                'wait_seconds': round(state.wait_seconds, 3),
+                'concurrency_limit': int(state.concurrency.limit)
+            }
+            for model, state in models.items()
+        }
+
+
+def _used_tokens(response: Any) -> Optional[int]:
+    """Read total_tokens from a parsed response, if it reports usage."""
+    total = getattr(getattr(response, 'usage', None), 'total_tokens', None)
+    return total if isinstance(total, int) else None
+
+
+def _error_headers(error: BaseException) -> Optional[Mapping[str, str]]:
+    """Get the response headers attached to an API error."""
+    return getattr(getattr(error, 'response', None), 'headers', None)
+
+
+class RateLimitedClient:
+    """
+    Wrapper exposing ``chat.completions.create`` and ``images.generate`` of an
+    OpenAI client, with every call gated by a RateLimiter.
+
+    Calls go through ``with_raw_response`` so rate-limit headers can be fed
+    back into the limiter; 429s are retried by the limiter, so construct the
+    wrapped client with ``max_retries=0``.
+    """
+
+    def __init__(self, client: Any, limiter: RateLimiter):
+        self.client = client
+        self.limiter = limiter
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_chat))
+        self.images = SimpleNamespace(generate=self._generate_image)
+
+    def _create_chat(self, **request_params) -> Any:
+        return self._call(self.client.chat.completions.with_raw_response.create, "chat", request_params)
+
+    def _generate_image(self, **request_params) -> Any:
+        return self._call(self.client.images.with_raw_response.generate, "image", request_params)
+
+    def _call(self, send: Any, request_type: str, request_params: Dict[str, Any]) -> Any:
+        model = request_params.get('model', 'default')
+        tokens = estimate_tokens(request_type, request_params)
+
+        for attempt in range(self.limiter.max_retries + 1):
+            self.limiter.acquire(model, tokens)
+            try:
+                raw = send(**request_params)
+            except Exception as e:
+                error = e
+            else:
+                error = None
+            finally:
+                self.limiter.release(model)
+
+            if error is None:
+                response = raw.parse()
+                self.limiter.record_success(model, raw.headers, tokens, _used_tokens(response))
+                return response
+            if not is_rate_limit_error(error) or attempt == self.limiter.max_retries:
+                raise error
+
+            delay = self.limiter.record_throttle(model, _error_headers(error), attempt)
+            log_event(_log, logging.INFO, "rate_limited", sample=True, model=model, attempt=attempt + 1,
+                      delay_s=round(delay, 1))
+            time.sleep(delay)
+
+
+class AsyncRateLimitedClient(RateLimitedClient):
+    """RateLimitedClient for an AsyncOpenAI client; waits never block the event loop."""
+
+    async def _create_chat(self, **request_params) -> Any:
+        return await self._call(self.client.chat.completions.with_raw_response.create, "chat", request_params)
+
+    async def _generate_image(self, **request_params) -> Any:
+        return await self._call(self.client.images.with_raw_response.generate, "image", request_params)
+
+    async def _call(self, send: Any, request_type: str, request_params: Dict[str, Any]) -> Any:
+        model = request_params.get('model', 'default')
+        tokens = estimate_tokens(request_type, request_params)
+
+        for attempt in range(self.limiter.max_retries + 1):
+            await self.limiter.acquire_async(model, tokens)
+            try:
+                raw = await send(**request_params)
+            except Exception as e:
+                error = e
+            else:
+                error = None
+            finally:
+                self.limiter.release(model)
+
+            if error is None:
+                response = raw.parse()
+                self.limiter.record_success(model, raw.headers, tokens, _used_tokens(response))
+                return response
+            if not is_rate_limit_error(error) or attempt == self.limiter.max_retries:
+                raise error
+
+            delay = self.limiter.record_throttle(model, _error_headers(error), attempt)
+            log_event(_log, logging.INFO, "rate_limited", sample=True, model=model, attempt=attempt + 1,
+                      delay_s=round(delay, 1))
+            await asyncio.sleep(delay)
@@ -0,0 +1,272 @@
+"""
+Leveled, structured logging for the per-request hot paths.
+
+Cache lookups, API requests and rate-limit retries log named events with
+key=value fields through log_event() instead of printing every call::
+
+    log_event(_log, logging.DEBUG, "cache_hit", sample=True, cache_type="text", key=key[:8])
+
+A disabled event costs a level check: nothing is formatted or written. Per
+request events passed with sample=True are further thinned to a sampled
+fraction, and an optional summary line aggregates the counts of every event
+per interval, so a batch run logs one line every few seconds rather than
+one per request::
+
+    configure_logging("info", sample_rate=0.01, summary_interval=10)
+
+Events go to loggers under "arcade" (arcade.cache, arcade.requests, ...), so
+the standard logging configuration applies as well. Until configure_logging
+is called again, only warnings and errors are shown.
+"""
+
+import contextlib
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional, TextIO
+
+LOGGER_NAME = "arcade"
+
+LOG_LEVELS = ("debug", "info", "warning", "error")
+
+# Fraction of sampled events logged (1.0 logs all of them)
+_sample_rate = 1.0
+
+# Active SummaryCounter, or None when summaries are off
+_summary = None
+
+# Handler installed by configure_logging, replaced when it is called again
+_handler = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Get the logger for a component, e.g. get_logger("cache")."""
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+def log_event(logger: logging.Logger, level: int, event: str, sample: bool = False, **fields) -> None:
+    """
+    Log a named event with structured fields.
+
+    Args:
+        logger: Component logger (see get_logger)
+        level: logging level, e.g. logging.DEBUG
+        event: Event name, e.g. "cache_hit"
+        sample: Subject the event to the configured sample rate (for
+            messages emitted once per request)
+        **fields: Values rendered as key=value (or JSON members)
+    """
+    if _summary is not None:
+        _summary.count(event)
+    if not logger.isEnabledFor(level):
+        return
+    if sample and _sample_rate < 1.0 and random.random() >= _sample_rate:
+        return
+    logger.log(level, event, extra={'event': event, 'fields': fields})
+
+
+def _format_value(value: Any) -> str:
+    text = str(value)
+    if not text or any(c in text for c in ' ="'):
+        return json.dumps(text, ensure_ascii=False)
+    return text
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Render records as ``time level logger event key=value ...`` or JSON lines.
+
+    Records not produced by log_event render their message as the event.
+    """
+
+    def __init__(self, json_lines: bool = False):
+        super().__init__()
+        self.json_lines = json_lines
+
+    def format(self, record: logging.LogRecord) -> str:
+        event = getattr(record, 'event', None) or record.getMessage()
+        fields = getattr(record, 'fields', None) or {}
+        timestamp = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created))
+        timestamp += f".{int(record.msecs):03d}"
+
+        if self.json_lines:
+            document = {'time': timestamp, 'level': record.levelname.lower(), 'logger': record.name,
+                        'event': event, **fields}
+            if record.exc_info:
+                document['exception'] = self.formatException(record.exc_info)
+            return json.dumps(document, default=str, ensure_ascii=False)
+
+        line = f"{timestamp} {record.levelname:<7} {record.name} {event}"
+        if fields:
+            line += " " + " ".join(f"{key}={_format_value(value)}" for key, value in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class _StderrHandler(logging.StreamHandler):
+    """Stream handler writing to whatever sys.stderr is at the time of each record."""
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+
+    @property
+    def stream(self):
+        return sys.stderr
+
+
+class SummaryCounter:
+    """
+    Counts events and logs one aggregated line per interval.
+
+    The line is written by the first event after the interval has elapsed
+    (and by flush()), so no background thread is needed.
+    """
+
+    def __init__(self, interval: float, logger: Optional[logging.Logger] = None):
+        """
+        Initialize the counter.
+
+        Args:
+            interval: Seconds between summary lines
+            logger: Logger receiving the lines (default: arcade.summary)
+        """
+        self.interval = interval
+        self.logger = logger or get_logger("summary")
+        self.counts: Dict[str, int] = {}
+        self.totals: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+
+    def count(self, event: str) -> None:
+        """Count one event, logging the summary if the interval has elapsed."""
+        with self._lock:
+            self.counts[event] = self.counts.get(event, 0) + 1
+            due = time.monotonic() - self._window_start >= self.interval
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """Log the counts since the last summary (if any) and start a new window."""
+        with self._lock:
+            counts, self.counts = self.counts, {}
+            now = time.monotonic()
+            window, self._window_start = now - self._window_start, now
+            for event, n in counts.items():
+                self.totals[event] = self.totals.get(event, 0) + n
+        if counts:
+            self.logger.info("summary", extra={'event': "summary", 'fields': {
+                'window_s': round(window, 1), **dict(sorted(counts.items()))
+            }})
+
+
+def configure_logging(
+    level: str = "warning",
+    sample_rate: float = 1.0,
+    summary_interval: Optional[float] = None,
+    json_lines: bool = False,
+    stream: Optional[TextIO] = None
+) -> None:
+    """
+    Set up the "arcade" loggers; calling it again replaces the previous setup.
+
+    Args:
+        level: Lowest level logged, one of LOG_LEVELS
+        sample_rate: Fraction (0-1) of per-request events logged
+        summary_interval: Seconds between aggregated event-count lines
+            (None disables them, and with them all event counting)
+        json_lines: Write one JSON object per line instead of key=value text
+        stream: Output stream (default: sys.stderr)
+
+    Raises:
+        ValueError: On an unknown level or a sample rate outside 0-1
+    """
+    global _sample_rate, _summary, _handler
+    if level not in LOG_LEVELS:
+        raise ValueError(f"Unknown log level: {level} (expected one of {', '.join(LOG_LEVELS)})")
+    if not 0.0 <= sample_rate <= 1.0:
+        raise ValueError(f"Sample rate must be between 0 and 1: {sample_rate}")
+
+    flush_summary()
+    logger = logging.getLogger(LOGGER_NAME)
+    if _handler is not None:
+        logger.removeHandler(_handler)
+    _handler = logging.StreamHandler(stream) if stream is not None else _StderrHandler()
+    _handler.setFormatter(StructuredFormatter(json_lines))
+    logger.addHandler(_handler)
+    logger.setLevel(getattr(logging, level.upper()))
+    logger.propagate = False
+
+    _sample_rate = sample_rate
+    _summary = SummaryCounter(summary_interval) if summary_interval else None
+    # Summaries are written whatever the level
+    get_logger("summary").setLevel(logging.INFO if _summary is not None else logging.NOTSET)
+
+
+@contextlib.contextmanager
+def logging_configured(**options):
+    """
+    Apply configure_logging(**options) inside the block, then restore the previous setup.
+
+    The pending summary line is written on exit, so a run's last partial
+    interval is not lost.
+    """
+    global _sample_rate, _summary, _handler
+    logger = logging.getLogger(LOGGER_NAME)
+    summary_logger = get_logger("summary")
+    saved = (_handler, _sample_rate, _summary, logger.level, logger.propagate, summary_logger.level)
+    if _handler is not None:
+        logger.removeHandler(_handler)
+    _handler, _summary = None, None
+    try:
+        configure_logging(**options)
+        yield
+    finally:
+        flush_summary()
+        logger.removeHandler(_handler)
+        _handler, _sample_rate, _summary, level, propagate, summary_level = saved
+        if _handler is not None:
+            logger.addHandler(_handler)
+        logger.setLevel(level)
+        logger.propagate = propagate
+        summary_logger.setLevel(summary_level)
+
+
+def flush_summary() -> None:
+    """Write the pending summary line, e.g. at the end of a run."""
+    if _summary is not None:
+        _summary.flush()
+
+
+def add_logging_arguments(parser) -> None:
+    """Add the --log-* options (see logging_options) to an ArgumentParser."""
+    parser.add_argument(
+        "--log-level", choices=LOG_LEVELS, default="warning",
+        help="lowest level of cache, request and retry events logged to stderr"
+    )
+    parser.add_argument(
+        "--log-sample", type=float, default=1.0,
+        help="fraction (0-1) of per-request events logged"
+    )
+    parser.add_argument(
+        "--log-summary", type=float, default=None, metavar="SECONDS",
+        help="log aggregated event counts every SECONDS"
+    )
+    parser.add_argument("--log-json", action="store_true", help="log JSON lines instead of key=value text")
+
+
+def logging_options(args) -> Dict[str, Any]:
+    """Collect the configure_logging arguments from parsed --log-* options."""
+    return {
+        'level': args.log_level,
+        'sample_rate': args.log_sample,
+        'summary_interval': args.log_summary,
+        'json_lines': args.log_json,
+    }
+
+
+# Warnings and errors go to stderr until configured otherwise
+configure_logging()
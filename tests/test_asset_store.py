@@ -0,0 +1,121 @@
+"""
+Tests for the step asset store.
+"""
+
+import pytest
+import asyncio
+import tempfile
+import shutil
+from pathlib import Path
+
+from asset_store import AssetStore, step_assets
+from blob_store import BlobStore
+from flow_model import Flow
+from downloader import Downloader
+from utils import OpenAICache
+from generate_report import build_report_pipeline
+from tests.test_downloader import FakeAssetServer
+from tests.test_pipeline import fake_request
+
+
+def make_flow(server, thumbnail='/thumb.png'):
+    """Build a flow whose assets are served by the local server."""
+    return Flow.from_dict({
+        'name': 'Assets',
+        'steps': [
+            {'type': 'CHAPTER', 'title': 'Intro'},
+            {'type': 'IMAGE', 'assetId': 'img-1', 'url': server.url('/shot.png'),
+             'clickContext': {'text': 'Go', 'elementType': 'button'}, 'pageContext': {}},
+            {'type': 'VIDEO', 'assetId': 'vid-1', 'videoThumbnailUrl': server.url(thumbnail),
+             'startTimeFrac': 0, 'endTimeFrac': 0.5, 'duration': 4},
+            {'type': 'VIDEO', 'assetId': 'vid-1', 'videoThumbnailUrl': server.url(thumbnail),
+             'startTimeFrac': 0.5, 'endTimeFrac': 1, 'duration': 4},
+        ],
+        'capturedEvents': []
+    })
+
+
+class TestAssetStore:
+    """Test suite for AssetStore."""
+
+    @pytest.fixture
+    def temp_cache_dir(self):
+        """Create a temporary cache directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield Path(temp_dir)
+        shutil.rmtree(temp_dir)
+
+    @pytest.fixture
+    def server(self):
+        """Start a local asset server."""
+        with FakeAssetServer() as server:
+            server.payloads['/shot.png'] = b'\x89PNG screenshot'
+            server.payloads['/thumb.png'] = b'\x89PNG thumbnail'
+            yield server
+
+    def make_store(self, temp_cache_dir):
+        """Create an asset store over a fresh blob store."""
+        blobs = BlobStore(temp_cache_dir / "blobs")
+        return AssetStore(temp_cache_dir / "assets", blobs, Downloader(backoff=0))
+
+    def test_step_assets(self, server):
+        """Test that only VIDEO thumbnails are listed, once each."""
+        flow = make_flow(server)
+
+        assert step_assets(flow) == [('vid-1', server.url('/thumb.png'))]
+
+    def test_prefetch_then_offline(self, temp_cache_dir, server):
+        """Test that assets are fetched once and then served from disk."""
+        store = self.make_store(temp_cache_dir)
+        flow = make_flow(server)
+
+        refs = store.prefetch(flow)
+
+        assert server.requests == ['/thumb.png']
+        assert store.blobs.get(refs[server.url('/thumb.png')]) == b'\x89PNG thumbnail'
+        assert refs[server.url('/thumb.png')].startswith('blob:image/png;sha256,')
+
+        # A second store over the same directories needs no network at all
+        server.server.shutdown()
+        assert self.make_store(temp_cache_dir).prefetch(flow) == refs
+        assert len(server.requests) == 1
+
+    def test_unavailable_asset_is_skipped(self, temp_cache_dir, server):
+        """Test that a failed download leaves the asset out of the mapping."""
+        store = self.make_store(temp_cache_dir)
+        flow = make_flow(server, thumbnail='/missing.png')
+
+        refs = store.prefetch(flow)
+
+        assert refs == {}
+        assert store.lookup('vid-1', server.url('/missing.png')) is None
+
+    def test_cleared_blob_is_refetched(self, temp_cache_dir, server):
+        """Test that an index entry whose blob is gone counts as missing."""
+        store = self.make_store(temp_cache_dir)
+        ref = store.fetch('img-1', server.url('/shot.png'))
+
+        store.blobs.clear()
+
+        assert store.lookup('img-1', server.url('/shot.png')) is None
+        assert store.fetch('img-1', server.url('/shot.png')) == ref
+        assert server.requests == ['/shot.png', '/shot.png']
+
+    def test_pipeline_sends_thumbnails_from_disk(self, temp_cache_dir, server):
+        """Test that VIDEO requests reference the stored thumbnail."""
+        cache = OpenAICache(cache_dir=str(temp_cache_dir / "cache"))
+        store = AssetStore(temp_cache_dir / "assets", cache.blobs, Downloader(backoff=0))
+        flow = make_flow(server)
+        thumbnails = []
+
+        async def request(**params):
+            if 'image_url' in str(params.get('messages')):
+                thumbnails.append(params['messages'][1]['content'][1]['image_url']['url'])
+            return await fake_request(**params)
+
+        pipeline = build_report_pipeline(request, cache, output_dir=str(temp_cache_dir / "out"), assets=store)
+        asyncio.run(pipeline.run({"flow": flow}, outputs=["video_descriptions"]))
+
+        ref = store.lookup('vid-1', server.url('/thumb.png'))
+        assert thumbnails == [ref, ref]
+        assert cache.blobs.expand({'url': ref}) == {'url': cache.blobs.data_url(ref)}
@@ -0,0 +1,234 @@
+"""
+Tests for the multi-flow batch entry point.
+"""
+
+import pytest
+import json
+import tempfile
+import shutil
+from pathlib import Path
+from unittest.mock import Mock
+
+import batch_report
+import generate_report
+from batch_report import load_jobs, percentile, run_batch, summarize
+
+
+def make_flow(name):
+    """Build a minimal flow with one IMAGE and one VIDEO step."""
+    return {
+        'name': name,
+        'description': f'{name} description',
+        'steps': [
+            {'type': 'CHAPTER', 'title': name, 'subtitle': 'Intro'},
+            {'type': 'IMAGE', 'clickContext': {'text': 'Search', 'elementType': 'button'},
+             'pageContext': {'url': 'https://example.com', 'title': 'Example'}},
+            {'type': 'VIDEO', 'startTimeFrac': 0.0, 'endTimeFrac': 0.5, 'duration': 10.0,
+             'videoThumbnailUrl': 'https://example.com/thumb.png'}
+        ],
+        'capturedEvents': []
+    }
+
+
+def fake_chat(**kwargs):
+    """Answer each pipeline prompt with a plausible response."""
+    system = kwargs['messages'][0]['content']
+    if 'DALL-E prompts' in system:
+        content = json.dumps({"prompts": [{"variation": f"Style {i}", "prompt": f"prompt {i}"} for i in range(3)]})
+    elif 'evaluating social media images' in system:
+        scores = {"visual_appeal": 8, "professionalism": 8, "relevance": 8, "engagement": 8, "overall": 8}
+        content = json.dumps({"selected_image": 2, "reasoning": "Clear",
+                              "scores": {f"image_{i}": scores for i in (1, 2, 3)}})
+    else:
+        content = f"Response to {len(json.dumps(kwargs['messages']))} chars"
+    response = Mock()
+    response.model_dump.return_value = {"choices": [{"message": {"content": content}}]}
+    return response
+
+
+def fake_image(**kwargs):
+    """Return a fake image URL for a prompt."""
+    response = Mock()
+    response.model_dump.return_value = {"data": [{"url": f"https://images.example.com/{kwargs['prompt']}.png"}]}
+    return response
+
+
+def make_async_client(limiter=None, use_async=True, base_url=None):
+    """Create a mock AsyncOpenAI client."""
+    client = Mock()
+
+    async def chat(**kwargs):
+        return fake_chat(**kwargs)
+
+    async def image(**kwargs):
+        return fake_image(**kwargs)
+
+    client.chat.completions.create.side_effect = chat
+    client.images.generate.side_effect = image
+    return client
+
+
+def fake_download(url, save_path):
+    """Write a placeholder PNG instead of downloading."""
+    Path(save_path).write_bytes(b'\x89PNG\r\n\x1a\n' + url.encode())
+    return True
+
+
+class TestLoadJobs:
+    """Test suite for load_jobs."""
+
+    @pytest.fixture
+    def temp_dir(self):
+        """Create a temporary directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield Path(temp_dir)
+        shutil.rmtree(temp_dir)
+
+    def test_directory_of_flows(self, temp_dir):
+        """Test that every JSON file in a directory becomes a job."""
+        (temp_dir / "flows").mkdir()
+        for name in ("b", "a"):
+            (temp_dir / "flows" / f"{name}.json").write_text(json.dumps(make_flow(name)))
+
+        jobs = load_jobs(temp_dir / "flows", temp_dir / "out")
+
+        assert [job['flow_id'] for job in jobs] == ["a", "b"]
+        assert jobs[0]['output_dir'] == str(temp_dir / "out" / "a")
+        assert jobs[0]['flow_path'] == str(temp_dir / "flows" / "a.json")
+
+    def test_jsonl_manifest(self, temp_dir):
+        """Test manifest entries by path, with explicit ids/outputs, and inline."""
+        (temp_dir / "one.json").write_text(json.dumps(make_flow("one")))
+        manifest = temp_dir / "manifest.jsonl"
+        manifest.write_text("\n".join([
+            json.dumps({"flow_path": "one.json"}),
+            json.dumps({"flow_path": "one.json", "flow_id": "one again", "output_dir": str(temp_dir / "custom")}),
+            "",
+            json.dumps({"id": "inline", **make_flow("inline")}),
+        ]))
+
+        jobs = load_jobs(manifest, temp_dir / "out")
+
+        assert [job['flow_id'] for job in jobs] == ["one", "one again", "inline"]
+        assert jobs[0]['flow_path'] == str(temp_dir / "one.json")
+        assert jobs[1]['output_dir'] == str(temp_dir / "custom")
+        assert jobs[2]['flow_data']['name'] == "inline"
+        assert jobs[2]['output_dir'] == str(temp_dir / "out" / "inline")
+
+    def test_duplicate_flow_ids_rejected(self, temp_dir):
+        """Test that two flows writing to the same directory are rejected."""
+        manifest = temp_dir / "manifest.jsonl"
+        manifest.write_text(json.dumps({"flow_path": "x/flow.json"}) + "\n" + json.dumps({"flow_path": "y/flow.json"}))
+
+        with pytest.raises(ValueError, match="Duplicate flow id"):
+            load_jobs(manifest)
+
+
+class TestSummarize:
+    """Test suite for the throughput summary."""
+
+    def test_percentile(self):
+        """Test interpolated percentiles."""
+        assert percentile([4, 1, 3, 2], 50) == 2.5
+        assert percentile(list(range(1, 101)), 95) == pytest.approx(95.05)
+        assert percentile([7], 95) == 7
+        assert percentile([], 50) is None
+
+    def test_summarize(self):
+        """Test counts, flows/min and latency figures."""
+        results = [{'status': 'ok', 'seconds': s} for s in (1.0, 2.0, 3.0)] + [{'status': 'error', 'seconds': 0.1}]
+
+        summary = summarize(results, wall_seconds=30)
+
+        assert summary['flows'] == 4
+        assert summary['succeeded'] == 3
+        assert summary['failed'] == 1
+        assert summary['flows_per_minute'] == 6.0
+        assert summary['p50_seconds'] == 2.0
+        assert summary['max_seconds'] == 3.0
+
+
+class TestRunBatch:
+    """Test suite for run_batch with a mock client."""
+
+    @pytest.fixture
+    def temp_dir(self):
+        """Create a temporary directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield Path(temp_dir)
+        shutil.rmtree(temp_dir)
+
+    @pytest.fixture
+    def flows_dir(self, temp_dir):
+        """Write four flows, one of them malformed."""
+        flows_dir = temp_dir / "flows"
+        flows_dir.mkdir()
+        for n in range(3):
+            (flows_dir / f"flow{n}.json").write_text(json.dumps(make_flow(f"Flow {n}")))
+        (flows_dir / "broken.json").write_text("{not json")
+        return flows_dir
+
+    @pytest.fixture(autouse=True)
+    def mock_api(self, monkeypatch):
+        """Replace the OpenAI client and image downloads."""
+        monkeypatch.setattr(batch_report, 'create_client', make_async_client)
+        monkeypatch.setattr(generate_report, 'download_image', fake_download)
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_per_flow_outputs_and_summary(self, temp_dir, flows_dir, workers):
+        """Test that each flow gets its own report and images, and failures are isolated."""
+        out = temp_dir / "out"
+
+        summary = run_batch(flows_dir, output_root=out, workers=workers, chunk_size=1,
+                            cache_dir=str(temp_dir / ".cache"), prefetch_assets=False)
+
+        assert summary['flows'] == 4
+        assert summary['succeeded'] == 3
+        assert summary['failed'] == 1
+        for n in range(3):
+            flow_out = out / f"flow{n}"
+            assert f"# Arcade Flow Analysis Report" in (flow_out / "REPORT.md").read_text()
+            assert "![Flow" in (flow_out / "REPORT.md").read_text()
+            assert "(social_media_image_2.png)" in (flow_out / "REPORT.md").read_text()
+            assert sorted(p.name for p in flow_out.glob("*.png")) == [
+                "social_media_image_1.png", "social_media_image_2.png", "social_media_image_3.png"
+            ]
+
+        saved = json.loads((out / "batch_summary.json").read_text())
+        assert saved['summary'] == summary
+        assert [r['flow_id'] for r in saved['flows']] == ["broken", "flow0", "flow1", "flow2"]
+        assert saved['flows'][0]['status'] == 'error'
+        # Usage adds up across chunks and workers: 5 chat and 3 image requests per flow
+        requests = summary['usage']['requests']
+        assert requests['chat']['hits'] + requests['chat']['misses'] == 3 * 5
+        assert requests['image']['hits'] + requests['image']['misses'] == 3 * 3
+        assert list((out / "logs").glob("worker-*.log"))
+
+    def test_worker_state_shared_across_chunks(self, temp_dir, flows_dir, monkeypatch):
+        """Test that one limiter and client serve every chunk a worker runs."""
+        limiters = []
+
+        def create_client(limiter=None, use_async=True, base_url=None):
+            limiters.append(limiter)
+            return make_async_client(limiter, use_async, base_url)
+        monkeypatch.setattr(batch_report, 'create_client', create_client)
+
+        summary = run_batch(flows_dir, output_root=temp_dir / "out", workers=1, chunk_size=1,
+                            cache_dir=str(temp_dir / ".cache"), prefetch_assets=False)
+
+        assert summary['succeeded'] == 3
+        assert len(limiters) == 1 and limiters[0].share == 1.0
+        assert batch_report._worker is None
+
+    def test_trace_merges_workers(self, temp_dir, flows_dir):
+        """Test that every worker's spans end up in one Chrome trace."""
+        out = temp_dir / "out"
+
+        run_batch(flows_dir, output_root=out, workers=2, chunk_size=1, cache_dir=str(temp_dir / ".cache"),
+                  prefetch_assets=False, trace_path=str(temp_dir / "trace.json"))
+
+        events = [e for e in json.loads((temp_dir / "trace.json").read_text())['traceEvents'] if e['ph'] == 'X']
+        flows = {e['name']: e['args']['status'] for e in events if e['cat'] == 'flow'}
+        assert flows == {"broken": "error", "flow0": "ok", "flow1": "ok", "flow2": "ok"}
+        assert {e['name'] for e in events if e['cat'] == 'stage'} >= {"load_flow", "summary", "report"}
+        assert not (out / "traces").exists()
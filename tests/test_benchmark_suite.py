@@ -0,0 +1,45 @@
+"""
+Tests for the benchmark suite's baseline comparison.
+"""
+
+import pytest
+import json
+import tempfile
+import shutil
+from pathlib import Path
+
+from benchmarks.suite import compare, main
+
+
+class TestBenchmarkSuite:
+    """Test suite for benchmarks.suite."""
+
+    @pytest.fixture
+    def temp_cache_dir(self):
+        """Create a temporary cache directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield temp_dir
+        shutil.rmtree(temp_dir)
+
+    def test_compare(self):
+        """Test regressions, speedups and cases missing from the baseline."""
+        results = {'slow': {'best': 2.0}, 'fast': {'best': 0.5}, 'same': {'best': 1.1}, 'new': {'best': 1.0}}
+        baseline = {'slow': {'best': 1.0}, 'fast': {'best': 1.0}, 'same': {'best': 1.0}}
+
+        assert compare(results, baseline, threshold=0.25) == {
+            'slow': (2.0, "regression"), 'fast': (0.5, "faster"), 'same': (1.1, "ok"), 'new': (None, "new")
+        }
+
+    def test_save_and_detect_regression(self, temp_cache_dir):
+        """Test recording a baseline, then failing against one that is much faster."""
+        baseline = Path(temp_cache_dir) / "baseline.json"
+        args = ["-k", "cache_get/text", "--sizes", "10", "--min-time", "0.001", "--rounds", "1",
+                "--baseline", str(baseline)]
+
+        assert main(args + ["--save"]) == 0
+        stored = json.loads(baseline.read_text())
+        assert list(stored['results']) == ["cache_get/text/10"]
+
+        stored['results']["cache_get/text/10"]['best'] /= 1000
+        baseline.write_text(json.dumps(stored))
+        assert main(args) == 1
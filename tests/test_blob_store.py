@@ -0,0 +1,159 @@
+"""
+Tests for the content-addressed blob store.
+"""
+
+import pytest
+import base64
+import hashlib
+import os
+import tempfile
+import shutil
+from pathlib import Path
+from unittest.mock import Mock
+
+from blob_store import BlobStore, parse_blob_ref
+from utils import OpenAICache, cached_openai_request
+
+PNG_BYTES = b'\x89PNG\r\n\x1a\n' + bytes(range(256)) * 40
+
+
+def vision_request(image_url):
+    """Build chat request params with a single image."""
+    return {
+        "model": "gpt-4o",
+        "messages": [{"role": "user", "content": [
+            {"type": "text", "text": "Which is best?"},
+            {"type": "image_url", "image_url": {"url": image_url, "detail": "low"}}
+        ]}]
+    }
+
+
+class TestBlobStore:
+    """Test suite for BlobStore."""
+
+    @pytest.fixture
+    def temp_cache_dir(self):
+        """Create a temporary cache directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield temp_dir
+        shutil.rmtree(temp_dir)
+
+    @pytest.fixture
+    def store(self, temp_cache_dir):
+        """Create a BlobStore in a temporary directory."""
+        return BlobStore(Path(temp_cache_dir) / "blobs")
+
+    def test_put_and_get(self, store):
+        """Test that a payload round-trips through its reference."""
+        ref = store.put(PNG_BYTES)
+
+        assert ref == f"blob:image/png;sha256,{hashlib.sha256(PNG_BYTES).hexdigest()}"
+        assert parse_blob_ref(ref) == ("image/png", hashlib.sha256(PNG_BYTES).hexdigest())
+        assert store.get(ref) == PNG_BYTES
+
+    def test_identical_content_stored_once(self, store, temp_cache_dir):
+        """Test that the same bytes from different sources share one blob."""
+        image_path = Path(temp_cache_dir) / "image.png"
+        image_path.write_bytes(PNG_BYTES)
+
+        assert store.put(PNG_BYTES) == store.put_file(str(image_path)) == store.put(PNG_BYTES)
+        assert store.stats() == {'blob_count': 1, 'blob_size_bytes': len(PNG_BYTES)}
+
+    def test_data_url(self, store):
+        """Test expanding a reference into a base64 data URL."""
+        ref = store.put(PNG_BYTES)
+
+        assert store.data_url(ref) == "data:image/png;base64," + base64.b64encode(PNG_BYTES).decode()
+
+    def test_externalize_and_expand(self, store):
+        """Test that data URLs become references and expand back unchanged."""
+        data_url = "data:image/png;base64," + base64.b64encode(PNG_BYTES).decode()
+        params = vision_request(data_url)
+
+        externalized = store.externalize(params)
+
+        assert parse_blob_ref(externalized["messages"][0]["content"][1]["image_url"]["url"])
+        assert externalized["messages"][0]["content"][0] == params["messages"][0]["content"][0]
+        assert store.expand(externalized) == params
+
+    def test_non_blob_values_untouched(self, store):
+        """Test that ordinary strings and URLs pass through."""
+        params = vision_request("https://example.com/image.png")
+
+        assert store.externalize(params) == params
+        assert store.expand(params) == params
+        assert parse_blob_ref("blob:image/png;sha256,nothex") is None
+
+    def test_get_invalid_reference_raises(self, store):
+        """Test that reading a non-reference raises ValueError."""
+        with pytest.raises(ValueError, match="Not a blob reference"):
+            store.get("https://example.com/image.png")
+
+    def test_clear(self, store):
+        """Test deleting every blob."""
+        store.put(b"one")
+        store.put(b"two")
+
+        assert store.clear() == 2
+        assert store.stats()['blob_count'] == 0
+
+    def test_prune_keeps_recently_stored(self, store):
+        """Test that pruning deletes old blobs, and storing a blob again keeps it."""
+        old_ref = store.put(b"old")
+        reused_ref = store.put(b"reused")
+        for ref in (old_ref, reused_ref):
+            os.utime(store.path(parse_blob_ref(ref)[1]), (0, 0))
+        store.put(b"reused")
+        store.put(b"new")
+
+        assert store.prune(older_than=3600) == 1
+        assert store.stats()['blob_count'] == 2
+        assert not store.contains(parse_blob_ref(old_ref)[1])
+
+
+class TestBlobRequests:
+    """Test suite for blob references in cached_openai_request."""
+
+    @pytest.fixture
+    def temp_cache_dir(self):
+        """Create a temporary cache directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield temp_dir
+        shutil.rmtree(temp_dir)
+
+    @pytest.fixture
+    def cache(self, temp_cache_dir):
+        """Create an OpenAICache instance with temporary directory."""
+        return OpenAICache(cache_dir=temp_cache_dir)
+
+    @pytest.fixture
+    def mock_openai_client(self):
+        """Create a mock OpenAI client returning a fixed chat response."""
+        client = Mock()
+        client.chat.completions.create.return_value.model_dump.return_value = {
+            "choices": [{"message": {"content": "Image 1"}}]
+        }
+        return client
+
+    def test_reference_expanded_for_api_call(self, mock_openai_client, cache):
+        """Test that the API receives a data URL while the entry stores the reference."""
+        ref = cache.blobs.put(PNG_BYTES)
+        data_url = cache.blobs.data_url(ref)
+
+        cached_openai_request(mock_openai_client, cache, "chat", **vision_request(ref))
+
+        mock_openai_client.chat.completions.create.assert_called_once_with(**vision_request(data_url))
+        entry = cache.backend.read("text", cache._generate_cache_key({"request_type": "chat", **vision_request(ref)}))
+        assert len(entry) < 1000
+
+    def test_inline_data_url_shares_cache_key(self, mock_openai_client, cache):
+        """Test that inline images and references to the same bytes hit one entry."""
+        data_url = "data:image/png;base64," + base64.b64encode(PNG_BYTES).decode()
+
+        cached_openai_request(mock_openai_client, cache, "chat", **vision_request(data_url))
+        cached_openai_request(mock_openai_client, cache, "chat", **vision_request(cache.blobs.put(PNG_BYTES)))
+
+        assert mock_openai_client.chat.completions.create.call_count == 1
+        stats = cache.get_stats()
+        assert stats['text_cache_count'] == 1
+        assert stats['blob_count'] == 1
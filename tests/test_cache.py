@@ -3,14 +3,17 @@ Tests for the OpenAICache class.
 """
 
 import pytest
+import time
 import json
+import hashlib
 import pickle
 import tempfile
 import shutil
 from pathlib import Path
 from datetime import datetime
+from unittest.mock import patch
 
-from utils import OpenAICache
+from utils import OpenAICache, canonical_json_sha256
 
 
 class TestOpenAICache:
@@ -292,3 +295,367 @@ class TestOpenAICache:
         cached = cache.get(request_params, cache_type="text")
 
         assert cached == response
+
+
+class TestMemoryTier:
+    """Test suite for the in-process LRU tier in front of the backend."""
+
+    @pytest.fixture
+    def temp_cache_dir(self):
+        """Create a temporary cache directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield temp_dir
+        shutil.rmtree(temp_dir)
+
+    def test_repeat_get_served_from_memory(self, temp_cache_dir):
+        """Test that a second get does not touch the backend."""
+        cache = OpenAICache(cache_dir=temp_cache_dir)
+        cache.set({"model": "gpt-4"}, {"result": "text"})
+
+        with patch.object(cache.backend, 'read', wraps=cache.backend.read) as read:
+            assert cache.get({"model": "gpt-4"}) == {"result": "text"}
+            assert cache.get({"model": "gpt-4"}) == {"result": "text"}
+
+        read.assert_not_called()
+        assert cache.get_stats()['memory_hits'] == 2
+
+    def test_backend_hit_promoted(self, temp_cache_dir):
+        """Test that entries read from disk are promoted into memory."""
+        OpenAICache(cache_dir=temp_cache_dir).set({"model": "gpt-4"}, {"result": "text"})
+        cache = OpenAICache(cache_dir=temp_cache_dir)
+
+        with patch.object(cache.backend, 'read', wraps=cache.backend.read) as read:
+            cache.get({"model": "gpt-4"})
+            cache.get({"model": "gpt-4"})
+
+        assert read.call_count == 1
+        stats = cache.get_stats()
+        assert stats['memory_promotions'] == 1
+        assert stats['memory_hits'] == 1
+        assert stats['memory_entries'] == 1
+        assert stats['memory_bytes'] > 0
+
+    def test_evicts_by_entry_count(self, temp_cache_dir):
+        """Test that the least recently used entry is evicted past max entries."""
+        cache = OpenAICache(cache_dir=temp_cache_dir, memory_max_entries=2)
+        cache.set({"n": 1}, {"result": 1})
+        cache.set({"n": 2}, {"result": 2})
+        cache.get({"n": 1})  # n=2 is now least recently used
+        cache.set({"n": 3}, {"result": 3})
+
+        stats = cache.get_stats()
+        assert stats['memory_entries'] == 2
+        assert stats['memory_evictions'] == 1
+
+        with patch.object(cache.backend, 'read', wraps=cache.backend.read) as read:
+            assert cache.get({"n": 1}) == {"result": 1}
+            assert cache.get({"n": 2}) == {"result": 2}
+
+        # Only the evicted entry had to come from the backend
+        assert read.call_count == 1
+
+    def test_evicts_by_bytes(self, temp_cache_dir):
+        """Test that the byte bound is enforced and oversized entries skip memory."""
+        cache = OpenAICache(cache_dir=temp_cache_dir, memory_max_bytes=400)
+        cache.set({"n": 1}, {"result": "a" * 100})
+        cache.set({"n": 2}, {"result": "b" * 100})
+        cache.set({"n": 3}, {"result": "c" * 100})
+        cache.set({"n": 4}, {"result": "d" * 1000})
+
+        stats = cache.get_stats()
+        assert stats['memory_bytes'] <= 400
+        assert stats['memory_evictions'] >= 1
+        assert stats['memory_entries'] < 3
+
+        # The oversized entry is still served from disk
+        assert cache.get({"n": 4}) == {"result": "d" * 1000}
+
+    def test_clear_drops_memory(self, temp_cache_dir):
+        """Test that clear also empties the memory tier."""
+        cache = OpenAICache(cache_dir=temp_cache_dir)
+        cache.set({"model": "gpt-4"}, {"result": "text"})
+        cache.set({"prompt": "cat"}, {"result": "image"}, cache_type="images")
+
+        cache.clear(cache_type="text")
+
+        assert cache.get({"model": "gpt-4"}) is None
+        assert cache.get({"prompt": "cat"}, cache_type="images") == {"result": "image"}
+        assert cache.get_stats()['memory_entries'] == 1
+
+    def test_memory_tier_disabled(self, temp_cache_dir):
+        """Test that memory_max_entries=0 sends every get to the backend."""
+        cache = OpenAICache(cache_dir=temp_cache_dir, memory_max_entries=0)
+        cache.set({"model": "gpt-4"}, {"result": "text"})
+
+        with patch.object(cache.backend, 'read', wraps=cache.backend.read) as read:
+            cache.get({"model": "gpt-4"})
+            cache.get({"model": "gpt-4"})
+
+        assert read.call_count == 2
+        assert cache.get_stats()['memory_entries'] == 0
+
+
+class TestEvictionAndTTL:
+    """Test suite for size-bounded eviction and entry expiry."""
+
+    @pytest.fixture
+    def temp_cache_dir(self):
+        """Create a temporary cache directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield temp_dir
+        shutil.rmtree(temp_dir)
+
+    @pytest.fixture(params=["file", "sqlite"])
+    def make_cache(self, request, temp_cache_dir):
+        """Build an OpenAICache on each backend with the given options."""
+        def factory(**kwargs):
+            return OpenAICache(cache_dir=temp_cache_dir, backend=request.param, **kwargs)
+        return factory
+
+    def _entry_size(self, make_cache):
+        """Serialized size of one of the equally sized test entries."""
+        probe = make_cache()
+        probe.set({"n": "probe"}, {"result": "x" * 100})
+        size = probe.get_stats()['total_size_bytes']
+        probe.clear()
+        return size
+
+    def test_size_stays_bounded(self, make_cache):
+        """Test that total size never exceeds max_bytes after a set."""
+        entry_size = self._entry_size(make_cache)
+        cache = make_cache(max_bytes=entry_size * 5)
+
+        for n in range(20):
+            cache.set({"n": f"{n:02d}"}, {"result": "x" * 100})
+            assert cache.get_stats()['total_size_bytes'] <= entry_size * 5
+
+        stats = cache.get_stats()
+        assert stats['text_cache_count'] == 5
+        assert stats['evictions'] == 15
+
+    def test_lru_evicts_least_recently_used(self, make_cache):
+        """Test that a recently read entry survives LRU eviction."""
+        entry_size = self._entry_size(make_cache)
+        cache = make_cache(max_bytes=entry_size * 3, eviction_policy="lru")
+        for name in ("a", "b", "c"):
+            cache.set({"n": f"{name}0"}, {"result": "x" * 100})
+            time.sleep(0.01)
+        cache.get({"n": "a0"})
+        time.sleep(0.01)
+
+        cache.set({"n": "d0"}, {"result": "x" * 100})
+
+        assert cache.backend.contains("text", cache._generate_cache_key({"n": "a0"}))
+        assert not cache.backend.contains("text", cache._generate_cache_key({"n": "b0"}))
+        assert cache.get_stats()['evictions'] == 1
+
+    def test_lfu_evicts_least_frequently_used(self, make_cache):
+        """Test that the entry with the fewest hits is evicted under LFU."""
+        entry_size = self._entry_size(make_cache)
+        cache = make_cache(max_bytes=entry_size * 3, eviction_policy="lfu")
+        for name in ("a", "b", "c"):
+            cache.set({"n": f"{name}0"}, {"result": "x" * 100})
+        for _ in range(3):
+            cache.get({"n": "a0"})
+            cache.get({"n": "b0"})
+        cache.get({"n": "c0"})
+
+        cache.set({"n": "d0"}, {"result": "x" * 100})
+
+        # c has one hit, a and b three each
+        assert not cache.backend.contains("text", cache._generate_cache_key({"n": "c0"}))
+        assert cache.backend.contains("text", cache._generate_cache_key({"n": "a0"}))
+        assert cache.backend.contains("text", cache._generate_cache_key({"n": "b0"}))
+
+    def test_expired_entry_is_a_miss(self, make_cache):
+        """Test that entries older than max_age are not served."""
+        cache = make_cache(max_age=0.2)
+        cache.set({"model": "gpt-4"}, {"result": "text"})
+        assert cache.get({"model": "gpt-4"}) == {"result": "text"}
+
+        time.sleep(0.3)
+
+        assert cache.get({"model": "gpt-4"}) is None
+
+    def test_expired_entry_on_disk_is_deleted(self, make_cache, temp_cache_dir):
+        """Test that reading an expired entry from the backend removes it."""
+        make_cache().set({"model": "gpt-4"}, {"result": "text"})
+        time.sleep(0.3)
+        cache = make_cache(max_age=0.2)
+
+        assert cache.get({"model": "gpt-4"}) is None
+        assert cache.get_stats()['text_cache_count'] == 0
+        assert cache.get_stats()['expirations'] == 1
+
+    def test_set_purges_expired_entries(self, make_cache):
+        """Test that set removes expired entries incrementally."""
+        cache = make_cache(max_age=0.2)
+        cache.set({"n": "old"}, {"result": "old"})
+        time.sleep(0.3)
+
+        cache.set({"n": "new"}, {"result": "new"})
+
+        assert not cache.backend.contains("text", cache._generate_cache_key({"n": "old"}))
+        assert cache.backend.contains("text", cache._generate_cache_key({"n": "new"}))
+        assert cache.get_stats()['expirations'] == 1
+
+    def test_unbounded_by_default(self, make_cache):
+        """Test that nothing is evicted without max_bytes or max_age."""
+        cache = make_cache()
+        for n in range(10):
+            cache.set({"n": n}, {"result": "x" * 100})
+
+        stats = cache.get_stats()
+        assert stats['text_cache_count'] == 10
+        assert stats['evictions'] == 0
+        assert stats['expirations'] == 0
+
+    def test_unknown_policy_raises_error(self, temp_cache_dir):
+        """Test that an unknown eviction policy raises ValueError."""
+        with pytest.raises(ValueError, match="Unsupported eviction policy"):
+            OpenAICache(cache_dir=temp_cache_dir, eviction_policy="fifo")
+
+
+class TestCompression:
+    """Test suite for compact and compressed cache entries."""
+
+    @pytest.fixture
+    def temp_cache_dir(self):
+        """Create a temporary cache directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield temp_dir
+        shutil.rmtree(temp_dir)
+
+    @pytest.fixture
+    def vision_params(self):
+        """Request params carrying a large base64 image payload."""
+        return {
+            "model": "gpt-4o",
+            "messages": [{"role": "user", "content": [
+                {"type": "image_url", "image_url": {"url": "data:image/png;base64," + "iVBORw0KGgo" * 20000}}
+            ]}]
+        }
+
+    def _entry_bytes(self, cache, request_params, cache_type="text"):
+        """Read the raw stored bytes of an entry."""
+        return cache.backend.read(cache_type, cache._generate_cache_key(request_params))
+
+    def test_plain_entries_are_compact_json(self, temp_cache_dir):
+        """Test that uncompressed text entries are non-indented JSON."""
+        cache = OpenAICache(cache_dir=temp_cache_dir)
+        cache.set({"model": "gpt-4"}, {"choices": [{"message": {"content": "Hi"}}]})
+
+        raw = self._entry_bytes(cache, {"model": "gpt-4"})
+
+        assert raw.startswith(b'{')
+        assert b'\n' not in raw
+        assert b', ' not in raw
+
+    @pytest.mark.parametrize("compression", ["zlib", "zstd"])
+    def test_compressed_round_trip(self, temp_cache_dir, vision_params, compression):
+        """Test that compressed text and image entries read back unchanged."""
+        if compression == "zstd":
+            pytest.importorskip("zstandard")
+        cache = OpenAICache(cache_dir=temp_cache_dir, compression=compression)
+        plain = OpenAICache(cache_dir=temp_cache_dir + "/plain")
+
+        for c in (cache, plain):
+            c.set(vision_params, {"choices": [{"message": {"content": "Image 2"}}]})
+            c.set({"prompt": "cat"}, {"data": [{"url": "https://example.com/cat.png"}]}, cache_type="images")
+
+        fresh = OpenAICache(cache_dir=temp_cache_dir)
+        assert fresh.get(vision_params) == {"choices": [{"message": {"content": "Image 2"}}]}
+        assert fresh.get({"prompt": "cat"}, cache_type="images") == {"data": [{"url": "https://example.com/cat.png"}]}
+        assert len(self._entry_bytes(cache, vision_params)) < len(self._entry_bytes(plain, vision_params)) / 10
+
+    def test_legacy_indented_entries_readable(self, temp_cache_dir):
+        """Test that entries written in the old indented format still load."""
+        cache = OpenAICache(cache_dir=temp_cache_dir, compression="zlib")
+        request_params = {"model": "gpt-4"}
+        cache_path = cache._get_cache_path(cache._generate_cache_key(request_params), "text")
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'timestamp': datetime.now().isoformat(),
+                'request_params': request_params,
+                'response': {"result": "legacy"}
+            }, f, indent=2)
+
+        assert cache.get(request_params) == {"result": "legacy"}
+
+    def test_store_params_digest_only(self, temp_cache_dir, vision_params):
+        """Test that store_params=False keeps only the key digest."""
+        cache = OpenAICache(cache_dir=temp_cache_dir, store_params=False)
+        cache.set(vision_params, {"result": "ok"})
+
+        cache_key = cache._generate_cache_key(vision_params)
+        with open(cache._get_cache_path(cache_key, "text"), 'r', encoding='utf-8') as f:
+            cached_data = json.load(f)
+
+        assert 'request_params' not in cached_data
+        assert cached_data['request_digest'] == cache_key
+        assert cache.get(vision_params) == {"result": "ok"}
+        assert len(self._entry_bytes(cache, vision_params)) < 1000
+
+    def test_corrupted_compressed_entry_handling(self, temp_cache_dir):
+        """Test that a truncated compressed entry is treated as a miss."""
+        cache = OpenAICache(cache_dir=temp_cache_dir, compression="zlib", memory_max_entries=0)
+        cache.set({"model": "gpt-4"}, {"result": "x" * 1000})
+        cache_key = cache._generate_cache_key({"model": "gpt-4"})
+        cache.backend.write("text", cache_key, self._entry_bytes(cache, {"model": "gpt-4"})[:10])
+
+        assert cache.get({"model": "gpt-4"}) is None
+
+    def test_unknown_compression_raises_error(self, temp_cache_dir):
+        """Test that an unknown compression name raises ValueError."""
+        with pytest.raises(ValueError, match="Unsupported cache compression"):
+            OpenAICache(cache_dir=temp_cache_dir, compression="lz4")
+
+    def test_zstd_requires_zstandard(self, temp_cache_dir):
+        """Test a clear error when zstandard is not installed."""
+        with patch('utils.zstandard', None):
+            with pytest.raises(ValueError, match="zstandard"):
+                OpenAICache(cache_dir=temp_cache_dir, compression="zstd")
+
+
+class TestCanonicalJsonSha256:
+    """Test suite for the streamed cache-key hash."""
+
+    @pytest.fixture
+    def temp_cache_dir(self):
+        """Create a temporary cache directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield temp_dir
+        shutil.rmtree(temp_dir)
+
+    @pytest.mark.parametrize("value", [
+        {},
+        [],
+        "",
+        {"model": "gpt-4", "messages": [{"role": "user", "content": "Hi"}], "temperature": 0.7},
+        {"nested": {"b": [1, 2.5, None, True, False], "a": {"z": [], "y": {}}}},
+        {"unicode": "café 😀 \n\t\"quoted\" \\  "},
+        {"numbers": [0, -1, 10 ** 30, 1e300, -0.0, float("nan"), float("inf"), float("-inf")]},
+        {2: "int keys sort numerically", 10: "x"},
+        {"tuple": ("a", 1)},
+        {"large": "data:image/png;base64," + "QUJD" * 200000 + "é" * 70000},
+    ])
+    def test_matches_json_dumps(self, value):
+        """Test that the digest equals hashing json.dumps(sort_keys=True)."""
+        expected = hashlib.sha256(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()
+
+        assert canonical_json_sha256(value) == expected
+
+    def test_unserializable_raises_type_error(self):
+        """Test that values json cannot encode are rejected."""
+        with pytest.raises(TypeError):
+            canonical_json_sha256({"value": object()})
+
+    def test_get_or_compute_hashes_params_once(self, temp_cache_dir):
+        """Test that a miss computes the key once for lookups and the write."""
+        cache = OpenAICache(cache_dir=temp_cache_dir)
+
+        with patch.object(cache, '_generate_cache_key', wraps=cache._generate_cache_key) as generate:
+            cache.get_or_compute({"model": "gpt-4"}, lambda: {"result": "fresh"})
+            assert generate.call_count == 1
+
+        assert cache.get({"model": "gpt-4"}) == {"result": "fresh"}
@@ -0,0 +1,251 @@
+"""
+Tests for the OpenAICache storage backends.
+"""
+
+import pytest
+import multiprocessing
+import tempfile
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from cache_backends import CacheBackend, FileBackend, SQLiteBackend
+from utils import OpenAICache
+
+
+def _write_entries(db_path, worker, count):
+    """Write entries from a separate process."""
+    backend = SQLiteBackend(db_path)
+    for n in range(count):
+        backend.write("text", f"worker{worker}-{n}", b"x" * 10)
+    backend.close()
+
+
+class TestBackends:
+    """Behaviour shared by every backend."""
+
+    @pytest.fixture
+    def temp_cache_dir(self):
+        """Create a temporary cache directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield temp_dir
+        shutil.rmtree(temp_dir)
+
+    @pytest.fixture(params=["file", "sqlite"])
+    def backend(self, request, temp_cache_dir):
+        """Create each backend in a temporary directory."""
+        if request.param == "file":
+            backend = FileBackend(Path(temp_cache_dir))
+        else:
+            backend = SQLiteBackend(Path(temp_cache_dir) / "cache.sqlite3")
+        yield backend
+        backend.close()
+
+    def test_write_and_read(self, backend):
+        """Test storing and retrieving raw entries."""
+        backend.write("text", "abc", b'{"response": 1}')
+
+        assert backend.read("text", "abc") == b'{"response": 1}'
+        assert backend.contains("text", "abc")
+
+    def test_read_missing(self, backend):
+        """Test that missing entries read as None."""
+        assert backend.read("text", "missing") is None
+        assert not backend.contains("text", "missing")
+
+    def test_types_are_separate(self, backend):
+        """Test that the same key under different types are distinct entries."""
+        backend.write("text", "same", b"text")
+        backend.write("images", "same", b"image")
+
+        assert backend.read("text", "same") == b"text"
+        assert backend.read("images", "same") == b"image"
+
+    def test_overwrite_replaces_entry(self, backend):
+        """Test that rewriting a key replaces it without adding an entry."""
+        backend.write("text", "abc", b"first")
+        backend.write("text", "abc", b"second value")
+
+        assert backend.read("text", "abc") == b"second value"
+        stats = backend.stats()
+        assert stats['text_cache_count'] == 1
+        assert stats['total_size_bytes'] == len(b"second value")
+
+    def test_delete(self, backend):
+        """Test deleting a single entry."""
+        backend.write("text", "abc", b"data")
+
+        assert backend.delete("text", "abc") is True
+        assert backend.delete("text", "abc") is False
+        assert backend.read("text", "abc") is None
+        assert backend.stats()['text_cache_count'] == 0
+
+    def test_stats_and_clear(self, backend):
+        """Test entry counts, byte totals and clearing by type."""
+        backend.write("text", "t1", b"a" * 10)
+        backend.write("text", "t2", b"b" * 20)
+        backend.write("images", "i1", b"c" * 30)
+
+        assert backend.stats() == {
+            'text_cache_count': 2,
+            'image_cache_count': 1,
+            'total_size_bytes': 60
+        }
+
+        assert backend.clear("text") == 2
+        assert backend.stats() == {
+            'text_cache_count': 0,
+            'image_cache_count': 1,
+            'total_size_bytes': 30
+        }
+
+        assert backend.clear() == 1
+        assert backend.stats()['total_size_bytes'] == 0
+
+    def test_concurrent_writers_threads(self, backend):
+        """Test that writes from many threads are all persisted."""
+        def write(n):
+            backend.write("text", f"key{n}", b"x" * n)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(write, range(1, 101)))
+
+        stats = backend.stats()
+        assert stats['text_cache_count'] == 100
+        assert stats['total_size_bytes'] == sum(range(1, 101))
+
+
+class TestFileBackend:
+    """Tests specific to the file backend."""
+
+    @pytest.fixture
+    def temp_cache_dir(self):
+        """Create a temporary cache directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield temp_dir
+        shutil.rmtree(temp_dir)
+
+    def test_rescan_sees_other_writers(self, temp_cache_dir):
+        """Test that a rescanning index counts entries written by another instance."""
+        ours = FileBackend(Path(temp_cache_dir), rescan_interval=0)
+        theirs = FileBackend(Path(temp_cache_dir))
+        once = FileBackend(Path(temp_cache_dir))
+        ours.write("text", "a", b"x" * 10)
+        ours.record_access({("text", "a"): 3}, 123.0)
+        assert ours.total_bytes() == once.total_bytes() == 10
+
+        theirs.write("images", "b", b"y" * 20)
+        theirs.delete("text", "missing")
+
+        assert ours.total_bytes() == 30
+        assert once.total_bytes() == 10
+        assert ours._index[("text", "a")][3] == 3
+
+
+class TestSQLiteBackend:
+    """Tests specific to the SQLite backend."""
+
+    @pytest.fixture
+    def temp_cache_dir(self):
+        """Create a temporary cache directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield temp_dir
+        shutil.rmtree(temp_dir)
+
+    def test_uses_wal_mode(self, temp_cache_dir):
+        """Test that the database runs in write-ahead logging mode."""
+        backend = SQLiteBackend(Path(temp_cache_dir) / "cache.sqlite3")
+
+        mode = backend._connection().execute("PRAGMA journal_mode").fetchone()[0]
+
+        assert mode == "wal"
+
+    def test_counters_persist_across_instances(self, temp_cache_dir):
+        """Test that stored counters are visible to a new connection."""
+        db_path = Path(temp_cache_dir) / "cache.sqlite3"
+        SQLiteBackend(db_path).write("images", "k", b"12345")
+
+        assert SQLiteBackend(db_path).stats() == {
+            'text_cache_count': 0,
+            'image_cache_count': 1,
+            'total_size_bytes': 5
+        }
+
+    def test_concurrent_writers_processes(self, temp_cache_dir):
+        """Test that several processes can write to one database."""
+        db_path = Path(temp_cache_dir) / "cache.sqlite3"
+        SQLiteBackend(db_path)
+
+        context = multiprocessing.get_context("spawn")
+        processes = [
+            context.Process(target=_write_entries, args=(db_path, worker, 50))
+            for worker in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(timeout=60)
+            assert process.exitcode == 0
+
+        stats = SQLiteBackend(db_path).stats()
+        assert stats['text_cache_count'] == 200
+        assert stats['total_size_bytes'] == 2000
+
+
+class TestOpenAICacheBackendSelection:
+    """Tests for choosing a backend through OpenAICache."""
+
+    @pytest.fixture
+    def temp_cache_dir(self):
+        """Create a temporary cache directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield temp_dir
+        shutil.rmtree(temp_dir)
+
+    def test_sqlite_backend_round_trip(self, temp_cache_dir):
+        """Test that OpenAICache works end to end on SQLite."""
+        cache = OpenAICache(cache_dir=temp_cache_dir, backend="sqlite")
+
+        cache.set({"model": "gpt-4"}, {"result": "text"}, cache_type="text")
+        cache.set({"prompt": "cat"}, {"data": [{"url": "x"}]}, cache_type="images")
+
+        assert cache.get({"model": "gpt-4"}, cache_type="text") == {"result": "text"}
+        assert cache.get({"prompt": "cat"}, cache_type="images") == {"data": [{"url": "x"}]}
+        assert (Path(temp_cache_dir) / "cache.sqlite3").exists()
+        assert not list(Path(temp_cache_dir).glob("text/*.json"))
+
+        stats = cache.get_stats()
+        assert stats['text_cache_count'] == 1
+        assert stats['image_cache_count'] == 1
+        assert stats['total_cached_items'] == 2
+
+        assert cache.clear() == 2
+        assert cache.get_stats()['total_cached_items'] == 0
+
+    def test_sqlite_corrupted_entry_handling(self, temp_cache_dir):
+        """Test that an undecodable entry is treated as a miss."""
+        cache = OpenAICache(cache_dir=temp_cache_dir, backend="sqlite")
+        cache_key = cache._generate_cache_key({"model": "gpt-4"})
+        cache.backend.write("text", cache_key, b"corrupted json data {{{")
+
+        assert cache.get({"model": "gpt-4"}, cache_type="text") is None
+
+    def test_custom_backend_instance(self, temp_cache_dir):
+        """Test that a CacheBackend instance can be passed directly."""
+        backend = SQLiteBackend(Path(temp_cache_dir) / "custom.db")
+        cache = OpenAICache(cache_dir=temp_cache_dir, backend=backend)
+
+        cache.set({"model": "gpt-4"}, {"result": "ok"})
+
+        assert cache.backend is backend
+        assert backend.stats()['text_cache_count'] == 1
+
+    def test_unknown_backend_raises_error(self, temp_cache_dir):
+        """Test that an unknown backend name raises ValueError."""
+        with pytest.raises(ValueError, match="Unsupported cache backend"):
+            OpenAICache(cache_dir=temp_cache_dir, backend="redis")
+
+    def test_base_backend_is_abstract(self):
+        """Test that the interface methods must be implemented."""
+        with pytest.raises(NotImplementedError):
+            CacheBackend().read("text", "key")
@@ -3,11 +3,16 @@ Tests for the cached_openai_request function.
 """
 
 import pytest
-from unittest.mock import Mock, MagicMock, patch
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import Mock, MagicMock, AsyncMock, patch
 import tempfile
 import shutil
 
-from utils import OpenAICache, cached_openai_request
+from utils import OpenAICache, cached_openai_request, async_cached_openai_request
 
 
 class TestCachedOpenAIRequest:
@@ -339,3 +344,291 @@ class TestCachedOpenAIRequest:
         # Verify both results are identical
         assert result1 == result2
         assert result2["choices"][0]["message"]["content"] == "Persistent response"
+
+
+class TestAsyncCachedOpenAIRequest:
+    """Test suite for async_cached_openai_request function."""
+
+    @pytest.fixture
+    def temp_cache_dir(self):
+        """Create a temporary cache directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield temp_dir
+        shutil.rmtree(temp_dir)
+
+    @pytest.fixture
+    def cache(self, temp_cache_dir):
+        """Create an OpenAICache instance with temporary directory."""
+        return OpenAICache(cache_dir=temp_cache_dir)
+
+    @pytest.fixture
+    def mock_async_client(self):
+        """Create a mock AsyncOpenAI client."""
+        client = Mock()
+        client.chat.completions.create = AsyncMock()
+        client.images.generate = AsyncMock()
+        return client
+
+    @pytest.fixture
+    def mock_openai_client_factory(self):
+        """Build a sync mock client whose image responses carry a given URL."""
+        def factory(url):
+            client = Mock()
+            mock_response = Mock()
+            mock_response.model_dump.return_value = {"data": [{"url": url}]}
+            client.images.generate.return_value = mock_response
+            return client
+        return factory
+
+    def test_async_chat_request_cache_miss(self, mock_async_client, cache):
+        """Test async chat request awaits the client and caches the result."""
+        mock_response = Mock()
+        mock_response.model_dump.return_value = {
+            "choices": [{"message": {"content": "Async hello"}}]
+        }
+        mock_async_client.chat.completions.create.return_value = mock_response
+
+        result = asyncio.run(async_cached_openai_request(
+            client=mock_async_client,
+            cache=cache,
+            request_type="chat",
+            model="gpt-4",
+            messages=[{"role": "user", "content": "Hi"}]
+        ))
+
+        mock_async_client.chat.completions.create.assert_awaited_once_with(
+            model="gpt-4",
+            messages=[{"role": "user", "content": "Hi"}]
+        )
+        assert result["choices"][0]["message"]["content"] == "Async hello"
+        assert cache.get_stats()['text_cache_count'] == 1
+
+    def test_async_shares_cache_with_sync(self, mock_openai_client_factory, mock_async_client, cache):
+        """Test that a response cached by the sync path is a hit for the async path."""
+        sync_client = mock_openai_client_factory("Shared response")
+        cached_openai_request(
+            client=sync_client,
+            cache=cache,
+            request_type="image",
+            prompt="A cat",
+            size="512x512"
+        )
+
+        result = asyncio.run(async_cached_openai_request(
+            client=mock_async_client,
+            cache=cache,
+            request_type="image",
+            prompt="A cat",
+            size="512x512"
+        ))
+
+        mock_async_client.images.generate.assert_not_awaited()
+        assert result == {"data": [{"url": "Shared response"}]}
+
+    def test_async_many_concurrent_requests(self, mock_async_client, cache):
+        """Test that many requests can be in flight on one event loop."""
+        in_flight = {'current': 0, 'max': 0}
+
+        async def create(**kwargs):
+            in_flight['current'] += 1
+            in_flight['max'] = max(in_flight['max'], in_flight['current'])
+            await asyncio.sleep(0.01)
+            in_flight['current'] -= 1
+            response = Mock()
+            response.model_dump.return_value = {
+                "choices": [{"message": {"content": kwargs['messages'][0]['content']}}]
+            }
+            return response
+
+        mock_async_client.chat.completions.create.side_effect = create
+
+        async def run_all():
+            return await asyncio.gather(*(
+                async_cached_openai_request(
+                    client=mock_async_client,
+                    cache=cache,
+                    request_type="chat",
+                    model="gpt-4",
+                    messages=[{"role": "user", "content": f"question {n}"}]
+                )
+                for n in range(200)
+            ))
+
+        results = asyncio.run(run_all())
+
+        assert in_flight['max'] == 200
+        assert [r["choices"][0]["message"]["content"] for r in results] == [
+            f"question {n}" for n in range(200)
+        ]
+
+    def test_async_unsupported_request_type_raises_error(self, mock_async_client, cache):
+        """Test that unsupported request type raises ValueError."""
+        with pytest.raises(ValueError, match="Unsupported request type"):
+            asyncio.run(async_cached_openai_request(
+                client=mock_async_client,
+                cache=cache,
+                request_type="unsupported",
+                some_param="value"
+            ))
+
+
+class TestSingleFlight:
+    """Test suite for coalescing concurrent identical requests."""
+
+    @pytest.fixture
+    def temp_cache_dir(self):
+        """Create a temporary cache directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield temp_dir
+        shutil.rmtree(temp_dir)
+
+    @pytest.fixture
+    def cache(self, temp_cache_dir):
+        """Create an OpenAICache instance with temporary directory."""
+        return OpenAICache(cache_dir=temp_cache_dir)
+
+    @pytest.fixture
+    def slow_client(self):
+        """Mock client whose chat calls take long enough to overlap."""
+        def create(**kwargs):
+            time.sleep(0.1)
+            response = Mock()
+            response.model_dump.return_value = {
+                "choices": [{"message": {"content": "Slow response"}}]
+            }
+            return response
+
+        client = Mock()
+        client.chat.completions.create.side_effect = create
+        return client
+
+    def _run_concurrently(self, fn, count):
+        """Call fn from count threads at once and return results in order."""
+        barrier = threading.Barrier(count)
+
+        def worker(_):
+            barrier.wait()
+            return fn()
+
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            return list(executor.map(worker, range(count)))
+
+    def test_concurrent_identical_requests_coalesced(self, slow_client, cache):
+        """Test that identical concurrent requests make one API call."""
+        results = self._run_concurrently(
+            lambda: cached_openai_request(
+                client=slow_client,
+                cache=cache,
+                request_type="chat",
+                model="gpt-4",
+                messages=[{"role": "user", "content": "Same question"}]
+            ),
+            8
+        )
+
+        assert slow_client.chat.completions.create.call_count == 1
+        assert all(r == results[0] for r in results)
+        assert results[0]["choices"][0]["message"]["content"] == "Slow response"
+
+    def test_concurrent_different_requests_not_coalesced(self, slow_client, cache):
+        """Test that different params are not coalesced."""
+        counter = iter(range(100))
+
+        self._run_concurrently(
+            lambda: cached_openai_request(
+                client=slow_client,
+                cache=cache,
+                request_type="chat",
+                model="gpt-4",
+                messages=[{"role": "user", "content": f"Question {next(counter)}"}]
+            ),
+            4
+        )
+
+        assert slow_client.chat.completions.create.call_count == 4
+
+    def test_leader_error_shared_then_retried(self, cache):
+        """Test that followers see the leader's error and a later call retries."""
+        client = Mock()
+
+        def failing_create(**kwargs):
+            time.sleep(0.1)
+            raise RuntimeError("API down")
+
+        client.chat.completions.create.side_effect = failing_create
+
+        def call():
+            try:
+                cached_openai_request(
+                    client=client,
+                    cache=cache,
+                    request_type="chat",
+                    model="gpt-4",
+                    messages=[{"role": "user", "content": "Hi"}]
+                )
+            except RuntimeError as e:
+                return str(e)
+
+        results = self._run_concurrently(call, 4)
+
+        assert results == ["API down"] * 4
+        assert client.chat.completions.create.call_count == 1
+
+        # The failed key is no longer in flight, so the next call retries
+        assert call() == "API down"
+        assert client.chat.completions.create.call_count == 2
+
+    def test_process_lock_coalesces_across_cache_instances(self, slow_client, temp_cache_dir):
+        """Test that the file lock coalesces callers with separate in-process state."""
+        caches = [OpenAICache(cache_dir=temp_cache_dir, process_lock=True) for _ in range(4)]
+        instance = iter(caches)
+
+        results = self._run_concurrently(
+            lambda: cached_openai_request(
+                client=slow_client,
+                cache=next(instance),
+                request_type="chat",
+                model="gpt-4",
+                messages=[{"role": "user", "content": "Shared across processes"}]
+            ),
+            4
+        )
+
+        assert slow_client.chat.completions.create.call_count == 1
+        assert all(r == results[0] for r in results)
+        # The last holder deletes the key's lock file
+        assert list((Path(temp_cache_dir) / "locks").iterdir()) == []
+
+        stale = Path(temp_cache_dir) / "locks" / "text-stale.lock"
+        stale.touch()
+        caches[0].clear()
+        assert not stale.exists()
+
+    def test_async_identical_requests_coalesced(self, cache):
+        """Test that identical requests on one event loop make one API call."""
+        client = Mock()
+
+        async def create(**kwargs):
+            await asyncio.sleep(0.05)
+            response = Mock()
+            response.model_dump.return_value = {"data": [{"url": "https://example.com/one.png"}]}
+            return response
+
+        client.images.generate = AsyncMock(side_effect=create)
+
+        async def run_all():
+            return await asyncio.gather(*(
+                async_cached_openai_request(
+                    client=client,
+                    cache=cache,
+                    request_type="image",
+                    prompt="Duplicate thumbnail",
+                    size="1024x1024"
+                )
+                for _ in range(20)
+            ))
+
+        results = asyncio.run(run_all())
+
+        assert client.images.generate.await_count == 1
+        assert all(r == {"data": [{"url": "https://example.com/one.png"}]} for r in results)
@@ -0,0 +1,74 @@
+"""
+Tests for the stage checkpoint store.
+"""
+
+import pytest
+import io
+import tempfile
+import shutil
+
+from checkpoints import CheckpointStore
+from structured_logging import logging_configured
+
+FP_A = "a" * 64
+FP_B = "b" * 64
+
+
+class TestCheckpointStore:
+    """Test suite for CheckpointStore."""
+
+    @pytest.fixture
+    def temp_cache_dir(self):
+        """Create a temporary cache directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield temp_dir
+        shutil.rmtree(temp_dir)
+
+    def test_round_trip(self, temp_cache_dir):
+        """Test saving and loading a result, including None."""
+        store = CheckpointStore(temp_cache_dir)
+
+        assert store.load("flow", "summary", FP_A) == (False, None)
+        store.save("flow", "summary", FP_A, {"text": "hello", "items": [1, 2]})
+        store.save("flow", "empty", FP_A, None)
+
+        assert store.load("flow", "summary", FP_A) == (True, {"text": "hello", "items": [1, 2]})
+        assert store.load("flow", "empty", FP_A) == (True, None)
+        assert store.load("other", "summary", FP_A) == (False, None)
+
+    def test_new_fingerprint_replaces_old(self, temp_cache_dir):
+        """Test that only the latest fingerprint of a stage is kept."""
+        store = CheckpointStore(temp_cache_dir)
+        store.save("flow", "image", FP_A, 1)
+        store.save("flow", "image_prompts", FP_A, 2)
+
+        store.save("flow", "image", FP_B, 3)
+
+        assert store.load("flow", "image", FP_A) == (False, None)
+        assert store.load("flow", "image", FP_B) == (True, 3)
+        assert store.load("flow", "image_prompts", FP_A) == (True, 2)
+        assert not list(store.path("flow", "image", FP_B).parent.glob(".tmp-*"))
+
+    def test_corrupt_checkpoint_is_a_miss(self, temp_cache_dir):
+        """Test that a truncated checkpoint is treated as missing, with a warning."""
+        store = CheckpointStore(temp_cache_dir)
+        store.save("flow", "summary", FP_A, "x" * 100)
+        path = store.path("flow", "summary", FP_A)
+        path.write_bytes(path.read_bytes()[:10])
+
+        stream = io.StringIO()
+        with logging_configured(stream=stream):
+            assert store.load("flow", "summary", FP_A) == (False, None)
+        assert "WARNING arcade.checkpoints checkpoint_unreadable stage=summary" in stream.getvalue()
+
+    def test_clear(self, temp_cache_dir):
+        """Test clearing one namespace or all of them."""
+        store = CheckpointStore(temp_cache_dir)
+        store.save("one", "a", FP_A, 1)
+        store.save("one", "b", FP_A, 2)
+        store.save("two", "a", FP_A, 3)
+
+        assert store.clear("one") == 2
+        assert store.load("two", "a", FP_A) == (True, 3)
+        assert store.clear() == 1
+        assert store.clear("missing") == 0
@@ -0,0 +1,168 @@
+"""
+Tests for the pooled streaming downloader.
+"""
+
+import pytest
+import os
+import threading
+import tempfile
+import shutil
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from downloader import Downloader, DownloadError
+from utils import download_image
+
+
+class FakeAssetServer:
+    """Local server serving byte payloads, with scripted failures per path."""
+
+    def __init__(self):
+        self.payloads = {}
+        self.failures = {}
+        self.requests = []
+        self.connections = set()
+        self.lock = threading.Lock()
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with fake.lock:
+                    fake.requests.append(self.path)
+                    fake.connections.add(self.client_address)
+                    failures = fake.failures.get(self.path, [])
+                    failure = failures.pop(0) if failures else None
+
+                body = fake.payloads.get(self.path)
+                if body is None or isinstance(failure, int):
+                    status = failure or 404
+                    self.send_response(status)
+                    self.send_header('Content-Length', '0')
+                    if status == 429:
+                        self.send_header('Retry-After', '0')
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/png')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if failure == 'truncate':
+                    self.wfile.write(body[:len(body) // 2])
+                    self.close_connection = True
+                else:
+                    self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server.server_address[1]}{path}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestDownloader:
+    """Test suite for Downloader."""
+
+    @pytest.fixture
+    def temp_dir(self):
+        """Create a temporary directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield Path(temp_dir)
+        shutil.rmtree(temp_dir)
+
+    @pytest.fixture
+    def server(self):
+        """Start a local asset server."""
+        with FakeAssetServer() as server:
+            yield server
+
+    def test_download_reuses_connection(self, temp_dir, server):
+        """Test streamed downloads over one keep-alive connection."""
+        server.payloads['/a.png'] = b'\x89PNG' + bytes(range(256)) * 1000
+        server.payloads['/b.png'] = b'\x89PNG small'
+        downloader = Downloader(backoff=0)
+
+        assert downloader.download(server.url('/a.png'), str(temp_dir / "a.png")) == 256004
+        assert downloader.download(server.url('/b.png'), str(temp_dir / "b.png")) == 10
+
+        assert (temp_dir / "a.png").read_bytes() == server.payloads['/a.png']
+        assert (temp_dir / "b.png").read_bytes() == server.payloads['/b.png']
+        assert len(server.connections) == 1
+        downloader.close()
+
+    def test_retries_transient_failures(self, temp_dir, server):
+        """Test that 5xx, 429 and truncated bodies are retried."""
+        server.payloads['/img.png'] = b'x' * 5000
+        server.failures['/img.png'] = [503, 'truncate', 429]
+        downloader = Downloader(backoff=0)
+
+        downloader.download(server.url('/img.png'), str(temp_dir / "img.png"))
+
+        assert server.requests == ['/img.png'] * 4
+        assert (temp_dir / "img.png").read_bytes() == b'x' * 5000
+
+    def test_failure_leaves_no_partial_file(self, temp_dir, server):
+        """Test that a download that keeps failing neither writes nor replaces the file."""
+        server.payloads['/img.png'] = b'x' * 5000
+        server.failures['/img.png'] = ['truncate'] * 3
+        (temp_dir / "img.png").write_bytes(b'previous')
+        downloader = Downloader(max_retries=2, backoff=0)
+
+        with pytest.raises(DownloadError, match="after 3 attempts"):
+            downloader.download(server.url('/img.png'), str(temp_dir / "img.png"))
+
+        assert (temp_dir / "img.png").read_bytes() == b'previous'
+        assert [p.name for p in temp_dir.iterdir()] == ["img.png"]
+
+    def test_permissions_and_retry_after_cap(self, temp_dir, server):
+        """Test that downloads get umask permissions, and Retry-After is capped."""
+        server.payloads['/img.png'] = b'x' * 10
+        downloader = Downloader(max_retry_after=5)
+
+        downloader.download(server.url('/img.png'), str(temp_dir / "img.png"))
+        umask = os.umask(0)
+        os.umask(umask)
+        assert (temp_dir / "img.png").stat().st_mode & 0o777 == 0o666 & ~umask
+
+        class Throttled:
+            headers = {'Retry-After': '86400'}
+        assert downloader._retry_delay(0, Throttled()) == 5
+
+    def test_client_errors_are_not_retried(self, temp_dir, server):
+        """Test that a 404 fails immediately."""
+        downloader = Downloader(backoff=0)
+
+        with pytest.raises(DownloadError, match="404"):
+            downloader.download(server.url('/missing.png'), str(temp_dir / "missing.png"))
+
+        assert server.requests == ['/missing.png']
+        assert download_image(server.url('/missing.png'), str(temp_dir / "missing.png")) is False
+
+    def test_download_many(self, temp_dir, server):
+        """Test concurrent downloads with one failure isolated."""
+        for i in range(10):
+            server.payloads[f'/{i}.png'] = f'image {i}'.encode()
+        items = [(server.url(f'/{i}.png'), str(temp_dir / f"{i}.png")) for i in range(10)]
+        items.append((server.url('/missing.png'), str(temp_dir / "missing.png")))
+        downloader = Downloader(max_workers=4, backoff=0)
+
+        results = downloader.download_many(items)
+
+        assert [path for path, error in results.items() if error is not None] == [str(temp_dir / "missing.png")]
+        for i in range(10):
+            assert (temp_dir / f"{i}.png").read_text() == f'image {i}'
+        assert len(server.connections) <= 4
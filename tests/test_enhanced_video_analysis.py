@@ -0,0 +1,149 @@
+"""
+Tests for the enhanced video analysis functions.
+"""
+
+import pytest
+import asyncio
+import threading
+import time
+from unittest.mock import Mock
+import tempfile
+import shutil
+
+from utils import OpenAICache
+from flow_model import parse_steps
+from enhanced_video_analysis import (
+    create_enriched_flow_description,
+    create_enriched_flow_description_async,
+    describe_video_steps,
+)
+
+
+def make_video_step(start_frac, end_frac, thumbnail):
+    """Build a minimal VIDEO step."""
+    return {
+        'type': 'VIDEO',
+        'startTimeFrac': start_frac,
+        'endTimeFrac': end_frac,
+        'duration': 10.0,
+        'videoThumbnailUrl': thumbnail
+    }
+
+
+class TestCreateEnrichedFlowDescription:
+    """Test suite for create_enriched_flow_description."""
+
+    @pytest.fixture
+    def temp_cache_dir(self):
+        """Create a temporary cache directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield temp_dir
+        shutil.rmtree(temp_dir)
+
+    @pytest.fixture
+    def cache(self, temp_cache_dir):
+        """Create an OpenAICache instance with temporary directory."""
+        return OpenAICache(cache_dir=temp_cache_dir)
+
+    @pytest.fixture
+    def steps(self):
+        """A flow alternating IMAGE and VIDEO steps."""
+        steps = [{'type': 'CHAPTER', 'title': 'Intro', 'subtitle': 'Start'}]
+        for n in range(6):
+            steps.append({
+                'type': 'IMAGE',
+                'clickContext': {'text': f'button {n}', 'elementType': 'button'},
+                'pageContext': {'url': f'https://example.com/{n}', 'title': f'Page {n}'}
+            })
+            steps.append(make_video_step(n / 6, (n + 1) / 6, f'https://example.com/thumb-{n}.png'))
+        return parse_steps(steps)
+
+    @pytest.fixture
+    def slow_client(self):
+        """Mock client that answers with the thumbnail URL after a varying delay."""
+        state = {'in_flight': 0, 'max_in_flight': 0}
+        lock = threading.Lock()
+
+        def create(**kwargs):
+            thumbnail = kwargs['messages'][1]['content'][1]['image_url']['url']
+            with lock:
+                state['in_flight'] += 1
+                state['max_in_flight'] = max(state['max_in_flight'], state['in_flight'])
+            # Later steps finish first so completion order differs from step order
+            time.sleep(0.05 - 0.007 * int(thumbnail.rsplit('-', 1)[1].split('.')[0]))
+            with lock:
+                state['in_flight'] -= 1
+            response = Mock()
+            response.model_dump.return_value = {
+                "choices": [{"message": {"content": f"Watched {thumbnail}"}}]
+            }
+            return response
+
+        client = Mock()
+        client.chat.completions.create.side_effect = create
+        client.state = state
+        return client
+
+    def test_parallel_output_matches_step_order(self, slow_client, cache, steps):
+        """Test that concurrent analysis reassembles results in step order."""
+        enriched = create_enriched_flow_description(slow_client, cache, steps, [], max_workers=6)
+
+        videos = [s for s in enriched if s['type'] == 'video']
+        assert [v['action'] for v in videos] == [
+            f"Watched https://example.com/thumb-{n}.png" for n in range(6)
+        ]
+        assert [s['type'] for s in enriched] == [s.type.lower() for s in steps]
+        assert slow_client.state['max_in_flight'] > 1
+
+    def test_parallel_matches_sequential(self, slow_client, cache, steps, temp_cache_dir):
+        """Test that parallel and sequential modes produce identical output."""
+        parallel = create_enriched_flow_description(slow_client, cache, steps, [], max_workers=3)
+        sequential = create_enriched_flow_description(
+            slow_client, OpenAICache(cache_dir=temp_cache_dir + "/seq"), steps, [], max_workers=1
+        )
+
+        assert parallel == sequential
+
+    def test_concurrency_limit_respected(self, slow_client, cache, steps):
+        """Test that no more than max_workers requests are in flight."""
+        create_enriched_flow_description(slow_client, cache, steps, [], max_workers=2)
+
+        assert slow_client.state['max_in_flight'] <= 2
+
+    def test_sequential_mode_single_request_at_a_time(self, slow_client, cache, steps):
+        """Test that max_workers=1 analyzes videos one at a time."""
+        create_enriched_flow_description(slow_client, cache, steps, [], max_workers=1)
+
+        assert slow_client.state['max_in_flight'] == 1
+        assert slow_client.chat.completions.create.call_count == 6
+
+    def test_async_output_matches_sync(self, slow_client, cache, steps, temp_cache_dir):
+        """Test that the async fan-out produces the same enriched steps."""
+        async_client = Mock()
+
+        async def create(**kwargs):
+            await asyncio.sleep(0.001)
+            return slow_client.chat.completions.create(**kwargs)
+
+        async_client.chat.completions.create.side_effect = create
+
+        expected = create_enriched_flow_description(
+            slow_client, OpenAICache(cache_dir=temp_cache_dir + "/sync"), steps, [], max_workers=1
+        )
+        result = asyncio.run(create_enriched_flow_description_async(
+            async_client, cache, steps, [], max_concurrency=3
+        ))
+
+        assert result == expected
+
+    def test_thumbnail_substitution(self, steps):
+        """Test that mapped thumbnails are sent in place of their URLs, in step order."""
+        async def request(**params):
+            await asyncio.sleep(0.001)
+            return {"choices": [{"message": {"content": params['messages'][1]['content'][1]['image_url']['url']}}]}
+
+        thumbnails = {'https://example.com/thumb-1.png': 'blob:image/png;sha256,' + '1' * 64}
+        descriptions = asyncio.run(describe_video_steps(request, steps, [], max_concurrency=2, thumbnails=thumbnails))
+
+        assert descriptions[1] == thumbnails['https://example.com/thumb-1.png']
+        assert descriptions[0] == 'https://example.com/thumb-0.png' and len(descriptions) == 6
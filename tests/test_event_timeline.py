@@ -0,0 +1,113 @@
+"""
+Tests for the captured-event timeline.
+"""
+
+import pytest
+import json
+import random
+from pathlib import Path
+
+from event_timeline import EventTimeline, FlowTimeline, video_origins_ms
+from flow_model import Event, Flow, ImageStep, VideoStep, parse_event
+
+ORIGIN = 1756746383177
+
+
+def click(step_id, seconds):
+    """A click event at a time relative to ORIGIN."""
+    return parse_event({'type': 'click', 'clickId': step_id, 'timeMs': ORIGIN + int(seconds * 1000)})
+
+
+def span(event_type, start, end):
+    """A range event between two times relative to ORIGIN."""
+    return parse_event({'type': event_type, 'startTimeMs': ORIGIN + int(start * 1000),
+                        'endTimeMs': ORIGIN + int(end * 1000)})
+
+
+def video(start, end, duration=30.0, asset='rec'):
+    """A VIDEO step covering [start, end] seconds of a recording."""
+    return VideoStep(asset_id=asset, duration=duration, start_time_frac=start / duration,
+                     end_time_frac=end / duration)
+
+
+class TestEventTimeline:
+    """Test suite for EventTimeline."""
+
+    def test_untimed_events_dropped(self):
+        """Test that events without a time are left out of the timeline."""
+        timeline = EventTimeline([Event('other'), parse_event({'type': 'click', 'timeMs': 5})])
+
+        assert len(timeline) == 1
+        assert [e.type for e in timeline.overlapping(0, 1)] == ['click']
+
+    def test_range_events_overlap(self):
+        """Test that range events count when they overlap, not only when they start inside."""
+        events = [span('scrolling', 1, 8), click('a', 4), span('typing', 9, 9.5), click('b', 12)]
+        timeline = EventTimeline(events, ORIGIN)
+
+        assert timeline.overlapping(5, 7) == [events[0]]
+        assert timeline.overlapping(3, 4) == [events[0], events[1]]
+        assert timeline.overlapping(8, 9) == [events[0], events[2]]
+        assert timeline.overlapping(10, 11) == []
+        assert timeline.overlapping(0, 100) == events
+        assert len(timeline) == 4
+
+    def test_matches_linear_scan(self):
+        """Test random queries against a brute-force overlap scan."""
+        rng = random.Random(7)
+        events = []
+        for _ in range(500):
+            start = rng.uniform(0, 1000)
+            if rng.random() < 0.5:
+                events.append(Event('click', start, start))
+            else:
+                events.append(Event('scrolling', start, start + rng.expovariate(1 / 20)))
+        timeline = EventTimeline(events)
+
+        for _ in range(200):
+            start = rng.uniform(-10, 1000)
+            end = start + rng.uniform(0, 50)
+            expected = [e for e in events if e.start_ms <= end and e.end_ms >= start]
+            found = timeline.overlapping(start / 1000, end / 1000)
+            assert sorted(map(id, found)) == sorted(map(id, expected))
+
+
+class TestFlowTimeline:
+    """Test suite for FlowTimeline."""
+
+    def test_origin_from_bracketing_clicks(self):
+        """Test that VIDEO segments are aligned to epoch event times via the clicks around them."""
+        steps = [
+            ImageStep(id='a'), video(0.1, 9.6),
+            ImageStep(id='b'), video(9.6, 12.8),
+            ImageStep(id='c'),
+        ]
+        events = [click('a', 0.1), span('typing', 0.7, 1.7), span('scrolling', 3, 8.8),
+                  click('b', 9.6), span('scrolling', 9.9, 11.4), click('c', 12.8)]
+
+        assert video_origins_ms(steps, events) == {'rec': pytest.approx(ORIGIN, abs=1)}
+
+        timeline = FlowTimeline(steps, events)
+        assert [e.type for e in timeline.events_for(steps[1])] == ['click', 'typing', 'scrolling', 'click']
+        assert [e.type for e in timeline.events_for(steps[3])] == ['click', 'scrolling', 'click']
+
+    def test_relative_times_and_no_events(self):
+        """Test flows whose event times are already relative, or that have none."""
+        steps = [video(2, 4)]
+
+        timeline = FlowTimeline(steps, [Event('click', 3000, 3000), Event('click', 5000, 5000)])
+        assert [e.start_ms for e in timeline.events_for(steps[0])] == [3000]
+        assert FlowTimeline(steps, []).events_for(steps[0]) == []
+
+    def test_sample_flow(self):
+        """Test the bundled flow: each VIDEO step gets the events recorded during it."""
+        flow = Flow.from_dict(json.loads((Path(__file__).parent.parent / "flow.json").read_text()))
+        timeline = FlowTimeline(flow.steps, flow.events)
+
+        event_types = [[e.type for e in timeline.events_for(step)] for step in flow.steps if step.type == 'VIDEO']
+
+        assert event_types == [
+            ['click', 'typing', 'scrolling', 'click'],
+            ['click', 'scrolling', 'click'],
+            ['click', 'dragging'],
+        ]
@@ -0,0 +1,63 @@
+"""
+Tests for extracting JSON from model responses.
+"""
+
+import pytest
+import json
+import time
+
+from utils import extract_json_from_response
+
+ANSWER = {"selected_image": 2, "reasoning": "Braces in strings: } { \" are fine", "scores": {"image_1": 8}}
+
+
+class TestExtractJsonFromResponse:
+    """Test suite for extract_json_from_response."""
+
+    def test_plain_and_fenced(self):
+        """Test a bare JSON response and one wrapped in a markdown code block."""
+        assert extract_json_from_response(json.dumps(ANSWER)) == ANSWER
+        assert extract_json_from_response(f"Here you go:\n```json\n{json.dumps(ANSWER)}\n```\nDone.") == ANSWER
+
+    def test_embedded_in_prose(self):
+        """Test an object surrounded by prose that contains braces and quotes of its own."""
+        content = f'I looked at {{the images}} and "thought" about it.\n{json.dumps(ANSWER)}\nHope this helps {{'
+
+        assert extract_json_from_response(content) == ANSWER
+
+    def test_longest_object_wins(self):
+        """Test that the largest embedded object is returned, the earliest on ties."""
+        content = f'For example {{"a": 1}} or {{"b": 2}}. Answer: {json.dumps(ANSWER)} (not {{"c": 3}})'
+        assert extract_json_from_response(content) == ANSWER
+
+        assert extract_json_from_response('First {"a": 1} then {"b": 2}') == {"a": 1}
+
+    def test_objects_longer_than_the_decode_window(self):
+        """Test objects whose strings and numbers straddle the initial decode window."""
+        for padding in range(240, 280, 3):
+            answer = {"reasoning": "x" * padding, "n": 12345678901234567890, "ok": True}
+            content = f"Result: {json.dumps(answer)} trailing {{text}}"
+
+            assert extract_json_from_response(content) == answer
+
+    @pytest.mark.parametrize("content", [
+        "No JSON here.",
+        "Unbalanced {\"a\": 1",
+        "{not json}",
+        '{"a": ' * 5000,
+        "[" * 5000,
+    ])
+    def test_no_json(self, content):
+        """Test that responses without a decodable object raise JSONDecodeError."""
+        with pytest.raises(json.JSONDecodeError):
+            extract_json_from_response(content)
+
+    def test_adversarial_input_is_linear(self):
+        """Test inputs that made the greedy-regex fallback quadratic."""
+        for content in ("{" * 200_000, '{"a' * 100_000, "{x" * 100_000 + json.dumps(ANSWER)):
+            start = time.perf_counter()
+            try:
+                extract_json_from_response(content)
+            except json.JSONDecodeError:
+                pass
+            assert time.perf_counter() - start < 2
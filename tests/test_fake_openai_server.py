@@ -0,0 +1,152 @@
+"""
+Tests for the offline fake OpenAI server.
+"""
+
+import pytest
+import json
+import random
+import time
+import tempfile
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import openai
+from openai import OpenAI
+
+import generate_report
+from batch_report import run_batch
+from fake_openai_server import FakeOpenAIServer, parse_latency
+from rate_limit import RateLimiter, RateLimitedClient
+
+FLOW_PATH = Path(__file__).parent.parent / "flow.json"
+
+
+def chat(client, text="Describe the step.", **params):
+    return client.chat.completions.create(model="gpt-4o", messages=[{"role": "user", "content": text}], **params)
+
+
+class TestParseLatency:
+    """Test suite for parse_latency."""
+
+    def test_distributions(self):
+        """Test each supported distribution, in seconds."""
+        rng = random.Random(0)
+
+        assert parse_latency("fixed:250")(rng) == 0.25
+        assert all(0.1 <= parse_latency("uniform:100,200")(rng) <= 0.2 for _ in range(100))
+        draws = sorted(parse_latency("lognormal:100,0.5")(rng) for _ in range(2001))
+        assert draws[1000] == pytest.approx(0.1, rel=0.1)
+        assert parse_latency("exponential:0")(rng) == 0.0
+
+    @pytest.mark.parametrize("spec", ["", "fixed", "fixed:a", "uniform:1", "gamma:1,2"])
+    def test_invalid(self, spec):
+        """Test that malformed specs raise ValueError."""
+        with pytest.raises(ValueError):
+            parse_latency(spec)
+
+
+class TestFakeOpenAIServer:
+    """Test suite for FakeOpenAIServer, driven through the OpenAI SDK."""
+
+    @pytest.fixture
+    def temp_cache_dir(self):
+        """Create a temporary cache directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield temp_dir
+        shutil.rmtree(temp_dir)
+
+    def test_chat_and_images(self):
+        """Test completions with usage, the pipeline's JSON answers and served images."""
+        with FakeOpenAIServer(seed=0) as server:
+            client = OpenAI(api_key="test", base_url=server.base_url, max_retries=0)
+
+            response = chat(client, max_tokens=50)
+            assert response.choices[0].message.content
+            assert response.usage.total_tokens == response.usage.prompt_tokens + response.usage.completion_tokens
+
+            request = generate_report.build_prompt_variations_request("Demo", "A summary")
+            del request['request_type']
+            prompts = generate_report.parse_prompt_variations(client.chat.completions.create(**request).model_dump())
+            assert len(prompts) == 3
+
+            image = client.images.generate(model="dall-e-3", prompt="A scooter", n=1)
+            assert generate_report.download_image(image.data[0].url, str(Path(tempfile.gettempdir()) / "fake.png"))
+
+        assert server.stats() == {'responses': {'200': 3}, 'max_in_flight': 1, 'images': 1}
+
+    def test_rate_limits(self):
+        """Test x-ratelimit-* headers and 429s with retry hints once a budget is spent."""
+        with FakeOpenAIServer(requests_per_minute=2, tokens_per_minute=10_000) as server:
+            client = OpenAI(api_key="test", base_url=server.base_url, max_retries=0)
+
+            raw = client.chat.completions.with_raw_response.create(
+                model="gpt-4o", messages=[{"role": "user", "content": "hi"}], max_tokens=100
+            )
+            assert raw.headers['x-ratelimit-limit-requests'] == '2'
+            assert raw.headers['x-ratelimit-remaining-requests'] == '1'
+            assert int(raw.headers['x-ratelimit-remaining-tokens']) < 10_000 - 100
+
+            chat(client)
+            with pytest.raises(openai.RateLimitError) as error:
+                chat(client)
+            assert int(error.value.response.headers['retry-after-ms']) > 0
+
+            with pytest.raises(openai.RateLimitError):
+                chat(client, max_tokens=20_000)
+
+    def test_errors_and_latency(self):
+        """Test injected 500s and response delays."""
+        with FakeOpenAIServer(error_rate=1.0) as server:
+            client = OpenAI(api_key="test", base_url=server.base_url, max_retries=0)
+            with pytest.raises(openai.InternalServerError):
+                chat(client)
+
+        with FakeOpenAIServer(latency="fixed:100") as server:
+            client = OpenAI(api_key="test", base_url=server.base_url, max_retries=0)
+            start = time.perf_counter()
+            chat(client)
+            assert time.perf_counter() - start >= 0.1
+
+    def test_concurrency(self):
+        """Test that concurrent requests overlap and the peak is recorded."""
+        with FakeOpenAIServer(latency="fixed:200") as server:
+            client = OpenAI(api_key="test", base_url=server.base_url, max_retries=0)
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                list(executor.map(lambda _: chat(client), range(4)))
+
+        assert server.stats()['max_in_flight'] == 4
+
+    def test_rate_limiter_against_server(self):
+        """Test that RateLimiter adopts the server's budget from its headers and paces to it."""
+        with FakeOpenAIServer(tokens_per_minute=600) as server:
+            limiter = RateLimiter(limits={})
+            client = RateLimitedClient(OpenAI(api_key="test", base_url=server.base_url, max_retries=0), limiter)
+
+            start = time.perf_counter()
+            for _ in range(2):
+                chat(client, "hi", max_tokens=300)
+
+            # The second request needs ~300 tokens the 10 tokens/s budget only has after ~1s
+            assert time.perf_counter() - start >= 0.5
+            assert server.stats()['responses']['200'] == 2
+            assert limiter._models['gpt-4o'].tokens.capacity == 600
+
+    def test_batch_report_end_to_end(self, temp_cache_dir, monkeypatch):
+        """Test a whole batch run against the server, with no network."""
+        monkeypatch.setattr(generate_report, 'load_api_key', lambda: "test")
+        flows = Path(temp_cache_dir) / "flows"
+        flows.mkdir()
+        shutil.copy(FLOW_PATH, flows / "demo.json")
+
+        with FakeOpenAIServer(latency="uniform:5,20", seed=0) as server:
+            summary = run_batch(
+                str(flows), output_root=str(Path(temp_cache_dir) / "reports"), workers=1,
+                cache_dir=str(Path(temp_cache_dir) / "cache"), prefetch_assets=False, base_url=server.base_url
+            )
+
+        assert summary['succeeded'] == 1
+        report = (Path(temp_cache_dir) / "reports" / "demo" / "REPORT.md").read_text()
+        assert json.loads(FLOW_PATH.read_text())['name'] in report
+        # Three VIDEO steps, interactions, summary, prompts and selection; three images
+        assert server.stats()['responses'] == {'200': 10}
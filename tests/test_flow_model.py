@@ -0,0 +1,103 @@
+"""
+Tests for the typed flow model.
+"""
+
+import pytest
+import copy
+import json
+import sys
+from pathlib import Path
+
+from flow_model import (
+    ChapterStep, Click, Event, Flow, ImageStep, OtherStep, VideoStep, parse_event, parse_step
+)
+
+FLOW_PATH = Path(__file__).parent.parent / "flow.json"
+
+
+def deep_size(value, seen=None):
+    """Approximate the memory held by a value and everything it references."""
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(deep_size(item, seen) for item in value)
+    elif hasattr(type(value), '__slots__'):
+        size += sum(deep_size(getattr(value, name), seen) for name in type(value).__slots__)
+    return size
+
+
+class TestParsing:
+    """Test suite for building model objects from flow.json dicts."""
+
+    def test_steps(self):
+        """Test each step type and the defaults for missing fields."""
+        assert parse_step({'type': 'CHAPTER', 'id': 'c', 'title': 'Intro'}) == ChapterStep('c', 'Intro', '')
+
+        image = parse_step({
+            'type': 'IMAGE', 'id': 'i', 'assetId': 'a', 'url': 'https://example.com/i.png',
+            'clickContext': {'text': 'Go', 'elementType': 'button'},
+            'pageContext': {'url': 'https://example.com', 'title': 'Home'},
+            'hotspots': [{'label': 'Click here', 'x': 0.5}]
+        })
+        assert image == ImageStep('i', 'a', 'https://example.com/i.png', Click('Go', 'button'),
+                                  'https://example.com', 'Home', 'Click here')
+        assert parse_step({'type': 'IMAGE'}) == ImageStep()
+
+        video = parse_step({'type': 'VIDEO', 'startTimeFrac': 0.25, 'endTimeFrac': 0.5, 'duration': 8,
+                            'videoThumbnailUrl': 'https://example.com/t.png'})
+        assert isinstance(video, VideoStep)
+        assert (video.start_seconds, video.end_seconds) == (2, 4)
+        assert video.thumbnail_url == 'https://example.com/t.png'
+
+        assert parse_step({'type': 'EMBED', 'id': 'e'}) == OtherStep('EMBED', 'e')
+
+    def test_events(self):
+        """Test that point and range events share one start/end representation."""
+        assert parse_event({'type': 'click', 'timeMs': 5, 'clickId': 'i'}) == Event('click', 5, 5, 'i')
+        assert parse_event({'type': 'typing', 'startTimeMs': 5, 'endTimeMs': 9}) == Event('typing', 5, 9)
+        assert parse_event({'type': 'typing', 'startTimeMs': 5}) == Event('typing', 5, 5)
+        assert parse_event({}) == Event('unknown', None, None)
+
+    def test_sample_flow(self):
+        """Test the bundled flow."""
+        data = json.loads(FLOW_PATH.read_text())
+        flow = Flow.from_dict(data)
+
+        assert flow.name == data['name']
+        assert [step.type for step in flow.steps] == [step['type'] for step in data['steps']]
+        assert len(flow.events) == len(data['capturedEvents'])
+
+
+class TestFlow:
+    """Test suite for Flow."""
+
+    @pytest.fixture
+    def data(self):
+        """The bundled flow.json contents."""
+        return json.loads(FLOW_PATH.read_text())
+
+    def test_slotted(self, data):
+        """Test that model objects carry no per-instance __dict__ and are smaller than the dicts."""
+        flow = Flow.from_dict(data)
+
+        for value in (flow, *flow.steps, *flow.events):
+            assert not hasattr(value, '__dict__')
+        assert deep_size(flow) < deep_size(data) / 3
+
+    def test_fingerprint(self, data):
+        """Test that the fingerprint tracks the fields the pipeline uses, and only those."""
+        fingerprint = Flow.from_dict(data).fingerprint()
+        assert Flow.from_dict(copy.deepcopy(data)).fingerprint() == fingerprint
+
+        unused = copy.deepcopy(data)
+        unused['steps'][0]['blurhash'] = 'changed'
+        assert Flow.from_dict(unused).fingerprint() == fingerprint
+
+        used = copy.deepcopy(data)
+        used['capturedEvents'][0]['type'] = 'changed'
+        assert Flow.from_dict(used).fingerprint() != fingerprint
@@ -0,0 +1,107 @@
+"""
+Tests for the incremental flow.json reader.
+"""
+
+import pytest
+import io
+import json
+import tempfile
+import shutil
+from pathlib import Path
+
+from flow_model import Event, Flow, ImageStep
+from flow_stream import iter_flow, read_flow
+
+FLOW_PATH = Path(__file__).parent.parent / "flow.json"
+
+
+class CountingReader(io.StringIO):
+    """StringIO that records how much has been read."""
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.consumed = self.tell()
+        return chunk
+
+
+class TestIterFlow:
+    """Test suite for iter_flow."""
+
+    def test_yields_elements(self):
+        """Test that steps and events are yielded one element at a time as model objects."""
+        document = json.dumps({
+            'name': 'Demo',
+            'capturedEvents': [{'type': 'click', 'timeMs': 1}, {'type': 'typing', 'startTimeMs': 2, 'endTimeMs': 3}],
+            'steps': [{'type': 'IMAGE', 'id': 'a'}],
+            'extra': {'nested': [1, 2.5, None, True]},
+        }, indent=2)
+
+        items = list(iter_flow(io.StringIO(document), chunk_size=5))
+
+        assert items == [
+            ('name', 'Demo'),
+            ('capturedEvents', Event('click', 1, 1)),
+            ('capturedEvents', Event('typing', 2, 3)),
+            ('steps', ImageStep(id='a')),
+            ('extra', {'nested': [1, 2.5, None, True]}),
+        ]
+
+    @pytest.mark.parametrize("document, expected", [
+        ('{}', []),
+        ('{"steps": [], "capturedEvents": []}', []),
+        ('{"uploadId": 1234567890}', [('uploadId', 1234567890)]),
+        ('{"name": "caf\\u00e9 \\"x\\""}', [('name', 'café "x"')]),
+    ])
+    def test_edge_cases(self, document, expected):
+        """Test empty values, numbers and escapes split across one-character chunks."""
+        assert list(iter_flow(io.StringIO(document), chunk_size=1)) == expected
+
+    @pytest.mark.parametrize("document", [
+        '', '[]', '{1: 2}', '{"name": "x"', '{"name" "x"}', '{"steps": {}}', '{"steps": [{]}',
+        '{"name": "x"} trailing',
+    ])
+    def test_malformed(self, document):
+        """Test that malformed documents raise ValueError."""
+        with pytest.raises(ValueError):
+            list(iter_flow(io.StringIO(document), chunk_size=4))
+
+    def test_first_step_before_end_of_file(self):
+        """Test that the first step is available long before the file has been read."""
+        data = json.loads(FLOW_PATH.read_text())
+        data['steps'] = data['steps'] * 200
+        source = CountingReader(json.dumps(data))
+
+        for key, _ in iter_flow(source, chunk_size=4096):
+            if key == 'steps':
+                break
+
+        assert source.consumed < len(source.getvalue()) / 10
+
+
+class TestReadFlow:
+    """Test suite for read_flow."""
+
+    @pytest.fixture
+    def temp_cache_dir(self):
+        """Create a temporary cache directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield temp_dir
+        shutil.rmtree(temp_dir)
+
+    @pytest.mark.parametrize("chunk_size", [1, 7, 64 * 1024])
+    def test_matches_json_load(self, chunk_size):
+        """Test that the bundled flow loads the same as with json.load, at any chunk size."""
+        expected = Flow.from_dict(json.loads(FLOW_PATH.read_text(encoding='utf-8')))
+
+        assert read_flow(str(FLOW_PATH), chunk_size=chunk_size) == expected
+
+    def test_large_value_spanning_chunks(self, temp_cache_dir):
+        """Test a single value much larger than the chunk size."""
+        path = Path(temp_cache_dir) / "flow.json"
+        description = "x" * 100_000
+        path.write_text(json.dumps({'description': description, 'steps': [{'type': 'CHAPTER', 'title': 'T'}]}))
+
+        flow = read_flow(str(path), chunk_size=16)
+
+        assert flow.description == description
+        assert [step.title for step in flow.steps] == ['T']
@@ -0,0 +1,97 @@
+"""
+Tests for vision-request image preparation.
+"""
+
+import pytest
+import io
+import random
+import tempfile
+import shutil
+from pathlib import Path
+
+from image_prep import prepare_image, prepare_image_file, target_size
+from utils import OpenAICache
+from generate_report import load_image_refs
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def make_png(width=1024, height=1024, mode="RGB"):
+    """Encode a noisy gradient (photo-like, so PNG compresses it poorly) as PNG."""
+    gradient = Image.linear_gradient("L").resize((width, height))
+    noise = Image.frombytes("L", (width, height), random.Random(0).randbytes(width * height))
+    channel = Image.blend(gradient, noise, 0.15)
+    bands = [channel, channel.transpose(Image.Transpose.ROTATE_90), gradient, noise][:len(mode)]
+    image = Image.merge(mode, bands)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class TestTargetSize:
+    """Test suite for target_size."""
+
+    def test_low_detail(self):
+        """Test that low detail fits the longest side in 512px."""
+        assert target_size(1024, 1024, "low") == (512, 512)
+        assert target_size(1792, 1024, "low") == (512, 293)
+        assert target_size(300, 200, "low") == (300, 200)
+
+    def test_high_detail(self):
+        """Test that high detail fits in 2048px and caps the short side at 768px."""
+        assert target_size(1024, 1024, "high") == (768, 768)
+        assert target_size(4096, 2048, "auto") == (1536, 768)
+        assert target_size(600, 400, "high") == (600, 400)
+
+
+class TestPrepareImage:
+    """Test suite for prepare_image."""
+
+    @pytest.fixture
+    def temp_cache_dir(self):
+        """Create a temporary cache directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield temp_dir
+        shutil.rmtree(temp_dir)
+
+    def test_downscales_and_reencodes(self):
+        """Test that a 1024px PNG becomes a smaller 512px JPEG."""
+        png = make_png()
+
+        data, media_type = prepare_image(png, detail="low")
+
+        assert media_type == "image/jpeg"
+        assert len(data) < len(png) / 4
+        with Image.open(io.BytesIO(data)) as image:
+            assert image.size == (512, 512)
+            assert image.format == "JPEG"
+
+    def test_alpha_and_webp(self):
+        """Test RGBA input for JPEG output and WebP output."""
+        png = make_png(256, 256, mode="RGBA")
+
+        jpeg, jpeg_type = prepare_image(png, detail="low")
+        webp, webp_type = prepare_image(png, detail="low", image_format="WEBP")
+
+        assert jpeg_type == "image/jpeg"
+        assert webp_type == "image/webp"
+        with Image.open(io.BytesIO(webp)) as image:
+            assert image.size == (256, 256)
+
+    def test_passthrough(self):
+        """Test that undecodable or already-small images are returned unchanged."""
+        assert prepare_image(b'not an image', "image/png") == (b'not an image', "image/png")
+
+        tiny = make_png(4, 4)
+        assert prepare_image(tiny) == (tiny, "image/png")
+
+    def test_image_refs_use_prepared_images(self, temp_cache_dir):
+        """Test that selection images are stored shrunk in the blob store."""
+        path = Path(temp_cache_dir) / "social_media_image_1.png"
+        path.write_bytes(make_png())
+        cache = OpenAICache(cache_dir=temp_cache_dir)
+
+        refs = load_image_refs(cache, [{'path': str(path), 'url': 'https://example.com/1.png'}])
+
+        assert refs[0].startswith("blob:image/jpeg;sha256,")
+        assert cache.blobs.get(refs[0]) == prepare_image_file(str(path))[0]
@@ -0,0 +1,299 @@
+"""
+Tests for the dependency-graph pipeline scheduler.
+"""
+
+import pytest
+import asyncio
+import json
+import threading
+import time
+import tempfile
+import shutil
+from pathlib import Path
+
+from pipeline import Pipeline
+from checkpoints import CheckpointStore
+from flow_model import Flow
+from utils import OpenAICache
+import generate_report
+from generate_report import build_report_pipeline
+
+
+def sleeper(seconds, value):
+    """Build an async stage that sleeps and returns value plus its inputs."""
+    async def stage(**inputs):
+        await asyncio.sleep(seconds)
+        return (value, inputs)
+    return stage
+
+
+DEMO_FLOW = Flow.from_dict({
+    'name': 'Demo',
+    'steps': [
+        {'type': 'IMAGE', 'clickContext': {'text': 'Go', 'elementType': 'button'}, 'pageContext': {}},
+        {'type': 'VIDEO', 'startTimeFrac': 0, 'endTimeFrac': 1, 'duration': 2,
+         'videoThumbnailUrl': 'https://example.com/t.png'}
+    ],
+    'capturedEvents': []
+})
+
+
+async def fake_request(request_type, **params):
+    """Answer each report prompt with a plausible response."""
+    await asyncio.sleep(0.01)
+    if request_type == "image":
+        return {"data": [{"url": f"https://example.com/{params['prompt']}.png"}]}
+    system = params['messages'][0]['content']
+    if 'DALL-E prompts' in system:
+        content = json.dumps({"prompts": [{"variation": f"V{i}", "prompt": f"p{i}"} for i in range(3)]})
+    elif 'evaluating social media images' in system:
+        scores = {"visual_appeal": 7, "professionalism": 7, "relevance": 7, "engagement": 7, "overall": 7}
+        content = json.dumps({"selected_image": 3, "reasoning": "Best",
+                              "scores": {f"image_{i}": scores for i in (1, 2, 3)}})
+    else:
+        content = "Did a thing"
+    return {"choices": [{"message": {"content": content}}]}
+
+
+class TestPipeline:
+    """Test suite for Pipeline."""
+
+    def test_independent_stages_overlap(self):
+        """Test that stages with satisfied inputs run concurrently."""
+        pipeline = Pipeline()
+        pipeline.add("a", sleeper(0.1, "a"))
+        pipeline.add("b", sleeper(0.1, "b"))
+        pipeline.add("c", sleeper(0.0, "c"), deps=["a", "b"])
+
+        start = time.perf_counter()
+        results = asyncio.run(pipeline.run())
+
+        assert time.perf_counter() - start < 0.18
+        assert results["c"] == ("c", {"a": ("a", {}), "b": ("b", {})})
+        assert pipeline.timings["c"]["start"] >= max(pipeline.timings["a"]["end"], pipeline.timings["b"]["end"])
+
+    def test_inputs_and_sync_stages(self):
+        """Test pipeline inputs and that plain functions run off the event loop."""
+        loop_thread = threading.get_ident()
+        seen = {}
+
+        def double(x):
+            seen['thread'] = threading.get_ident()
+            return x * 2
+
+        pipeline = Pipeline()
+        pipeline.add("doubled", double, deps=["x"])
+
+        results = asyncio.run(pipeline.run({"x": 21}))
+
+        assert results == {"x": 21, "doubled": 42}
+        assert seen['thread'] != loop_thread
+
+    def test_failure_skips_dependents_only(self):
+        """Test that a failing stage skips its dependents and is re-raised."""
+        async def fail():
+            raise RuntimeError("boom")
+
+        pipeline = Pipeline()
+        pipeline.add("bad", fail)
+        pipeline.add("after_bad", sleeper(0, "x"), deps=["bad"])
+        pipeline.add("independent", sleeper(0.05, "ok"))
+
+        with pytest.raises(RuntimeError, match="boom"):
+            asyncio.run(pipeline.run())
+
+        assert pipeline.status == {"bad": "failed", "after_bad": "skipped", "independent": "ok"}
+
+    def test_unknown_dependency_and_cycle_rejected(self):
+        """Test graph validation before anything runs."""
+        pipeline = Pipeline()
+        pipeline.add("a", sleeper(0, "a"), deps=["missing"])
+        with pytest.raises(ValueError, match="unknown stage missing"):
+            asyncio.run(pipeline.run())
+
+        pipeline = Pipeline()
+        pipeline.add("a", sleeper(0, "a"), deps=["b"])
+        pipeline.add("b", sleeper(0, "b"), deps=["a"])
+        with pytest.raises(ValueError, match="cycle"):
+            asyncio.run(pipeline.run())
+
+        with pytest.raises(ValueError, match="Duplicate stage"):
+            pipeline.add("a", sleeper(0, "a"))
+
+    def test_critical_path(self):
+        """Test that the critical path follows the slowest chain."""
+        pipeline = Pipeline()
+        pipeline.add("fast", sleeper(0.01, "fast"))
+        pipeline.add("slow", sleeper(0.08, "slow"))
+        pipeline.add("middle", sleeper(0.01, "middle"), deps=["fast"])
+        pipeline.add("end", sleeper(0.01, "end"), deps=["middle", "slow"])
+
+        asyncio.run(pipeline.run())
+
+        assert pipeline.critical_path() == ["slow", "end"]
+        lines = pipeline.format_timings().splitlines()
+        assert len(lines) == 4
+        assert [line.split()[1] for line in lines if line.startswith('*')] == ["slow", "end"]
+
+
+class TestCheckpointing:
+    """Test suite for checkpointed pipeline runs."""
+
+    @pytest.fixture
+    def temp_cache_dir(self):
+        """Create a temporary cache directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield temp_dir
+        shutil.rmtree(temp_dir)
+
+    def build(self, calls, versions=None, validate=None):
+        """Build a -> b -> c over input x, counting calls per stage."""
+        versions = versions or {}
+
+        def counted(name):
+            async def stage(**inputs):
+                calls[name] = calls.get(name, 0) + 1
+                return (name, inputs)
+            return stage
+
+        pipeline = Pipeline()
+        pipeline.add("a", counted("a"), deps=["x"], version=versions.get("a"))
+        pipeline.add("b", counted("b"), deps=["a"], version=versions.get("b"), validate=validate)
+        pipeline.add("c", counted("c"), deps=["b"], version=versions.get("c"))
+        return pipeline
+
+    def test_rerun_restores_every_stage(self, temp_cache_dir):
+        """Test that an unchanged rerun runs nothing and returns the same results."""
+        store = CheckpointStore(temp_cache_dir)
+        calls = {}
+
+        first = asyncio.run(self.build(calls).run({"x": 1}, checkpoints=store))
+        second = asyncio.run(self.build(calls).run({"x": 1}, outputs=["c"], checkpoints=store))
+
+        assert calls == {"a": 1, "b": 1, "c": 1}
+        assert second == {"x": 1, "c": first["c"]}
+
+    def test_changed_version_reruns_downstream_only(self, temp_cache_dir):
+        """Test that bumping a stage's version recomputes it and its dependents."""
+        store = CheckpointStore(temp_cache_dir)
+        calls = {}
+        asyncio.run(self.build(calls).run({"x": 1}, checkpoints=store))
+
+        pipeline = self.build(calls, versions={"b": 2})
+        asyncio.run(pipeline.run({"x": 1}, outputs=["c"], checkpoints=store))
+
+        assert calls == {"a": 1, "b": 2, "c": 2}
+        assert pipeline.status == {"a": "cached", "b": "ok", "c": "ok"}
+
+    def test_changed_input_reruns_everything(self, temp_cache_dir):
+        """Test that a new input fingerprint invalidates every stage."""
+        store = CheckpointStore(temp_cache_dir)
+        calls = {}
+        asyncio.run(self.build(calls).run({"x": 1}, checkpoints=store, namespace="flow"))
+        results = asyncio.run(self.build(calls).run({"x": 2}, checkpoints=store, namespace="flow"))
+
+        assert calls == {"a": 2, "b": 2, "c": 2}
+        assert results["a"] == ("a", {"x": 2})
+
+    def test_failed_validation_recomputes(self, temp_cache_dir):
+        """Test that a checkpoint rejected by validate is recomputed."""
+        store = CheckpointStore(temp_cache_dir)
+        calls = {}
+        asyncio.run(self.build(calls).run({"x": 1}, checkpoints=store))
+
+        pipeline = self.build(calls, validate=lambda result: False)
+        asyncio.run(pipeline.run({"x": 1}, outputs=["c"], checkpoints=store))
+
+        # c's inputs are unchanged, so only b reruns
+        assert calls == {"a": 1, "b": 1, "c": 1}
+        asyncio.run(pipeline.run({"x": 1}, outputs=["b"], checkpoints=store))
+        assert calls == {"a": 1, "b": 2, "c": 1}
+        assert pipeline.status == {"a": "cached", "b": "ok", "c": "pending"}
+
+
+class TestReportPipeline:
+    """Test suite for the report generation graph."""
+
+    @pytest.fixture
+    def temp_cache_dir(self):
+        """Create a temporary cache directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield temp_dir
+        shutil.rmtree(temp_dir)
+
+    def test_report_stages(self, temp_cache_dir, monkeypatch):
+        """Test that the graph produces a report and overlaps step description with VIDEO analysis."""
+        monkeypatch.setattr(generate_report, 'download_image', lambda url, path: Path(path).write_bytes(b'png') > 0)
+        cache = OpenAICache(cache_dir=temp_cache_dir)
+        pipeline = build_report_pipeline(fake_request, cache, output_dir=temp_cache_dir + "/out")
+
+        results = asyncio.run(pipeline.run({"flow": DEMO_FLOW}))
+
+        assert results["selection"][0]['number'] == 3
+        assert Path(results["report"]).read_text().count("Did a thing") >= 1
+        timings = pipeline.timings
+        assert timings["static_steps"]["start"] < timings["video_descriptions"]["end"]
+        assert timings["interactions"]["start"] >= timings["video_descriptions"]["end"]
+        assert pipeline.critical_path()[-1] == "report"
+
+    def test_checkpointed_rerun(self, temp_cache_dir, monkeypatch):
+        """Test that a rerun makes no requests and a missing image reruns only the image stages."""
+        monkeypatch.setattr(generate_report, 'download_image', lambda url, path: Path(path).write_bytes(b'png') > 0)
+        requests_made = []
+
+        async def request(**params):
+            requests_made.append(params['request_type'])
+            return await fake_request(**params)
+
+        cache = OpenAICache(cache_dir=temp_cache_dir)
+        checkpoints = CheckpointStore(temp_cache_dir + "/checkpoints")
+        output_dir = temp_cache_dir + "/out"
+
+        def run():
+            requests_made.clear()
+            return asyncio.run(generate_report.run_report_pipeline(
+                request, cache, DEMO_FLOW, output_dir=output_dir, checkpoints=checkpoints
+            ))
+
+        report, images, best_image = run()
+        assert len(requests_made) == 8
+
+        assert run() == (report, images, best_image)
+        assert requests_made == []
+
+        Path(images[0]['path']).unlink()
+        Path(report).unlink()
+        run()
+        assert requests_made == ["image"] * 3
+        assert Path(images[0]['path']).exists()
+        assert Path(report).exists()
+
+    def test_failed_image_is_not_checkpointed(self, temp_cache_dir, monkeypatch):
+        """Test that a failed image generation fails the run and the next run retries it."""
+        monkeypatch.setattr(generate_report, 'download_image', lambda url, path: Path(path).write_bytes(b'png') > 0)
+        failures = ["p1"]
+        requests_made = []
+
+        async def request(**params):
+            requests_made.append(params['request_type'])
+            if params.get('prompt') in failures:
+                failures.remove(params['prompt'])
+                raise ConnectionError("transient")
+            return await fake_request(**params)
+
+        cache = OpenAICache(cache_dir=temp_cache_dir)
+        checkpoints = CheckpointStore(temp_cache_dir + "/checkpoints")
+
+        def run():
+            requests_made.clear()
+            return asyncio.run(generate_report.run_report_pipeline(
+                request, cache, DEMO_FLOW, output_dir=temp_cache_dir + "/out", checkpoints=checkpoints
+            ))
+
+        with pytest.raises(RuntimeError, match="Only 2 of 3 images"):
+            run()
+
+        # Stages before the images are restored; selection never ran
+        report, images, best_image = run()
+        assert requests_made == ["image"] * 3 + ["chat"]
+        assert len(images) == 3 and best_image['number'] == 3
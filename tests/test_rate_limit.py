@@ -0,0 +1,320 @@
+"""
+Tests for the client-side rate limiter.
+"""
+
+import pytest
+import asyncio
+import json
+import threading
+import time
+import tempfile
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from openai import OpenAI, AsyncOpenAI, RateLimitError
+
+from rate_limit import (
+    AdaptiveConcurrency,
+    AsyncRateLimitedClient,
+    RateLimitedClient,
+    RateLimiter,
+    TokenBucket,
+    estimate_tokens,
+    parse_reset_duration,
+)
+from utils import OpenAICache, cached_openai_request
+
+
+class FakeChatServer:
+    """Local server answering chat completions, throttling the first calls."""
+
+    def __init__(self, throttle_first=0, limit_requests=60, delay=0.0):
+        self.throttle_first = throttle_first
+        self.limit_requests = limit_requests
+        self.delay = delay
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers['Content-Length']))
+                with fake.lock:
+                    fake.calls += 1
+                    call = fake.calls
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                time.sleep(fake.delay)
+                with fake.lock:
+                    fake.in_flight -= 1
+
+                if call <= fake.throttle_first:
+                    self._reply(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                                {"retry-after-ms": "50"})
+                    return
+                self._reply(200, {
+                    "id": f"chatcmpl-{call}",
+                    "object": "chat.completion",
+                    "created": 0,
+                    "model": "gpt-4o",
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": f"reply {call}"}}],
+                    "usage": {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7}
+                }, {
+                    "x-ratelimit-limit-requests": str(fake.limit_requests),
+                    "x-ratelimit-remaining-requests": str(fake.limit_requests - 1),
+                    "x-ratelimit-reset-requests": "1s",
+                    "x-ratelimit-limit-tokens": "100000",
+                    "x-ratelimit-remaining-tokens": "99000",
+                    "x-ratelimit-reset-tokens": "6m0s",
+                })
+
+            def _reply(self, status, body, headers):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+CHAT_PARAMS = {"model": "gpt-4o", "messages": [{"role": "user", "content": "Hi"}], "max_tokens": 10}
+
+
+class TestRateLimitPrimitives:
+    """Test suite for buckets, header parsing and token estimates."""
+
+    def test_parse_reset_duration(self):
+        """Test parsing the reset header formats the API returns."""
+        assert parse_reset_duration("1s") == 1
+        assert parse_reset_duration("6m0s") == 360
+        assert parse_reset_duration("20ms") == pytest.approx(0.02)
+        assert parse_reset_duration("1h2m3.5s") == pytest.approx(3723.5)
+        assert parse_reset_duration("2.5") == 2.5
+        assert parse_reset_duration(None) is None
+        assert parse_reset_duration("soon") is None
+
+    def test_token_bucket_waits_when_empty(self):
+        """Test that reservations beyond capacity report the refill delay."""
+        bucket = TokenBucket(per_minute=60)  # 1 token per second, burst 60
+
+        assert bucket.reserve(60) == 0
+        assert bucket.reserve(2) == pytest.approx(2, abs=0.05)
+
+    def test_token_bucket_sync_and_drain(self):
+        """Test aligning with server-reported limits and draining after a 429."""
+        bucket = TokenBucket(per_minute=600)
+
+        bucket.sync(limit=60, remaining=0)
+        assert bucket.rate == 1
+        assert bucket.reserve(1) == pytest.approx(1, abs=0.05)
+
+        bucket = TokenBucket(per_minute=60)
+        bucket.drain(3)
+        assert bucket.reserve(0) == pytest.approx(3, abs=0.05)
+
+    def test_estimate_tokens(self):
+        """Test estimates include max_tokens, text and image inputs."""
+        text_only = estimate_tokens("chat", {"messages": [{"role": "user", "content": "x" * 400}], "max_tokens": 100})
+        with_image = estimate_tokens("chat", {"messages": [{"role": "user", "content": [
+            {"type": "text", "text": "x" * 400},
+            {"type": "image_url", "image_url": {"url": "data:image/png;base64," + "A" * 100000, "detail": "low"}}
+        ]}], "max_tokens": 100})
+
+        assert text_only == 100 + 4 + 100
+        assert with_image == text_only + 85
+        assert estimate_tokens("image", {"model": "dall-e-3", "prompt": "x" * 1000}) == 0
+
+    def test_adaptive_concurrency_aimd(self):
+        """Test additive growth on success and halving on throttle."""
+        concurrency = AdaptiveConcurrency(initial=4, minimum=1, maximum=6)
+
+        for _ in range(20):
+            concurrency.on_success()
+        assert int(concurrency.limit) == 6
+
+        concurrency.on_throttle()
+        assert int(concurrency.limit) == 3
+        for _ in range(5):
+            concurrency.on_throttle()
+        assert concurrency.limit == 1
+
+    def test_adaptive_concurrency_blocks_at_limit(self):
+        """Test that slots are handed out only up to the limit."""
+        concurrency = AdaptiveConcurrency(initial=2)
+
+        assert concurrency.try_acquire()
+        assert concurrency.try_acquire()
+        assert not concurrency.try_acquire()
+        concurrency.release()
+        assert concurrency.try_acquire()
+
+    def test_async_waiters_woken_and_cancelled_waits_release(self):
+        """Test that a release from another thread wakes an async waiter, and cancellation leaks no slot."""
+        limiter = RateLimiter(limits={"gpt-4o": {"rpm": 1, "tpm": None}}, initial_concurrency=1)
+        concurrency = limiter._model("gpt-4o").concurrency
+
+        async def run():
+            await limiter.acquire_async("gpt-4o")
+            waiter = asyncio.create_task(limiter.acquire_async("gpt-4o"))
+            await asyncio.sleep(0.05)
+            assert not waiter.done() and len(concurrency._async_waiters) == 1
+
+            threading.Thread(target=limiter.release, args=("gpt-4o",)).start()
+            # The bucket is now empty, so the woken waiter sleeps for a minute
+            await asyncio.sleep(0.2)
+            assert concurrency.in_flight == 1 and not waiter.done()
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+
+        asyncio.run(run())
+        assert concurrency.in_flight == 0
+        assert concurrency._async_waiters == []
+
+    def test_headers_update_buckets_and_low_headroom_stops_growth(self):
+        """Test that x-ratelimit headers replace the configured limits."""
+        limiter = RateLimiter(limits={}, initial_concurrency=2)
+
+        limiter.record_success("gpt-4o", {"X-RateLimit-Limit-Requests": "120",
+                                          "X-RateLimit-Remaining-Requests": "100"})
+        state = limiter._model("gpt-4o")
+        assert state.requests.rate == 2
+        assert state.concurrency.limit == 2.5
+
+        limiter.record_success("gpt-4o", {"x-ratelimit-limit-requests": "120",
+                                          "x-ratelimit-remaining-requests": "3"})
+        assert state.concurrency.limit == 2.5
+
+    def test_share_scales_configured_and_reported_limits(self):
+        """Test that a limiter with a share of the budget paces to that share."""
+        limiter = RateLimiter(limits={"dall-e-3": {"rpm": 5, "tpm": None}}, share=0.25)
+        assert limiter._model("dall-e-3").requests.rate * 60 == pytest.approx(1.25)
+
+        limiter.record_success("gpt-4o", {"x-ratelimit-limit-requests": "120",
+                                          "x-ratelimit-limit-tokens": "30000"})
+        state = limiter._model("gpt-4o")
+        assert (state.requests.rate, state.tokens.capacity) == (0.5, 7500)
+
+        with pytest.raises(ValueError):
+            RateLimiter(share=0)
+
+    def test_throttle_delay_from_headers(self):
+        """Test retry delays come from retry-after headers, then reset headers."""
+        limiter = RateLimiter(limits={"gpt-4o": {"rpm": 60, "tpm": None}}, initial_concurrency=4)
+
+        assert limiter.record_throttle("gpt-4o", {"retry-after-ms": "250"}) == pytest.approx(0.25)
+        assert limiter.record_throttle("gpt-4o", {"retry-after": "2"}) == 2
+        assert limiter.record_throttle("gpt-4o", {"x-ratelimit-reset-requests": "1.5s"}) == 1.5
+        assert limiter.stats()["gpt-4o"]["throttled"] == 3
+        assert limiter.stats()["gpt-4o"]["concurrency_limit"] == 1
+
+
+class TestRateLimitedClient:
+    """Test suite for rate-limited clients against a local fake server."""
+
+    @pytest.fixture
+    def temp_cache_dir(self):
+        """Create a temporary cache directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield temp_dir
+        shutil.rmtree(temp_dir)
+
+    def test_retries_after_429(self):
+        """Test that throttled calls are retried and succeed."""
+        with FakeChatServer(throttle_first=2) as server:
+            limiter = RateLimiter()
+            client = RateLimitedClient(OpenAI(api_key="test", base_url=server.base_url, max_retries=0), limiter)
+
+            response = client.chat.completions.create(**CHAT_PARAMS)
+
+        assert response.choices[0].message.content == "reply 3"
+        assert server.calls == 3
+        assert limiter.stats()["gpt-4o"]["throttled"] == 2
+
+    def test_gives_up_after_max_retries(self):
+        """Test that the 429 is raised once retries are exhausted."""
+        with FakeChatServer(throttle_first=10) as server:
+            limiter = RateLimiter(max_retries=1)
+            client = RateLimitedClient(OpenAI(api_key="test", base_url=server.base_url, max_retries=0), limiter)
+
+            with pytest.raises(RateLimitError):
+                client.chat.completions.create(**CHAT_PARAMS)
+
+        assert server.calls == 2
+        assert limiter._model("gpt-4o").concurrency.in_flight == 0
+
+    def test_concurrency_limit_respected(self):
+        """Test that no more requests than the limit are in flight."""
+        with FakeChatServer(delay=0.05) as server:
+            limiter = RateLimiter(initial_concurrency=2, max_concurrency=2)
+            client = RateLimitedClient(OpenAI(api_key="test", base_url=server.base_url, max_retries=0), limiter)
+
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(lambda _: client.chat.completions.create(**CHAT_PARAMS), range(8)))
+
+        assert server.calls == 8
+        assert server.max_in_flight == 2
+
+    def test_requests_per_minute_paced(self):
+        """Test that calls beyond the burst wait for the bucket to refill."""
+        with FakeChatServer(limit_requests=600) as server:
+            limiter = RateLimiter(limits={"gpt-4o": {"rpm": 600, "tpm": None}})
+            limiter._model("gpt-4o").requests.tokens = 0
+            client = RateLimitedClient(OpenAI(api_key="test", base_url=server.base_url, max_retries=0), limiter)
+
+            start = time.monotonic()
+            for _ in range(3):
+                client.chat.completions.create(**CHAT_PARAMS)
+
+        # 10 requests per second -> roughly 0.1s between calls
+        assert time.monotonic() - start >= 0.25
+
+    def test_with_cached_openai_request(self, temp_cache_dir):
+        """Test that only cache misses reach the limiter."""
+        with FakeChatServer() as server:
+            limiter = RateLimiter()
+            client = RateLimitedClient(OpenAI(api_key="test", base_url=server.base_url, max_retries=0), limiter)
+            cache = OpenAICache(cache_dir=temp_cache_dir)
+
+            first = cached_openai_request(client, cache, "chat", **CHAT_PARAMS)
+            second = cached_openai_request(client, cache, "chat", **CHAT_PARAMS)
+
+        assert first == second
+        assert first["choices"][0]["message"]["content"] == "reply 1"
+        assert limiter.stats()["gpt-4o"]["requests"] == 1
+
+    def test_async_client_retries_after_429(self):
+        """Test the async wrapper against the fake server."""
+        async def run(base_url):
+            limiter = RateLimiter(initial_concurrency=2, max_concurrency=2)
+            client = AsyncRateLimitedClient(AsyncOpenAI(api_key="test", base_url=base_url, max_retries=0), limiter)
+            return await asyncio.gather(*(client.chat.completions.create(**CHAT_PARAMS) for _ in range(4)))
+
+        with FakeChatServer(throttle_first=1, delay=0.02) as server:
+            responses = asyncio.run(run(server.base_url))
+
+        assert len(responses) == 4
+        assert server.calls == 5
+        assert server.max_in_flight <= 2
@@ -0,0 +1,98 @@
+"""
+Tests for leveled, structured logging.
+"""
+
+import pytest
+import io
+import json
+import logging
+import tempfile
+import shutil
+
+import structured_logging
+from structured_logging import get_logger, log_event, logging_configured
+from utils import OpenAICache
+
+_log = get_logger("test")
+
+
+class Unprintable:
+    """A field value that fails the test if it is ever formatted."""
+
+    def __str__(self):
+        raise AssertionError("disabled event was formatted")
+
+
+class TestStructuredLogging:
+    """Test suite for log_event and its configuration."""
+
+    @pytest.fixture
+    def temp_cache_dir(self):
+        """Create a temporary cache directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield temp_dir
+        shutil.rmtree(temp_dir)
+
+    def test_levels_and_text_format(self):
+        """Test that events below the level are dropped unformatted, and key=value rendering."""
+        stream = io.StringIO()
+        with logging_configured(level="info", stream=stream):
+            log_event(_log, logging.DEBUG, "hidden", value=Unprintable())
+            log_event(_log, logging.INFO, "cache_hit", cache_type="text", note="two words", empty="")
+
+        line = stream.getvalue().strip()
+        assert "hidden" not in line
+        assert line.endswith('INFO    arcade.test cache_hit cache_type=text note="two words" empty=""')
+
+    def test_json_lines_and_restore(self):
+        """Test JSON output, and that the previous setup returns after the block."""
+        stream = io.StringIO()
+        with logging_configured(level="debug", json_lines=True, stream=stream):
+            log_event(_log, logging.DEBUG, "cache_miss", key="abc", bytes=12)
+
+        record = json.loads(stream.getvalue())
+        assert {k: record[k] for k in ('level', 'logger', 'event', 'key', 'bytes')} == {
+            'level': 'debug', 'logger': 'arcade.test', 'event': 'cache_miss', 'key': 'abc', 'bytes': 12
+        }
+        assert not _log.isEnabledFor(logging.INFO)
+        assert _log.isEnabledFor(logging.WARNING)
+
+    def test_sampling(self):
+        """Test that only events marked for sampling are thinned."""
+        stream = io.StringIO()
+        with logging_configured(level="debug", sample_rate=0.0, stream=stream):
+            for _ in range(10):
+                log_event(_log, logging.DEBUG, "per_request", sample=True)
+            log_event(_log, logging.WARNING, "failure")
+
+        assert stream.getvalue().count("per_request") == 0
+        assert stream.getvalue().count("failure") == 1
+
+        with pytest.raises(ValueError):
+            structured_logging.configure_logging(sample_rate=2)
+
+    def test_summary(self):
+        """Test that disabled events are still counted in the summary, written on exit."""
+        stream = io.StringIO()
+        with logging_configured(level="warning", summary_interval=3600, stream=stream):
+            for _ in range(3):
+                log_event(_log, logging.DEBUG, "cache_hit", sample=True)
+            log_event(_log, logging.DEBUG, "cache_miss", sample=True)
+            assert stream.getvalue() == ""
+
+        assert stream.getvalue().strip().endswith("arcade.summary summary window_s=0.0 cache_hit=3 cache_miss=1")
+
+    def test_cache_events(self, temp_cache_dir):
+        """Test the events OpenAICache logs for a miss, a write and hits from both tiers."""
+        stream = io.StringIO()
+        with logging_configured(level="debug", stream=stream):
+            cache = OpenAICache(cache_dir=temp_cache_dir)
+            params = {"model": "gpt-4o"}
+            cache.get(params)
+            cache.set(params, {"result": "ok"})
+            cache.get(params)
+            OpenAICache(cache_dir=temp_cache_dir).get(params)
+
+        events = [line.split()[3] + " " + line.split()[-1] for line in stream.getvalue().splitlines()]
+        assert [event.split()[0] for event in events] == ["cache_miss", "cache_set", "cache_hit", "cache_hit"]
+        assert events[2].endswith("tier=memory") and events[3].endswith("tier=backend")
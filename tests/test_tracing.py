@@ -0,0 +1,153 @@
+"""
+Tests for span tracing and its Chrome and OTLP exports.
+"""
+
+import pytest
+import asyncio
+import json
+import tempfile
+import shutil
+import threading
+from pathlib import Path
+from unittest.mock import AsyncMock, Mock
+
+import tracing
+from pipeline import Pipeline
+from utils import OpenAICache, async_cached_openai_request, cached_openai_request
+
+
+def completion(content="Hello"):
+    """Build a mock chat completion."""
+    response = Mock()
+    response.model_dump.return_value = {"choices": [{"message": {"content": content}}]}
+    return response
+
+
+class TestTracer:
+    """Test suite for Tracer, span and recording."""
+
+    @pytest.fixture
+    def temp_cache_dir(self):
+        """Create a temporary cache directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield temp_dir
+        shutil.rmtree(temp_dir)
+
+    @pytest.fixture
+    def tracer(self):
+        """Activate a Tracer for the test."""
+        tracer = tracing.Tracer()
+        previous = tracing.set_tracer(tracer)
+        yield tracer
+        tracing.set_tracer(previous)
+
+    def test_disabled_by_default(self):
+        """Test that spans are no-ops without an active tracer."""
+        assert tracing.get_tracer() is None
+        with tracing.span("work", "stage", n=1) as span:
+            span.set(n=2)
+            tracing.annotate(n=3)
+        assert span.recording is False
+
+    def test_nesting_across_tasks_and_errors(self, tracer):
+        """Test parents across asyncio tasks, one track per task and recorded errors."""
+        async def child(n):
+            with tracing.span(f"child{n}", "request"):
+                await asyncio.sleep(0.01)
+
+        async def run():
+            with tracing.span("parent", "stage"):
+                await asyncio.gather(child(1), child(2))
+
+        asyncio.run(run())
+        with pytest.raises(ValueError):
+            with tracing.span("failing"):
+                raise ValueError("boom")
+
+        spans = {span.name: span for span in tracer.spans}
+        assert spans["child1"].parent_id == spans["child2"].parent_id == spans["parent"].span_id
+        assert len({spans[name].track for name in ("parent", "child1", "child2")}) == 3
+        assert spans["parent"].seconds >= 0.01
+        assert spans["failing"].parent_id is None
+        assert spans["failing"].error == "ValueError: boom"
+
+    def test_chrome_and_otlp_export(self, tracer):
+        """Test the shape of both export formats."""
+        with tracing.span("outer", "stage"):
+            with tracing.span("inner", "request", cache="hit", bytes=12):
+                pass
+
+        chrome = tracer.export("chrome")
+        events = [e for e in chrome['traceEvents'] if e['ph'] == 'X']
+        assert [e['name'] for e in events] == ["outer", "inner"]
+        assert events[1]['args']['parent_id'] == events[0]['args']['span_id']
+        assert events[0]['ts'] <= events[1]['ts'] and events[1]['dur'] <= events[0]['dur']
+        assert any(e['ph'] == 'M' and e['name'] == 'thread_name' for e in chrome['traceEvents'])
+
+        spans = tracer.export("otlp")['resourceSpans'][0]['scopeSpans'][0]['spans']
+        inner = spans[1]
+        assert inner['parentSpanId'] == spans[0]['spanId'] and inner['traceId'] == tracer.trace_id
+        assert {'key': 'bytes', 'value': {'intValue': '12'}} in inner['attributes']
+        assert int(inner['endTimeUnixNano']) >= int(inner['startTimeUnixNano'])
+
+        with pytest.raises(ValueError):
+            tracer.export("xml")
+
+    def test_recording_and_merge(self, temp_cache_dir):
+        """Test that recording saves on exit, and traces from threads and files merge."""
+        def work():
+            with tracing.span("in thread"):
+                pass
+
+        paths = [str(Path(temp_cache_dir) / f"part{n}.json") for n in range(2)]
+        for path in paths:
+            with tracing.recording(path):
+                thread = threading.Thread(target=work)
+                thread.start()
+                thread.join()
+            assert tracing.get_tracer() is None
+
+        merged = str(Path(temp_cache_dir) / "trace.json")
+        assert tracing.merge_trace_files(paths, merged) == 2
+        events = json.loads(Path(merged).read_text())['traceEvents']
+        assert [e['name'] for e in events if e['ph'] == 'X'] == ["in thread", "in thread"]
+
+    def test_request_and_stage_spans(self, tracer, temp_cache_dir):
+        """Test cache hit/miss, bytes and API spans on requests, and stage spans in a pipeline."""
+        cache = OpenAICache(cache_dir=temp_cache_dir)
+        client = Mock()
+        client.chat.completions.create.return_value = completion()
+        params = {"model": "gpt-4o", "messages": [{"role": "user", "content": "Hi"}]}
+
+        async def summary():
+            return cached_openai_request(client, cache, "chat", **params)
+
+        pipeline = Pipeline("report")
+        pipeline.add("summary", summary)
+        asyncio.run(pipeline.run())
+        cached_openai_request(client, cache, "chat", **params)
+
+        requests = [span for span in tracer.spans if span.category == "request"]
+        assert [span.args['cache'] for span in requests] == ["miss", "hit"]
+        assert requests[0].args['bytes'] == len(json.dumps(completion().model_dump(), separators=(',', ':')))
+        stage = next(span for span in tracer.spans if span.category == "stage")
+        api = next(span for span in tracer.spans if span.category == "api")
+        assert requests[0].parent_id == stage.span_id and api.parent_id == requests[0].span_id
+
+    def test_async_request_joined(self, tracer, temp_cache_dir):
+        """Test that coalesced async callers are marked as joined."""
+        cache = OpenAICache(cache_dir=temp_cache_dir)
+        client = Mock()
+
+        async def create(**params):
+            await asyncio.sleep(0.05)
+            return completion()
+        client.chat.completions.create = AsyncMock(side_effect=create)
+
+        async def run():
+            params = {"model": "gpt-4o", "messages": [{"role": "user", "content": "Hi"}]}
+            await asyncio.gather(*(async_cached_openai_request(client, cache, "chat", **params) for _ in range(2)))
+
+        asyncio.run(run())
+
+        assert sorted(span.args['cache'] for span in tracer.spans if span.category == "request") == ["joined", "miss"]
@@ -0,0 +1,103 @@
+"""
+Tests for token, cost and latency accounting.
+"""
+
+import pytest
+import tempfile
+import shutil
+from unittest.mock import Mock
+
+from usage_tracking import UsageTracker
+from utils import OpenAICache, cached_openai_request
+
+CHAT = {"model": "gpt-4o-2024-08-06", "usage": {"prompt_tokens": 1000, "completion_tokens": 500, "total_tokens": 1500},
+        "choices": [{"message": {"content": "Hello"}}]}
+
+
+class TestUsageTracker:
+    """Test suite for UsageTracker."""
+
+    def test_cost(self):
+        """Test token prices by longest model prefix, image prices and unpriced models."""
+        tracker = UsageTracker()
+
+        assert tracker.cost("chat", {"model": "gpt-4o"}, CHAT)['usd'] == pytest.approx(0.0075)
+        assert tracker.cost("chat", {"model": "gpt-4o-mini"}, CHAT)['usd'] == pytest.approx(0.00045)
+        assert tracker.cost("chat", {}, CHAT)['usd'] == pytest.approx(0.0075)
+        unpriced = tracker.cost("chat", {"model": "my-model"}, CHAT)
+        assert (unpriced['prompt_tokens'], unpriced['usd']) == (1000, 0.0)
+
+        image = tracker.cost("image", {"model": "dall-e-3", "quality": "hd", "size": "1024x1024"},
+                             {"data": [{"url": "a"}, {"url": "b"}]})
+        assert (image['images'], image['usd']) == (2, pytest.approx(0.16))
+        assert tracker.cost("chat", {"model": "gpt-4o"}, {"choices": []})['usd'] == 0.0
+
+    def test_stats(self):
+        """Test hit ratios, spent and saved totals and latency percentiles."""
+        tracker = UsageTracker()
+        for latency in (0.1, 0.2, 0.3, 0.4):
+            tracker.record("chat", {"model": "gpt-4o"}, CHAT, latency=latency)
+        tracker.record("chat", {"model": "gpt-4o"}, CHAT)
+        tracker.record("image", {"model": "dall-e-3"}, {"data": [{"url": "a"}]})
+
+        stats = tracker.stats()
+
+        assert stats['requests'] == {
+            'chat': {'hits': 1, 'misses': 4, 'hit_ratio': 0.2},
+            'image': {'hits': 1, 'misses': 0, 'hit_ratio': 1.0},
+        }
+        assert stats['tokens_spent'] == {'prompt': 4000, 'completion': 2000, 'total': 6000}
+        assert stats['tokens_saved']['total'] == 1500
+        assert stats['spent_usd'] == pytest.approx(0.03)
+        assert stats['saved_usd'] == pytest.approx(0.0075 + 0.04)
+        assert stats['images_saved'] == 1
+        assert stats['latency_ms'] == {'gpt-4o': {'count': 4, 'p50': 250.0, 'p95': 385.0, 'p99': 397.0, 'max': 400.0}}
+
+    def test_merge(self):
+        """Test that merging worker states adds up counts, totals and latencies."""
+        workers = [UsageTracker() for _ in range(2)]
+        for n, tracker in enumerate(workers):
+            tracker.record("chat", {"model": "gpt-4o"}, CHAT, latency=0.1 * (n + 1))
+            tracker.record("chat", {"model": "gpt-4o"}, CHAT)
+        merged = UsageTracker()
+        for tracker in workers:
+            merged.merge(tracker.state())
+
+        stats = merged.stats()
+        assert stats['requests']['chat'] == {'hits': 2, 'misses': 2, 'hit_ratio': 0.5}
+        assert stats['tokens_spent']['total'] == stats['tokens_saved']['total'] == 3000
+        assert stats['latency_ms']['gpt-4o']['max'] == 200.0
+
+
+class TestCacheUsageStats:
+    """Test suite for the usage figures in OpenAICache.get_stats."""
+
+    @pytest.fixture
+    def temp_cache_dir(self):
+        """Create a temporary cache directory for testing."""
+        temp_dir = tempfile.mkdtemp()
+        yield temp_dir
+        shutil.rmtree(temp_dir)
+
+    def test_fresh_and_cached_requests(self, temp_cache_dir):
+        """Test that a fresh response is spent and its cache hits are saved."""
+        cache = OpenAICache(cache_dir=temp_cache_dir)
+        client = Mock()
+        client.chat.completions.create.return_value.model_dump.return_value = CHAT
+        params = {"model": "gpt-4o", "messages": [{"role": "user", "content": "Hi"}]}
+
+        for _ in range(3):
+            cached_openai_request(client, cache, "chat", **params)
+
+        # Entries persist, the accounting starts over with the cache object
+        reopened = OpenAICache(cache_dir=temp_cache_dir)
+        cached_openai_request(client, reopened, "chat", **params)
+
+        stats = cache.get_stats()
+        assert client.chat.completions.create.call_count == 1
+        assert stats['requests']['chat'] == {'hits': 2, 'misses': 1, 'hit_ratio': 0.6667}
+        assert stats['tokens_spent']['total'] == 1500
+        assert stats['tokens_saved']['total'] == 3000
+        assert stats['saved_usd'] == pytest.approx(0.015)
+        assert stats['latency_ms']['gpt-4o']['count'] == 1
+        assert reopened.get_stats()['requests']['chat'] == {'hits': 1, 'misses': 0, 'hit_ratio': 1.0}
@@ -0,0 +1,359 @@
+"""
+Span tracing for pipeline stages, API requests and downloads.
+
+Instrumented code opens spans with the module-level span() function::
+
+    with tracing.span("openai.chat", "request", model="gpt-4o") as span:
+        response = ...
+        span.set(cache="miss")
+
+Nothing is recorded unless a Tracer is active: span() then returns a shared
+no-op span, so instrumentation costs one global lookup per call. Activate
+one for a run with recording(), which saves the spans when it exits::
+
+    with tracing.recording("trace.json"):
+        main()
+
+Traces are written as Chrome trace-event JSON (open in Perfetto or
+chrome://tracing) or as OpenTelemetry OTLP/JSON. Each asyncio task and each
+thread gets its own track, and spans opened inside another span (in the
+same task or in a task it started) record it as their parent.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+TRACE_FORMATS = ("chrome", "otlp")
+
+# Innermost open span of the current task or thread
+_current_span: contextvars.ContextVar = contextvars.ContextVar("tracing_current_span", default=None)
+
+_active_tracer = None
+
+
+class Span:
+    """One timed operation; use as a context manager."""
+
+    __slots__ = ('tracer', 'name', 'category', 'args', 'span_id', 'parent_id', 'track',
+                 'start_ns', 'end_ns', 'error', '_token')
+
+    recording = True
+
+    def __init__(self, tracer: "Tracer", name: str, category: str, args: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = None
+        self.track = None
+        self.start_ns = None
+        self.end_ns = None
+        self.error = None
+
+    def set(self, **args) -> None:
+        """Attach attributes (e.g. cache="hit", bytes=1024) to the span."""
+        self.args.update(args)
+
+    @property
+    def seconds(self) -> Optional[float]:
+        """Duration of a finished span."""
+        return None if self.end_ns is None else (self.end_ns - self.start_ns) / 1e9
+
+    def __enter__(self) -> "Span":
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.track = self.tracer._track()
+        self._token = _current_span.set(self)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.end_ns = time.perf_counter_ns()
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        self.tracer._finish(self)
+        return False
+
+
+class _NullSpan:
+    """Span returned while tracing is off; records nothing."""
+
+    recording = False
+
+    def set(self, **args) -> None:
+        pass
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """
+    Collects finished spans of one process and exports them.
+
+    Thread-safe; spans may be opened from worker threads and event loops.
+    """
+
+    def __init__(self, service_name: str = "arcade-report", trace_id: Optional[str] = None):
+        """
+        Initialize the tracer.
+
+        Args:
+            service_name: Process name shown in the trace viewer
+            trace_id: 32-hex-digit OpenTelemetry trace id; pass the same id
+                to the tracers of cooperating processes (default: random)
+        """
+        self.service_name = service_name
+        self.trace_id = trace_id or new_trace_id()
+        self.pid = os.getpid()
+        self.spans: List[Span] = []
+        self._tracks: Dict[Any, tuple] = {}
+        self._lock = threading.Lock()
+        # Wall-clock anchor for the monotonic span timestamps, so traces
+        # from several processes line up when merged
+        self._epoch_ns = time.time_ns() - time.perf_counter_ns()
+
+    def span(self, name: str, category: str = "", **args) -> Span:
+        """Create a span; it is timed from entering it to leaving it."""
+        return Span(self, name, category, args)
+
+    def _track(self) -> int:
+        """Get the track id of the current asyncio task, or else thread."""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        key = ('task', id(task)) if task is not None else ('thread', threading.get_ident())
+        with self._lock:
+            if key not in self._tracks:
+                label = task.get_name() if task is not None else threading.current_thread().name
+                self._tracks[key] = (len(self._tracks) + 1, label)
+            return self._tracks[key][0]
+
+    def _finish(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def _unix_ns(self, perf_ns: int) -> int:
+        return self._epoch_ns + perf_ns
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """
+        Export the spans as Chrome trace-event JSON.
+
+        Returns:
+            Dictionary with "traceEvents": one complete ("X") event per span
+            plus process and track name metadata
+        """
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'args': {'name': self.service_name}}]
+        for track, label in sorted(self._tracks.values()):
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': track, 'args': {'name': label}})
+
+        for span in sorted(self.spans, key=lambda s: s.start_ns):
+            args = {**span.args, 'span_id': span.span_id}
+            if span.parent_id:
+                args['parent_id'] = span.parent_id
+            if span.error:
+                args['error'] = span.error
+            events.append({
+                'name': span.name,
+                'cat': span.category,
+                'ph': 'X',
+                'ts': self._unix_ns(span.start_ns) / 1000,
+                'dur': (span.end_ns - span.start_ns) / 1000,
+                'pid': self.pid,
+                'tid': span.track,
+                'args': args,
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """
+        Export the spans as OpenTelemetry OTLP/JSON.
+
+        Returns:
+            Dictionary with one "resourceSpans" entry for this process
+        """
+        spans = []
+        for span in sorted(self.spans, key=lambda s: s.start_ns):
+            attributes = {'category': span.category, 'thread.id': span.track, **span.args}
+            record = {
+                'traceId': self.trace_id,
+                'spanId': span.span_id,
+                'name': span.name,
+                'kind': 1,
+                'startTimeUnixNano': str(self._unix_ns(span.start_ns)),
+                'endTimeUnixNano': str(self._unix_ns(span.end_ns)),
+                'attributes': _otlp_attributes(attributes),
+                'status': {'code': 2, 'message': span.error} if span.error else {'code': 1},
+            }
+            if span.parent_id:
+                record['parentSpanId'] = span.parent_id
+            spans.append(record)
+
+        resource = _otlp_attributes({'service.name': self.service_name, 'process.pid': self.pid})
+        return {'resourceSpans': [{
+            'resource': {'attributes': resource},
+            'scopeSpans': [{'scope': {'name': __name__}, 'spans': spans}],
+        }]}
+
+    def export(self, format: str = "chrome") -> Dict[str, Any]:
+        """
+        Export the spans in one of TRACE_FORMATS.
+
+        Raises:
+            ValueError: On an unknown format
+        """
+        if format == "chrome":
+            return self.to_chrome_trace()
+        if format == "otlp":
+            return self.to_otlp()
+        raise ValueError(f"Unknown trace format: {format} (expected one of {', '.join(TRACE_FORMATS)})")
+
+    def save(self, path: str, format: str = "chrome") -> None:
+        """Write the exported spans to a JSON file."""
+        document = self.export(format)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(document, f, default=str)
+
+
+def new_trace_id() -> str:
+    """Generate a random OpenTelemetry trace id."""
+    return secrets.token_hex(16)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    """Wrap a Python value as an OTLP AnyValue."""
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{'key': key, 'value': _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+def get_tracer() -> Optional[Tracer]:
+    """Get the active Tracer, or None while tracing is off."""
+    return _active_tracer
+
+
+def set_tracer(tracer: Optional[Tracer]) -> Optional[Tracer]:
+    """
+    Make tracer the process-wide active Tracer (None turns tracing off).
+
+    Returns:
+        The previously active Tracer
+    """
+    global _active_tracer
+    previous, _active_tracer = _active_tracer, tracer
+    return previous
+
+
+def span(name: str, category: str = "", **args):
+    """
+    Open a span on the active Tracer.
+
+    Args:
+        name: Span name (e.g. the stage name)
+        category: Kind of span ("stage", "request", "download", ...)
+        **args: Attributes recorded with the span
+
+    Returns:
+        A context manager yielding the span; a no-op span (with recording
+        False) when tracing is off
+    """
+    tracer = _active_tracer
+    if tracer is None:
+        return _NULL_SPAN
+    return tracer.span(name, category, **args)
+
+
+def annotate(**args) -> None:
+    """Attach attributes to the innermost open span, if any."""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**args)
+
+
+@contextlib.contextmanager
+def recording(path: Optional[str], format: str = "chrome", service_name: str = "arcade-report",
+              trace_id: Optional[str] = None):
+    """
+    Trace everything run inside the block and save it to path on exit.
+
+    Args:
+        path: Trace file; None disables tracing (the block runs untraced)
+        format: One of TRACE_FORMATS
+        service_name: Process name shown in the trace viewer
+        trace_id: Optional shared trace id (see Tracer)
+
+    Yields:
+        The active Tracer, or None when path is None
+    """
+    if path is None:
+        yield None
+        return
+    if format not in TRACE_FORMATS:
+        raise ValueError(f"Unknown trace format: {format} (expected one of {', '.join(TRACE_FORMATS)})")
+
+    tracer = Tracer(service_name, trace_id)
+    previous = set_tracer(tracer)
+    try:
+        yield tracer
+    finally:
+        set_tracer(previous)
+        tracer.save(path, format)
+
+
+def merge_trace_files(paths: Iterable[str], output_path: str) -> int:
+    """
+    Merge trace files written by several processes into one.
+
+    Chrome traces are merged by concatenating their events (each process
+    keeps its own pid); OTLP traces by concatenating their resourceSpans.
+
+    Args:
+        paths: Trace files, all in the same format
+        output_path: Merged trace file
+
+    Returns:
+        Number of files merged
+    """
+    merged: Dict[str, Any] = {}
+    count = 0
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            document = json.load(f)
+        if 'traceEvents' in document:
+            merged.setdefault('traceEvents', []).extend(document['traceEvents'])
+            merged['displayTimeUnit'] = document.get('displayTimeUnit', 'ms')
+        else:
+            merged.setdefault('resourceSpans', []).extend(document.get('resourceSpans', []))
+        count += 1
+
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(merged or {'traceEvents': []}, f)
+    return count
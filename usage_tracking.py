@@ -0,0 +1,227 @@
+"""
+Token, cost and latency accounting for OpenAI requests served by the cache.
+
+OpenAICache records every request that goes through get_or_compute: a fresh
+response with its ``usage`` block, model and latency, and a cache hit with
+the usage of the response it was served (what the call would have cost).
+The totals are what cache policies and concurrency are tuned against::
+
+    stats = cache.get_stats()
+    stats['saved_usd'], stats['requests']['chat']['hit_ratio'], stats['latency_ms']['gpt-4o']['p95']
+
+Prices are USD list prices at the time of writing and can be overridden
+per tracker; models without a price count tokens but no dollars.
+"""
+
+import math
+import threading
+from collections import deque
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+# USD per million (prompt, completion) tokens; models match by longest prefix,
+# so dated snapshots ("gpt-4o-2024-08-06") use their family's price
+TOKEN_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4": (30.00, 60.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+
+# USD per generated image by (model, quality, size)
+IMAGE_PRICES: Dict[Tuple[str, str, str], float] = {
+    ("dall-e-3", "standard", "1024x1024"): 0.040,
+    ("dall-e-3", "standard", "1024x1792"): 0.080,
+    ("dall-e-3", "standard", "1792x1024"): 0.080,
+    ("dall-e-3", "hd", "1024x1024"): 0.080,
+    ("dall-e-3", "hd", "1024x1792"): 0.120,
+    ("dall-e-3", "hd", "1792x1024"): 0.120,
+    ("dall-e-2", "standard", "256x256"): 0.016,
+    ("dall-e-2", "standard", "512x512"): 0.018,
+    ("dall-e-2", "standard", "1024x1024"): 0.020,
+}
+
+# Latencies kept per model for percentiles (the most recent ones)
+DEFAULT_LATENCY_WINDOW = 10000
+
+
+def percentile(values, pct):
+    """Linearly interpolated percentile of values (pct in 0-100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    lower = math.floor(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def _token_price(model: str, prices: Mapping[str, Tuple[float, float]]) -> Optional[Tuple[float, float]]:
+    """Find the price of the longest model-name prefix of model."""
+    matches = [name for name in prices if model == name or model.startswith(name + "-")]
+    return prices[max(matches, key=len)] if matches else None
+
+
+class UsageTracker:
+    """
+    Thread-safe totals of tokens, dollars and latency, spent and saved.
+    """
+
+    def __init__(
+        self,
+        token_prices: Optional[Mapping[str, Tuple[float, float]]] = None,
+        image_prices: Optional[Mapping[Tuple[str, str, str], float]] = None,
+        latency_window: int = DEFAULT_LATENCY_WINDOW
+    ):
+        """
+        Initialize the tracker.
+
+        Args:
+            token_prices: USD per million (prompt, completion) tokens by model
+                (default: TOKEN_PRICES)
+            image_prices: USD per image by (model, quality, size) (default:
+                IMAGE_PRICES)
+            latency_window: Latencies kept per model for percentiles
+        """
+        self.token_prices = TOKEN_PRICES if token_prices is None else token_prices
+        self.image_prices = IMAGE_PRICES if image_prices is None else image_prices
+        self.latency_window = latency_window
+
+        self._lock = threading.Lock()
+        # request type -> {'hits': n, 'misses': n}
+        self._requests: Dict[str, Dict[str, int]] = {}
+        # 'spent'/'saved' -> token and dollar totals
+        self._totals = {kind: {'prompt_tokens': 0, 'completion_tokens': 0, 'images': 0, 'usd': 0.0}
+                        for kind in ('spent', 'saved')}
+        self._latencies: Dict[str, deque] = {}
+
+    def cost(self, request_type: str, request_params: Mapping[str, Any], response: Any) -> Dict[str, Any]:
+        """
+        Work out the tokens, images and dollars a response accounts for.
+
+        Args:
+            request_type: "chat" or "image"
+            request_params: Parameters of the request (model, size, ...)
+            response: Response dict (``usage`` for chat, ``data`` for images)
+
+        Returns:
+            Dict with prompt_tokens, completion_tokens, images and usd
+        """
+        result = {'prompt_tokens': 0, 'completion_tokens': 0, 'images': 0, 'usd': 0.0}
+        if not isinstance(response, dict):
+            return result
+        model = str(request_params.get('model') or response.get('model') or '')
+
+        if request_type == "image":
+            images = len(response.get('data') or []) or request_params.get('n', 1)
+            key = (model, request_params.get('quality', 'standard'), request_params.get('size', '1024x1024'))
+            result['images'] = images
+            result['usd'] = images * self.image_prices.get(key, 0.0)
+            return result
+
+        usage = response.get('usage') or {}
+        result['prompt_tokens'] = usage.get('prompt_tokens') or 0
+        result['completion_tokens'] = usage.get('completion_tokens') or 0
+        price = _token_price(model, self.token_prices)
+        if price is not None:
+            result['usd'] = (result['prompt_tokens'] * price[0] + result['completion_tokens'] * price[1]) / 1e6
+        return result
+
+    def record(
+        self,
+        request_type: str,
+        request_params: Mapping[str, Any],
+        response: Any,
+        latency: Optional[float] = None
+    ) -> None:
+        """
+        Record one request.
+
+        Args:
+            request_type: "chat" or "image"
+            request_params: Parameters of the request
+            response: The response served
+            latency: Seconds the API took for a fresh response; None for a
+                response served from the cache (counted as saved)
+        """
+        cost = self.cost(request_type, request_params, response)
+        model = str(request_params.get('model') or 'unknown')
+        hit = latency is None
+
+        with self._lock:
+            counts = self._requests.setdefault(request_type, {'hits': 0, 'misses': 0})
+            counts['hits' if hit else 'misses'] += 1
+            totals = self._totals['saved' if hit else 'spent']
+            for name, value in cost.items():
+                totals[name] += value
+            if not hit:
+                self._latencies.setdefault(model, deque(maxlen=self.latency_window)).append(latency)
+
+    def state(self) -> Dict[str, Any]:
+        """
+        Get the raw totals, e.g. to send from a worker process to merge().
+
+        Returns:
+            Picklable dict of request counts, spent/saved totals and latencies
+        """
+        with self._lock:
+            return {
+                'requests': {request_type: dict(counts) for request_type, counts in self._requests.items()},
+                'totals': {kind: dict(totals) for kind, totals in self._totals.items()},
+                'latencies': {model: list(values) for model, values in self._latencies.items()},
+            }
+
+    def merge(self, state: Mapping[str, Any]) -> None:
+        """
+        Add another tracker's totals to this one.
+
+        Args:
+            state: Output of the other tracker's state()
+        """
+        with self._lock:
+            for request_type, counts in state['requests'].items():
+                own = self._requests.setdefault(request_type, {'hits': 0, 'misses': 0})
+                for name, value in counts.items():
+                    own[name] += value
+            for kind, totals in state['totals'].items():
+                for name, value in totals.items():
+                    self._totals[kind][name] += value
+            for model, values in state['latencies'].items():
+                self._latencies.setdefault(model, deque(maxlen=self.latency_window)).extend(values)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the accumulated totals.
+
+        Returns:
+            Dictionary with per-request-type hit ratios ("requests"), tokens
+            and images spent and saved, spent_usd and saved_usd, and
+            latency_ms percentiles of fresh responses per model
+        """
+        with self._lock:
+            requests = {}
+            for request_type, counts in sorted(self._requests.items()):
+                total = counts['hits'] + counts['misses']
+                requests[request_type] = {**counts, 'hit_ratio': round(counts['hits'] / total, 4)}
+
+            tokens = {}
+            for kind, totals in self._totals.items():
+                tokens[f'tokens_{kind}'] = {
+                    'prompt': totals['prompt_tokens'],
+                    'completion': totals['completion_tokens'],
+                    'total': totals['prompt_tokens'] + totals['completion_tokens'],
+                }
+                tokens[f'images_{kind}'] = totals['images']
+                tokens[f'{kind}_usd'] = round(totals['usd'], 6)
+
+            latency = {}
+            for model, values in sorted(self._latencies.items()):
+                values = list(values)
+                latency[model] = {
+                    'count': len(values),
+                    **{f'p{pct}': round(percentile(values, pct) * 1000, 1) for pct in (50, 95, 99)},
+                    'max': round(max(values) * 1000, 1),
+                }
+
+        return {'requests': requests, **tokens, 'latency_ms': latency}
+
@@ -3,13 +3,220 @@ Utility functions for caching OpenAI API responses to manage costs and rate limi
 """
 
 import json
+import os
 import hashlib
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future
 from pathlib import Path
-from typing import Any, Optional, Dict
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Optional, Dict, Tuple, Union
 from datetime import datetime
 import pickle
-import requests
+import zlib
 import re
+from json.encoder import encode_basestring_ascii as _encode_json_string
+
+import tracing
+from blob_store import BlobStore
+from cache_backends import SHARED_RESCAN_INTERVAL, CacheBackend, FileBackend, MemoryTier, SQLiteBackend
+from downloader import get_downloader
+from structured_logging import get_logger, log_event
+from usage_tracking import UsageTracker
+
+if TYPE_CHECKING:  # flow_model imports utils
+    from flow_model import Flow
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+try:
+    import zstandard
+except ImportError:  # optional: only needed for compression="zstd"
+    zstandard = None
+
+_cache_log = get_logger("cache")
+_request_log = get_logger("requests")
+
+# Leading bytes identifying compressed cache entries. Uncompressed entries
+# start with '{' (JSON) or 0x80 (pickle), so the formats never collide.
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+ZLIB_MAGIC = 0x78
+
+# Errors that mean a stored entry cannot be decoded and should be regenerated
+_DECODE_ERRORS = (
+    json.JSONDecodeError, UnicodeDecodeError, pickle.PickleError, EOFError,
+    KeyError, ValueError, zlib.error
+) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+
+# Strings longer than this are escaped and hashed a slice at a time
+_HASH_STRING_CHUNK = 256 * 1024
+# Encoded output is buffered up to this many characters per hash update
+_HASH_BUFFER_SIZE = 64 * 1024
+
+# Where an object embedded in model output can start: '{' before a key or '}'
+_JSON_OBJECT_START = re.compile(r'\{\s*["}]')
+# Characters first decoded for an embedded-object candidate (doubled as needed)
+_JSON_WINDOW = 256
+# A decode error this close to the window's end may be a token cut off by it
+_JSON_TOKEN_MARGIN = 16
+
+
+def _canonical_json_key(key: Any) -> str:
+    """Convert a dict key the way json.dumps does."""
+    if isinstance(key, str):
+        return key
+    if key is True:
+        return 'true'
+    if key is False:
+        return 'false'
+    if key is None:
+        return 'null'
+    if isinstance(key, (int, float)):
+        return _canonical_json_scalar(key)
+    raise TypeError(f"keys must be str, int, float, bool or None, not {type(key).__name__}")
+
+
+def _canonical_json_scalar(value: Any) -> str:
+    """Encode a non-string scalar the way json.dumps does."""
+    if value is None:
+        return 'null'
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if isinstance(value, int):
+        return int.__repr__(value)
+    if isinstance(value, float):
+        if value != value:
+            return 'NaN'
+        if value in (float('inf'), float('-inf')):
+            return 'Infinity' if value > 0 else '-Infinity'
+        return float.__repr__(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _iter_canonical_json(value: Any):
+    """
+    Yield the text of json.dumps(value, sort_keys=True) in pieces.
+
+    Long strings are escaped a slice at a time, so no piece is much larger
+    than _HASH_STRING_CHUNK regardless of the payload size.
+    """
+    if isinstance(value, str):
+        if len(value) <= _HASH_STRING_CHUNK:
+            yield _encode_json_string(value)
+            return
+        yield '"'
+        for start in range(0, len(value), _HASH_STRING_CHUNK):
+            yield _encode_json_string(value[start:start + _HASH_STRING_CHUNK])[1:-1]
+        yield '"'
+    elif isinstance(value, dict):
+        if not value:
+            yield '{}'
+            return
+        separator = '{'
+        for key, item in sorted(value.items(), key=lambda kv: kv[0]):
+            yield separator + _encode_json_string(_canonical_json_key(key)) + ': '
+            yield from _iter_canonical_json(item)
+            separator = ', '
+        yield '}'
+    elif isinstance(value, (list, tuple)):
+        if not value:
+            yield '[]'
+            return
+        separator = '['
+        for item in value:
+            yield separator
+            yield from _iter_canonical_json(item)
+            separator = ', '
+        yield ']'
+    else:
+        yield _canonical_json_scalar(value)
+
+
+def canonical_json_sha256(value: Any) -> str:
+    """
+    Hash the canonical JSON form of a value without building the full string.
+
+    Produces the same digest as
+    ``hashlib.sha256(json.dumps(value, sort_keys=True).encode('utf-8'))``,
+    but feeds the hash incrementally so multi-MB request payloads are never
+    materialized as one JSON document.
+
+    Args:
+        value: JSON-serializable value (dicts, lists, strings, numbers, ...)
+
+    Returns:
+        Hex SHA256 digest
+    """
+    hash_obj = hashlib.sha256()
+    buffer = []
+    buffered = 0
+    for piece in _iter_canonical_json(value):
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= _HASH_BUFFER_SIZE:
+            # ensure_ascii output is pure ASCII
+            hash_obj.update(''.join(buffer).encode('ascii'))
+            buffer.clear()
+            buffered = 0
+    hash_obj.update(''.join(buffer).encode('ascii'))
+    return hash_obj.hexdigest()
+
+
+class _FileLock:
+    """
+    Exclusive advisory lock on a file, shared across processes.
+
+    Uses fcntl.flock where available; on platforms without fcntl the lock is
+    a no-op and only in-process coalescing applies.
+
+    The holder deletes the lock file on release, so lock files do not pile
+    up one per key. A waiter that wakes up holding the lock of a file
+    deleted meanwhile opens the path again rather than proceeding.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._fd = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Acquire the lock, returning False if non-blocking and already held."""
+        if fcntl is None:
+            return True
+        while True:
+            fd = open(self.path, 'a+b')
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                fd.close()
+                return False
+            try:
+                current = os.stat(self.path).st_ino
+            except FileNotFoundError:
+                current = None
+            if current == os.fstat(fd.fileno()).st_ino:
+                self._fd = fd
+                return True
+            # The previous holder deleted the file after we opened it
+            fd.close()
+
+    def release(self) -> None:
+        """Release the lock if held, deleting its file."""
+        if self._fd is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._fd.close()
+            self._fd = None
+
 
 class OpenAICache:
     """
@@ -19,22 +226,101 @@ class OpenAICache:
     redundant API calls during development and testing.
     """
 
-    def __init__(self, cache_dir: str = ".cache"):
+    def __init__(
+        self,
+        cache_dir: str = ".cache",
+        process_lock: bool = False,
+        backend: Union[str, CacheBackend] = "file",
+        memory_max_entries: int = 256,
+        memory_max_bytes: int = 64 * 1024 * 1024,
+        max_bytes: Optional[int] = None,
+        max_age: Optional[float] = None,
+        eviction_policy: str = "lru",
+        eviction_batch: int = 64,
+        compression: Optional[str] = None,
+        store_params: bool = True
+    ):
         """
         Initialize the cache manager.
 
         Args:
             cache_dir: Directory to store cached responses (default: .cache)
+            process_lock: Also coalesce identical misses across processes
+                sharing cache_dir, using per-key lock files; with the file
+                backend, max_bytes then also rescans the directory every
+                SHARED_RESCAN_INTERVAL seconds to count other processes'
+                entries (the sqlite backend shares its index exactly)
+            backend: Storage engine: "file" (one file per entry), "sqlite"
+                (single WAL-mode database in cache_dir), or a CacheBackend
+            memory_max_entries: Entries kept decoded in the in-process LRU
+                tier in front of the backend (0 disables it)
+            memory_max_bytes: Serialized size limit of the LRU tier
+            max_bytes: Size bound for the backend; each set() evicts just
+                enough entries to get back under it (None = unbounded).
+                Blobs (image payloads under cache_dir/blobs) do not count
+                toward it and are never evicted; bound them with
+                blobs.prune()
+            max_age: Seconds after which entries expire; expired entries are
+                misses on read and are purged a batch at a time on set()
+            eviction_policy: "lru" or "lfu" victim selection for max_bytes
+            eviction_batch: Maximum entries examined per eviction/expiry pass
+            compression: Compress new entries with "zlib" or "zstd" (needs
+                the zstandard package); None writes plain JSON/pickle.
+                Entries in any format are readable regardless
+            store_params: Store the full request params in each entry; when
+                False only the cache key is kept, which keeps vision entries
+                (base64 image payloads) small
         """
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(exist_ok=True)
 
-        # Create subdirectories for different cache types
+        # Subdirectories used by the file backend for different cache types
         self.text_cache_dir = self.cache_dir / "text"
         self.image_cache_dir = self.cache_dir / "images"
 
-        self.text_cache_dir.mkdir(exist_ok=True)
-        self.image_cache_dir.mkdir(exist_ok=True)
+        if backend == "file":
+            # Other processes write the directory too, so refresh the eviction index
+            rescan_interval = SHARED_RESCAN_INTERVAL if process_lock else None
+            backend = FileBackend(self.cache_dir, rescan_interval=rescan_interval)
+        elif backend == "sqlite":
+            backend = SQLiteBackend(self.cache_dir / "cache.sqlite3")
+        elif not isinstance(backend, CacheBackend):
+            raise ValueError(f"Unsupported cache backend: {backend}")
+        self.backend = backend
+        self.blobs = BlobStore(self.cache_dir / "blobs")
+        self.memory = MemoryTier(max_entries=memory_max_entries, max_bytes=memory_max_bytes)
+
+        if eviction_policy not in ("lru", "lfu"):
+            raise ValueError(f"Unsupported eviction policy: {eviction_policy}")
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.eviction_policy = eviction_policy
+        self.eviction_batch = eviction_batch
+        self.evictions = 0
+        self.expirations = 0
+
+        if compression not in (None, "zlib", "zstd"):
+            raise ValueError(f"Unsupported cache compression: {compression}")
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+        self.compression = compression
+        self.store_params = store_params
+
+        # Hits not yet reported to the backend, flushed before evicting
+        self._pending_access: Dict[Tuple[str, str], int] = {}
+        self._pending_access_lock = threading.Lock()
+
+        self.process_lock = process_lock
+        self.lock_dir = self.cache_dir / "locks"
+        if process_lock:
+            self.lock_dir.mkdir(exist_ok=True)
+
+        # In-flight computations keyed by (cache_type, cache_key)
+        self._inflight: Dict[Tuple[str, str], Future] = {}
+        self._inflight_lock = threading.Lock()
+
+        # Tokens, dollars and latency of requests served through get_or_compute
+        self.usage = UsageTracker()
 
     def _generate_cache_key(self, request_params: Dict[str, Any]) -> str:
         """
@@ -46,16 +332,12 @@ class OpenAICache:
         Returns:
             SHA256 hash of the serialized parameters
         """
-        # Convert params to a canonical JSON string
-        canonical_json = json.dumps(request_params, sort_keys=True)
-
-        # Generate hash
-        hash_obj = hashlib.sha256(canonical_json.encode('utf-8'))
-        return hash_obj.hexdigest()
+        # Hash the canonical (sorted-key) JSON form, streamed in chunks
+        return canonical_json_sha256(request_params)
 
     def _get_cache_path(self, cache_key: str, cache_type: str = "text") -> Path:
         """
-        Get the file path for a cached item.
+        Get the file path for a cached item (file backend layout).
 
         Args:
             cache_key: The cache key (hash)
@@ -69,39 +351,100 @@ class OpenAICache:
         else:
             return self.image_cache_dir / f"{cache_key}.pkl"
 
-    def get(self, request_params: Dict[str, Any], cache_type: str = "text") -> Optional[Any]:
+    def _serialize(self, cached_data: Dict[str, Any], cache_type: str) -> bytes:
+        """Encode a cache entry: compact JSON for text, pickle for images, then compress."""
+        if cache_type == "text":
+            data = json.dumps(cached_data, separators=(',', ':')).encode('utf-8')
+        else:
+            data = pickle.dumps(cached_data, protocol=pickle.HIGHEST_PROTOCOL)
+
+        if self.compression == "zstd":
+            return zstandard.ZstdCompressor(level=3).compress(data)
+        if self.compression == "zlib":
+            return zlib.compress(data, 6)
+        return data
+
+    def _deserialize(self, data: bytes, cache_type: str) -> Dict[str, Any]:
+        """Decode a cache entry in any format written by _serialize (or older versions)."""
+        if data[:4] == ZSTD_MAGIC:
+            if zstandard is None:
+                raise ValueError("entry is zstd-compressed but zstandard is not installed")
+            data = zstandard.ZstdDecompressor().decompress(data)
+        elif data[:1] and data[0] == ZLIB_MAGIC:
+            data = zlib.decompress(data)
+
+        if cache_type == "text":
+            return json.loads(data)
+        return pickle.loads(data)
+
+    def get(
+        self,
+        request_params: Dict[str, Any],
+        cache_type: str = "text",
+        cache_key: Optional[str] = None
+    ) -> Optional[Any]:
         """
         Retrieve a cached response if it exists.
 
+        Checks the in-process LRU tier first; entries read from the backend
+        are promoted into it. Returned responses may be shared with other
+        callers and must not be mutated.
+
         Args:
             request_params: Dictionary of API request parameters
             cache_type: Type of cache ("text" or "images")
+            cache_key: Precomputed key for request_params, to avoid hashing
+                the params again
 
         Returns:
             Cached response if found, None otherwise
         """
-        cache_key = self._generate_cache_key(request_params)
-        cache_path = self._get_cache_path(cache_key, cache_type)
+        if cache_key is None:
+            cache_key = self._generate_cache_key(request_params)
+
+        response = self.memory.get(cache_type, cache_key)
+        if response is not None:
+            self._note_access(cache_type, cache_key)
+            log_event(_cache_log, logging.DEBUG, "cache_hit", sample=True, cache_type=cache_type, key=cache_key[:8],
+                      tier="memory")
+            return response
 
-        if cache_path.exists():
+        data = self.backend.read(cache_type, cache_key)
+
+        if data is not None:
             try:
-                if cache_type == "text":
-                    with open(cache_path, 'r', encoding='utf-8') as f:
-                        cached_data = json.load(f)
-                else:
-                    with open(cache_path, 'rb') as f:
-                        cached_data = pickle.load(f)
-
-                print(f"Cache hit for {cache_type} request (key: {cache_key[:8]}...)")
-                return cached_data['response']
-            except (json.JSONDecodeError, pickle.PickleError, KeyError) as e:
-                print(f"Cache file corrupted, will regenerate: {e}")
+                cached_data = self._deserialize(data, cache_type)
+                response = cached_data['response']
+                expires_at = self._expires_at(cached_data['timestamp'])
+            except _DECODE_ERRORS as e:
+                log_event(_cache_log, logging.WARNING, "cache_entry_corrupted", cache_type=cache_type,
+                          key=cache_key[:8], error=e)
+                return None
+
+            if expires_at is not None and expires_at <= time.time():
+                self.backend.delete(cache_type, cache_key)
+                self.expirations += 1
+                log_event(_cache_log, logging.DEBUG, "cache_expired", sample=True, cache_type=cache_type,
+                          key=cache_key[:8])
                 return None
 
-        print(f"Cache miss for {cache_type} request (key: {cache_key[:8]}...)")
+            self.memory.put(cache_type, cache_key, response, len(data), promoted=True, expires_at=expires_at)
+            self._note_access(cache_type, cache_key)
+
+            log_event(_cache_log, logging.DEBUG, "cache_hit", sample=True, cache_type=cache_type, key=cache_key[:8],
+                      tier="backend")
+            return response
+
+        log_event(_cache_log, logging.DEBUG, "cache_miss", sample=True, cache_type=cache_type, key=cache_key[:8])
         return None
 
-    def set(self, request_params: Dict[str, Any], response: Any, cache_type: str = "text") -> None:
+    def set(
+        self,
+        request_params: Dict[str, Any],
+        response: Any,
+        cache_type: str = "text",
+        cache_key: Optional[str] = None
+    ) -> None:
         """
         Store a response in the cache.
 
@@ -109,27 +452,257 @@ class OpenAICache:
             request_params: Dictionary of API request parameters
             response: The API response to cache
             cache_type: Type of cache ("text" or "images")
+            cache_key: Precomputed key for request_params, to avoid hashing
+                the params again
+        """
+        if cache_key is None:
+            cache_key = self._generate_cache_key(request_params)
+
+        timestamp = datetime.now().isoformat()
+        cached_data = {'timestamp': timestamp}
+        if self.store_params:
+            cached_data['request_params'] = request_params
+        else:
+            cached_data['request_digest'] = cache_key
+        cached_data['response'] = response
+
+        try:
+            data = self._serialize(cached_data, cache_type)
+            self.backend.write(cache_type, cache_key, data)
+            self.memory.put(cache_type, cache_key, response, len(data),
+                            expires_at=self._expires_at(timestamp))
+
+            log_event(_cache_log, logging.DEBUG, "cache_set", sample=True, cache_type=cache_type, key=cache_key[:8],
+                      bytes=len(data))
+        except Exception as e:
+            log_event(_cache_log, logging.WARNING, "cache_set_failed", cache_type=cache_type, key=cache_key[:8],
+                      error=e)
+            return
+
+        self._enforce_limits(protect=(cache_type, cache_key))
+
+    def _expires_at(self, timestamp: str) -> Optional[float]:
+        """Get the expiry time (epoch seconds) of an entry written at timestamp."""
+        if self.max_age is None:
+            return None
+        return datetime.fromisoformat(timestamp).timestamp() + self.max_age
+
+    def _note_access(self, cache_type: str, cache_key: str) -> None:
+        """Queue a hit for the backend's eviction bookkeeping."""
+        if self.max_bytes is None:
+            return
+        with self._pending_access_lock:
+            key = (cache_type, cache_key)
+            self._pending_access[key] = self._pending_access.get(key, 0) + 1
+
+    def _evict(self, cache_type: str, cache_key: str) -> bool:
+        """Remove an entry from the backend and the memory tier."""
+        self.memory.discard(cache_type, cache_key)
+        return self.backend.delete(cache_type, cache_key)
+
+    def _enforce_limits(self, protect: Optional[Tuple[str, str]] = None) -> None:
+        """
+        Purge one batch of expired entries, then evict until under max_bytes.
+
+        Runs after every set(), so each call only does work proportional to
+        what the latest write pushed over the limits.
+
+        Args:
+            protect: (cache_type, cache_key) of the entry just written, which
+                is never chosen as a victim (it would always lose under LFU)
         """
+        if self.max_age is not None:
+            for cache_type, cache_key in self.backend.expired_entries(
+                time.time() - self.max_age, self.eviction_batch
+            ):
+                if self._evict(cache_type, cache_key):
+                    self.expirations += 1
+
+        if self.max_bytes is None:
+            return
+
+        with self._pending_access_lock:
+            accesses, self._pending_access = self._pending_access, {}
+        if accesses:
+            self.backend.record_access(accesses, time.time())
+
+        excess = self.backend.total_bytes() - self.max_bytes
+        while excess > 0:
+            candidates = [
+                candidate
+                for candidate in self.backend.eviction_candidates(self.eviction_policy, self.eviction_batch)
+                if candidate[:2] != protect
+            ]
+            if not candidates:
+                break
+            for cache_type, cache_key, size in candidates:
+                if excess <= 0:
+                    break
+                if self._evict(cache_type, cache_key):
+                    self.evictions += 1
+                    log_event(_cache_log, logging.DEBUG, "cache_evicted", sample=True, cache_type=cache_type,
+                              key=cache_key[:8], bytes=size)
+                excess -= size
+
+    def _join_or_lead(self, cache_type: str, cache_key: str) -> Tuple[Future, bool]:
+        """
+        Register interest in an in-flight computation.
+
+        Returns:
+            Tuple of (future for the key, True if the caller must compute it)
+        """
+        with self._inflight_lock:
+            future = self._inflight.get((cache_type, cache_key))
+            if future is not None:
+                return future, False
+            future = Future()
+            self._inflight[(cache_type, cache_key)] = future
+            return future, True
+
+    def _finish(self, cache_type: str, cache_key: str, future: Future,
+                result: Any = None, error: Optional[BaseException] = None) -> None:
+        """Publish a leader's outcome to its followers and retire the key."""
+        with self._inflight_lock:
+            del self._inflight[(cache_type, cache_key)]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _file_lock(self, cache_type: str, cache_key: str) -> _FileLock:
+        """Get the cross-process lock guarding a cache key."""
+        return _FileLock(self.lock_dir / f"{cache_type}-{cache_key}.lock")
+
+    def get_or_compute(
+        self,
+        request_params: Dict[str, Any],
+        compute: Callable[[], Any],
+        cache_type: str = "text"
+    ) -> Any:
+        """
+        Return the cached response, computing and caching it on a miss.
+
+        Concurrent callers with identical params are coalesced: one caller
+        runs compute() while the others wait for and share its result (or
+        its exception). With process_lock enabled, the computing caller also
+        holds a per-key file lock and re-checks the cache once it has the
+        lock, so other processes sharing cache_dir are coalesced as well.
+
+        Args:
+            request_params: Dictionary of API request parameters
+            compute: Zero-argument callable producing the response on a miss
+            cache_type: Type of cache ("text" or "images")
+
+        Returns:
+            Cached or freshly computed response
+        """
+        # Hash the params once; the key is reused for every lookup and the write
         cache_key = self._generate_cache_key(request_params)
-        cache_path = self._get_cache_path(cache_key, cache_type)
+        request_type = request_params.get('request_type', cache_type)
+        cached = self.get(request_params, cache_type=cache_type, cache_key=cache_key)
+        if cached is not None:
+            self.usage.record(request_type, request_params, cached)
+            return cached
+
+        future, is_leader = self._join_or_lead(cache_type, cache_key)
+        if not is_leader:
+            log_event(_cache_log, logging.DEBUG, "cache_joined", sample=True, cache_type=cache_type,
+                      key=cache_key[:8])
+            tracing.annotate(cache="joined")
+            result = future.result()
+            self.usage.record(request_type, request_params, result)
+            return result
+
+        file_lock = self._file_lock(cache_type, cache_key) if self.process_lock else None
+        try:
+            if file_lock is not None:
+                file_lock.acquire()
+            # Another leader (earlier in this process, or in another process
+            # holding the file lock) may have filled the entry since our miss
+            result = None
+            if self.backend.contains(cache_type, cache_key):
+                result = self.get(request_params, cache_type=cache_type, cache_key=cache_key)
+            if result is None:
+                start = time.perf_counter()
+                result = compute()
+                self.usage.record(request_type, request_params, result, latency=time.perf_counter() - start)
+                self.set(request_params, result, cache_type=cache_type, cache_key=cache_key)
+            else:
+                self.usage.record(request_type, request_params, result)
+        except BaseException as e:
+            self._finish(cache_type, cache_key, future, error=e)
+            raise
+        finally:
+            if file_lock is not None:
+                file_lock.release()
+
+        self._finish(cache_type, cache_key, future, result=result)
+        return result
+
+    async def async_get_or_compute(
+        self,
+        request_params: Dict[str, Any],
+        compute: Callable[[], Awaitable[Any]],
+        cache_type: str = "text"
+    ) -> Any:
+        """
+        Async variant of get_or_compute.
 
-        cached_data = {
-            'timestamp': datetime.now().isoformat(),
-            'request_params': request_params,
-            'response': response
-        }
+        Shares the in-flight table with get_or_compute, so sync and async
+        callers coalesce with each other. The cross-process lock is polled
+        without blocking the event loop.
+
+        Args:
+            request_params: Dictionary of API request parameters
+            compute: Zero-argument coroutine function producing the response
+            cache_type: Type of cache ("text" or "images")
 
+        Returns:
+            Cached or freshly computed response
+        """
+        # Hash the params once; the key is reused for every lookup and the write
+        cache_key = self._generate_cache_key(request_params)
+        request_type = request_params.get('request_type', cache_type)
+        cached = self.get(request_params, cache_type=cache_type, cache_key=cache_key)
+        if cached is not None:
+            self.usage.record(request_type, request_params, cached)
+            return cached
+
+        future, is_leader = self._join_or_lead(cache_type, cache_key)
+        if not is_leader:
+            log_event(_cache_log, logging.DEBUG, "cache_joined", sample=True, cache_type=cache_type,
+                      key=cache_key[:8])
+            tracing.annotate(cache="joined")
+            result = await asyncio.wrap_future(future)
+            self.usage.record(request_type, request_params, result)
+            return result
+
+        file_lock = self._file_lock(cache_type, cache_key) if self.process_lock else None
         try:
-            if cache_type == "text":
-                with open(cache_path, 'w', encoding='utf-8') as f:
-                    json.dump(cached_data, f, indent=2)
+            if file_lock is not None:
+                while not file_lock.acquire(blocking=False):
+                    await asyncio.sleep(0.05)
+            # Another leader (earlier in this process, or in another process
+            # holding the file lock) may have filled the entry since our miss
+            result = None
+            if self.backend.contains(cache_type, cache_key):
+                result = self.get(request_params, cache_type=cache_type, cache_key=cache_key)
+            if result is None:
+                start = time.perf_counter()
+                result = await compute()
+                self.usage.record(request_type, request_params, result, latency=time.perf_counter() - start)
+                self.set(request_params, result, cache_type=cache_type, cache_key=cache_key)
             else:
-                with open(cache_path, 'wb') as f:
-                    pickle.dump(cached_data, f)
+                self.usage.record(request_type, request_params, result)
+        except BaseException as e:
+            self._finish(cache_type, cache_key, future, error=e)
+            raise
+        finally:
+            if file_lock is not None:
+                file_lock.release()
 
-            print(f"Cached {cache_type} response (key: {cache_key[:8]}...)")
-        except Exception as e:
-            print(f"Failed to cache response: {e}")
+        self._finish(cache_type, cache_key, future, result=result)
+        return result
 
     def clear(self, cache_type: Optional[str] = None) -> int:
         """
@@ -139,21 +712,19 @@ class OpenAICache:
             cache_type: Type to clear ("text", "images", or None for all)
 
         Returns:
-            Number of files deleted
+            Number of entries deleted
         """
-        deleted_count = 0
-
-        if cache_type in (None, "text"):
-            for cache_file in self.text_cache_dir.glob("*.json"):
-                cache_file.unlink()
-                deleted_count += 1
-
-        if cache_type in (None, "images"):
-            for cache_file in self.image_cache_dir.glob("*.pkl"):
-                cache_file.unlink()
-                deleted_count += 1
-
-        print(f"Cleared {deleted_count} cached responses")
+        deleted_count = self.backend.clear(cache_type)
+        self.memory.clear(cache_type)
+        if cache_type is None:
+            self.blobs.clear()
+            # Lock files left behind by processes that died holding them
+            for lock_path in self.lock_dir.glob('*.lock'):
+                stale = _FileLock(lock_path)
+                if stale.acquire(blocking=False):
+                    stale.release()
+
+        log_event(_cache_log, logging.INFO, "cache_cleared", cache_type=cache_type or "all", entries=deleted_count)
         return deleted_count
 
     def get_stats(self) -> Dict[str, Any]:
@@ -163,20 +734,43 @@ class OpenAICache:
         Returns:
             Dictionary with cache statistics
         """
-        text_files = list(self.text_cache_dir.glob("*.json"))
-        image_files = list(self.image_cache_dir.glob("*.pkl"))
-
-        total_size = sum(f.stat().st_size for f in text_files + image_files)
+        stats = self.backend.stats()
+        total_size = stats['total_size_bytes']
 
         return {
-            'text_cache_count': len(text_files),
-            'image_cache_count': len(image_files),
-            'total_cached_items': len(text_files) + len(image_files),
+            'text_cache_count': stats['text_cache_count'],
+            'image_cache_count': stats['image_cache_count'],
+            'total_cached_items': stats['text_cache_count'] + stats['image_cache_count'],
             'total_size_bytes': total_size,
-            'total_size_mb': round(total_size / (1024 * 1024), 2)
+            'total_size_mb': round(total_size / (1024 * 1024), 2),
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            **self.blobs.stats(),
+            **self.memory.stats(),
+            **self.usage.stats()
         }
 
 
+def _request_cache_type(request_type: str) -> str:
+    """Map a request type to the cache type its responses are stored under."""
+    return "images" if request_type == "image" else "text"
+
+
+def _build_cache_params(cache: OpenAICache, request_type: str, request_params: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the parameters used as the cache key for a request."""
+    # Add request type to params for unique caching; inline images are keyed
+    # by their blob reference rather than their bytes
+    return {
+        'request_type': request_type,
+        **cache.blobs.externalize(request_params)
+    }
+
+
+def _response_bytes(response: Any) -> int:
+    """Size of a response as compact JSON, for tracing."""
+    return len(json.dumps(response, separators=(',', ':'), default=str))
+
+
 def cached_openai_request(
     client: Any,
     cache: OpenAICache,
@@ -190,43 +784,146 @@ def cached_openai_request(
         client: OpenAI client instance
         cache: OpenAICache instance
         request_type: Type of request ("chat", "image", etc.)
-        **request_params: Parameters to pass to the API
+        **request_params: Parameters to pass to the API; "blob:" image
+            references (see blob_store) are expanded to data URLs when sent
 
     Returns:
         API response (from cache or fresh)
     """
     # Determine cache type based on request
-    cache_type = "images" if request_type == "image" else "text"
+    cache_type = _request_cache_type(request_type)
+    cache_params = _build_cache_params(cache, request_type, request_params)
+
+    def fetch() -> Any:
+        # Make the actual API request
+        log_event(_request_log, logging.INFO, "api_request", sample=True, request_type=request_type,
+                  model=request_params.get('model'))
+        span.set(cache="miss")
+
+        api_params = cache.blobs.expand(request_params)
+        with tracing.span(f"openai.{request_type}.api", "api", model=request_params.get('model')):
+            if request_type == "chat":
+                response = client.chat.completions.create(**api_params)
+            elif request_type == "image":
+                response = client.images.generate(**api_params)
+            else:
+                raise ValueError(f"Unsupported request type: {request_type}")
 
-    # Add request type to params for unique caching
-    cache_params = {
-        'request_type': request_type,
-        **request_params
-    }
+        # Convert to dict for caching
+        return response.model_dump()
 
-    # Try to get from cache
-    cached_response = cache.get(cache_params, cache_type=cache_type)
-    if cached_response is not None:
-        return cached_response
+    # Serve from cache, or make (or join) the API request and cache it
+    with tracing.span(f"openai.{request_type}", "request", model=request_params.get('model'), cache="hit") as span:
+        result = cache.get_or_compute(cache_params, fetch, cache_type=cache_type)
+        if span.recording:
+            span.set(bytes=_response_bytes(result))
+    return result
 
-    # Make the actual API request
-    print(f" Making fresh {request_type} API request...")
 
-    if request_type == "chat":
-        response = client.chat.completions.create(**request_params)
-        # Convert to dict for caching
-        response_dict = response.model_dump()
-    elif request_type == "image":
-        response = client.images.generate(**request_params)
-        response_dict = response.model_dump()
-    else:
-        raise ValueError(f"Unsupported request type: {request_type}")
+async def async_cached_openai_request(
+    client: Any,
+    cache: OpenAICache,
+    request_type: str,
+    **request_params
+) -> Any:
+    """
+    Make an OpenAI API request with caching using an ``AsyncOpenAI`` client.
+
+    Shares cache keys with cached_openai_request, so responses cached by
+    either path are hits for the other. Cache lookups are local file reads
+    and run inline; only the API call itself is awaited.
+
+    Args:
+        client: AsyncOpenAI client instance
+        cache: OpenAICache instance
+        request_type: Type of request ("chat", "image", etc.)
+        **request_params: Parameters to pass to the API; "blob:" image
+            references (see blob_store) are expanded to data URLs when sent
+
+    Returns:
+        API response (from cache or fresh)
+    """
+    cache_type = _request_cache_type(request_type)
+    cache_params = _build_cache_params(cache, request_type, request_params)
+
+    async def fetch() -> Any:
+        log_event(_request_log, logging.INFO, "api_request", sample=True, request_type=request_type,
+                  model=request_params.get('model'), mode="async")
+        span.set(cache="miss")
+
+        api_params = cache.blobs.expand(request_params)
+        with tracing.span(f"openai.{request_type}.api", "api", model=request_params.get('model')):
+            if request_type == "chat":
+                response = await client.chat.completions.create(**api_params)
+            elif request_type == "image":
+                response = await client.images.generate(**api_params)
+            else:
+                raise ValueError(f"Unsupported request type: {request_type}")
+
+        return response.model_dump()
+
+    with tracing.span(f"openai.{request_type}", "request", model=request_params.get('model'), cache="hit") as span:
+        result = await cache.async_get_or_compute(cache_params, fetch, cache_type=cache_type)
+        if span.recording:
+            span.set(bytes=_response_bytes(result))
+    return result
+
+
+def _decode_embedded_object(decoder: json.JSONDecoder, content: str, start: int) -> Tuple[bool, Any, int]:
+    """
+    Decode the JSON object starting at content[start].
+
+    The object is decoded from a window of the content, doubled while the
+    object runs past it, so the cost is proportional to the object (or to
+    the text up to the error) rather than to len(content): a JSONDecodeError
+    counts the lines before its position, which over the whole content would
+    make every failed candidate O(start).
+
+    Returns:
+        (True, value, end) on success, else (False, None, position from
+        which to resume scanning)
+    """
+    size = _JSON_WINDOW
+    while True:
+        window = content[start:start + size]
+        truncated = start + size < len(content)
+        try:
+            value, end = decoder.raw_decode(window)
+            return True, value, start + end
+        except json.JSONDecodeError as e:
+            # Near the window's end the error may be a token it cut off
+            cut_off = truncated and (e.pos >= len(window) - _JSON_TOKEN_MARGIN
+                                     or e.msg.startswith('Unterminated string'))
+            if not cut_off:
+                return False, None, start + max(e.pos, 1)
+        except RecursionError:
+            # Nested deeper than the decoder allows: skip the nested region
+            return False, None, start + len(window)
+        size *= 2
+
+
+def _embedded_json_objects(content: str):
+    """
+    Yield (length, start, value) for each top-level JSON object in text.
+
+    Candidates are the '{' that can open an object (followed by a key or
+    '}'); JSONDecoder.raw_decode does the brace- and string-aware matching.
+    After a successful decode the scan resumes past the object, after a
+    failed one at the error position: an object starting inside the failed
+    candidate either closed before the error (and is part of the malformed
+    value) or fails at the same position. Each character is decoded a
+    bounded number of times, so this is linear in len(content).
+    """
+    decoder = json.JSONDecoder()
+    candidate = _JSON_OBJECT_START.search(content)
+    while candidate:
+        start = candidate.start()
+        found, value, end = _decode_embedded_object(decoder, content, start)
+        if found:
+            yield end - start, start, value
+        candidate = _JSON_OBJECT_START.search(content, end)
 
-    # Cache the response
-    cache.set(cache_params, response_dict, cache_type=cache_type)
 
-    return response_dict
-    
 def extract_json_from_response(content: str) -> dict:
     """
     Extract JSON from LLM response that may be wrapped in markdown code blocks.
@@ -243,7 +940,7 @@ def extract_json_from_response(content: str) -> dict:
     # Try direct parsing first
     try:
         return json.loads(content)
-    except json.JSONDecodeError:
+    except (json.JSONDecodeError, RecursionError):
         pass
 
     # Try to extract JSON from markdown code blocks
@@ -255,20 +952,14 @@ def extract_json_from_response(content: str) -> dict:
         for match in matches:
             try:
                 return json.loads(match.strip())
-            except json.JSONDecodeError:
+            except (json.JSONDecodeError, RecursionError):
                 continue
 
-    # Try to find JSON object in the text
-    json_pattern = r'\{.*\}'
-    matches = re.findall(json_pattern, content, re.DOTALL)
-
-    if matches:
-        # Try the longest match first (most likely to be complete)
-        for match in sorted(matches, key=len, reverse=True):
-            try:
-                return json.loads(match)
-            except json.JSONDecodeError:
-                continue
+    # Try to find JSON objects in the text; the longest (earliest on ties)
+    # is most likely the answer rather than an inline example
+    best = max(_embedded_json_objects(content), key=lambda found: (found[0], -found[1]), default=None)
+    if best is not None:
+        return best[2]
 
     # If all else fails, raise error with helpful message
     raise json.JSONDecodeError(
@@ -279,20 +970,17 @@ def extract_json_from_response(content: str) -> dict:
 
 
 def download_image(url: str, output_path: str) -> bool:
-    """Download an image from URL and save it locally."""
+    """Download an image from URL and save it locally (see downloader.Downloader)."""
     try:
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        with open(output_path, 'wb') as f:
-            f.write(response.content)
+        get_downloader().download(url, output_path)
         return True
     except Exception as e:
-        print(f"Failed to download image: {e}")
+        log_event(_request_log, logging.WARNING, "download_failed", url=url, error=e)
         return False
 
 
 def generate_markdown_report(
-    flow_data: dict,
+    flow_data: "Flow",
     user_actions: str,
     summary: str,
     best_image_url: str,
@@ -302,8 +990,8 @@ def generate_markdown_report(
 ) -> str:
     """Generate a markdown report from the analysis results."""
 
-    flow_name = flow_data.get('name', 'Untitled Flow')
-    flow_description = flow_data.get('description', '')
+    flow_name = flow_data.name or 'Untitled Flow'
+    flow_description = flow_data.description
 
     markdown = f"""# Arcade Flow Analysis Report
 
@@ -339,10 +1027,10 @@ def generate_markdown_report(
 
 ## Technical Details
 
-- **Total Steps:** {len(flow_data.get('steps', []))}
-- **Flow ID:** {flow_data.get('uploadId', 'N/A')}
-- **Created With:** {flow_data.get('createdWith', 'N/A')}
-- **Use Case:** {flow_data.get('useCase', 'N/A')}
+- **Total Steps:** {len(flow_data.steps)}
+- **Flow ID:** {flow_data.upload_id}
+- **Created With:** {flow_data.created_with}
+- **Use Case:** {flow_data.use_case}
 
 ---
 """